@@ -0,0 +1,269 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+import wave
+
+import numpy as np
+
+from encoders import EncoderError, create_encoder
+
+# 音频时间戳与实际写入位置相差超过这个值（秒）才补零或裁剪，避免抖动导致来回修正
+AUDIO_DRIFT_TOLERANCE = 0.02
+
+
+class AVRecorder:
+    """音视频同步录制：两路数据都用 time.monotonic 打时间戳，各自在后台线程写入，结束后用 ffmpeg 合成一个文件
+
+    视频按时间戳换算成固定帧率（补帧/丢帧），音频按时间戳补零/裁剪，长时间录制也不会逐渐失步。
+    push_frame 和音频回调都只做非阻塞入队，队列满时丢弃并计数。
+    """
+
+    def __init__(self, output_path, frame_size, fps=30.0, sample_rate=48000,
+                 record_audio=True, voice_changer=None, codec="auto", preset="veryfast", crf=23):
+        self.output_path = output_path
+        self.frame_size = frame_size
+        self.fps = fps
+        self.sample_rate = sample_rate
+        self.record_audio = record_audio
+        self.voice_changer = voice_changer
+        self.codec = codec
+        self.preset = preset
+        self.crf = crf
+        self.encoder = None
+        # 结束回调 on_finished(输出路径, 说明文字)，在后台线程中调用
+        self.on_finished = None
+
+        base, _ = os.path.splitext(output_path)
+        self.video_tmp = base + ".video.tmp.mp4"
+        self.audio_tmp = base + ".audio.tmp.wav"
+
+        self.start_time = None
+        self._video_queue = queue.Queue(maxsize=60)
+        self._audio_queue = queue.Queue(maxsize=500)
+        self._threads = []
+        self._finisher = None
+        self._pa = None
+        self._audio = None
+        self._stream = None
+        self.audio_error = None
+        self.video_error = None
+
+        self.stats = {
+            "video_frames": 0,
+            "video_dropped": 0,
+            "video_duplicated": 0,
+            "audio_blocks": 0,
+            "audio_dropped": 0,
+            "audio_padded_ms": 0.0,
+            "audio_trimmed_ms": 0.0,
+        }
+
+    # ---------- 采集端（不阻塞） ----------
+
+    def push_frame(self, frame, timestamp=None):
+        """timestamp 为该帧的采集时刻（time.monotonic()），应在读到画面后立即记录；
+        用处理完成的时刻会让画面比声音晚一个处理延迟"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        try:
+            self._video_queue.put_nowait((timestamp, frame.copy()))
+        except queue.Full:
+            self.stats["video_dropped"] += 1
+
+    def _push_audio(self, block, timestamp):
+        try:
+            self._audio_queue.put_nowait((timestamp, block.copy()))
+        except queue.Full:
+            self.stats["audio_dropped"] += 1
+
+    def _mic_callback(self, in_data, frame_count, time_info, status):
+        # 回调时刻减去块长和输入延迟，近似为这一块第一个样本的采集时刻
+        timestamp = time.monotonic() - frame_count / self.sample_rate - self._stream.get_input_latency()
+        self._push_audio(np.frombuffer(in_data, dtype=np.float32), timestamp)
+        return None, self._pa.paContinue
+
+    def _start_audio(self):
+        if self.voice_changer is not None and self.voice_changer.running:
+            # 变声已开启：直接录变声后的声音
+            self.sample_rate = self.voice_changer.sample_rate
+            self.voice_changer.taps.append(self._push_audio)
+            return
+        import pyaudio
+        self._pa = pyaudio
+        self._audio = pyaudio.PyAudio()
+        self._stream = self._audio.open(format=pyaudio.paFloat32, channels=1, rate=self.sample_rate,
+                                        input=True, frames_per_buffer=1024,
+                                        stream_callback=self._mic_callback)
+
+    def _stop_audio(self):
+        if self.voice_changer is not None and self._push_audio in self.voice_changer.taps:
+            self.voice_changer.taps.remove(self._push_audio)
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._audio is not None:
+            self._audio.terminate()
+            self._audio = None
+
+    # ---------- 后台写入 ----------
+
+    @property
+    def encoder_stats(self):
+        return self.encoder.stats if self.encoder is not None else None
+
+    def _video_worker(self):
+        # 在后台线程里创建编码器（自动模式首次需要探测硬件编码器）
+        # 编码器满载时 write 会阻塞，背压传回 _video_queue，由 push_frame 丢帧计数
+        try:
+            self.encoder = create_encoder(self.video_tmp, self.frame_size, self.fps,
+                                          codec=self.codec, preset=self.preset, crf=self.crf)
+        except Exception as e:
+            self.video_error = f"无法创建编码器: {e}"
+        writer = self.encoder
+        written = 0
+        last = None
+        while True:
+            item = self._video_queue.get()
+            if item is None:
+                break
+            if self.video_error is not None:
+                # 编码已失败：继续取走队列直到结束标记，stop() 才不会阻塞在满队列上
+                continue
+            timestamp, frame = item
+            # 按时间戳换算应处的帧序号：落后就重复上一帧补齐，超前（同一帧时间内多次到达）就丢弃
+            target = int(round((timestamp - self.start_time) * self.fps))
+            if target < written:
+                self.stats["video_dropped"] += 1
+                continue
+            filler = last if last is not None else frame
+            try:
+                while written < target:
+                    writer.write(filler)
+                    written += 1
+                    self.stats["video_duplicated"] += 1
+                writer.write(frame)
+            except EncoderError as e:
+                self.video_error = str(e)
+                continue
+            written += 1
+            last = frame
+            self.stats["video_frames"] += 1
+        if writer is None:
+            return
+        try:
+            writer.close()
+        except EncoderError as e:
+            self.video_error = self.video_error or str(e)
+
+    def _audio_worker(self):
+        wav = wave.open(self.audio_tmp, "wb")
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(self.sample_rate)
+        written = 0
+        tolerance = int(AUDIO_DRIFT_TOLERANCE * self.sample_rate)
+        while True:
+            item = self._audio_queue.get()
+            if item is None:
+                break
+            timestamp, block = item
+            expected = int(round((timestamp - self.start_time) * self.sample_rate))
+            if expected < 0:
+                # 录制开始前采到的部分直接丢掉
+                block = block[-expected:]
+                expected = 0
+            gap = expected - written
+            if gap > tolerance:
+                # 丢块或设备时钟偏慢：补静音
+                wav.writeframes(np.zeros(gap, dtype=np.int16).tobytes())
+                written += gap
+                self.stats["audio_padded_ms"] += 1000.0 * gap / self.sample_rate
+            elif gap < -tolerance:
+                # 设备时钟偏快：裁掉多出来的样本
+                trim = min(-gap, len(block))
+                block = block[trim:]
+                self.stats["audio_trimmed_ms"] += 1000.0 * trim / self.sample_rate
+            pcm = (np.clip(block, -1.0, 1.0) * 32767).astype(np.int16)
+            wav.writeframes(pcm.tobytes())
+            written += len(pcm)
+            self.stats["audio_blocks"] += 1
+        wav.close()
+
+    # ---------- 控制 ----------
+
+    def start(self):
+        self.start_time = time.monotonic()
+        if self.record_audio:
+            try:
+                self._start_audio()
+            except Exception as e:
+                # 没有麦克风或没装pyaudio时只录视频
+                print(f"无法录制音频: {str(e)}")
+                self.audio_error = str(e)
+                self.record_audio = False
+                self._stop_audio()
+
+        workers = [self._video_worker]
+        if self.record_audio:
+            workers.append(self._audio_worker)
+        for worker in workers:
+            thread = threading.Thread(target=worker, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """立即返回；停止音频采集后，由后台线程收尾写入并合成最终文件"""
+        self._stop_audio()
+        self._video_queue.put(None)
+        if self.record_audio:
+            self._audio_queue.put(None)
+        self._finisher = threading.Thread(target=self._finish, daemon=True)
+        self._finisher.start()
+
+    def wait(self, timeout=None):
+        if self._finisher is not None:
+            self._finisher.join(timeout)
+
+    def _finish(self):
+        for thread in self._threads:
+            thread.join()
+        try:
+            message = self._write_output()
+        except Exception as e:
+            message = f"保存失败: {e}"
+        print(f"录制完成: {self.output_path} ({message}) {self.stats} {self.encoder_stats}")
+        # 无论成功与否都要回调，界面才能离开"保存中"状态
+        if self.on_finished is not None:
+            self.on_finished(self.output_path, message)
+
+    def _write_output(self):
+        """把临时文件合成或移动成最终文件，返回说明文字"""
+        if self.video_error is not None:
+            message = f"视频编码失败: {self.video_error}"
+        elif not self.record_audio:
+            os.replace(self.video_tmp, self.output_path)
+            message = "仅视频（未录制音频）"
+        elif shutil.which("ffmpeg") is None:
+            os.replace(self.video_tmp, self.output_path)
+            audio_path = os.path.splitext(self.output_path)[0] + ".wav"
+            os.replace(self.audio_tmp, audio_path)
+            message = f"未找到ffmpeg，音频单独保存为 {audio_path}"
+        else:
+            cmd = ["ffmpeg", "-y", "-loglevel", "error",
+                   "-i", self.video_tmp, "-i", self.audio_tmp,
+                   "-map", "0:v:0", "-map", "1:a:0",
+                   "-c:v", "copy", "-c:a", "aac", "-b:a", "128k", "-shortest",
+                   self.output_path]
+            result = subprocess.run(cmd, capture_output=True)
+            if result.returncode == 0:
+                os.remove(self.video_tmp)
+                os.remove(self.audio_tmp)
+                message = "音视频已合成"
+            else:
+                os.replace(self.video_tmp, self.output_path)
+                message = f"音视频合成失败: {result.stderr.decode(errors='ignore')[:60]}"
+        return message
@@ -0,0 +1,216 @@
+"""艺术滤镜和AR贴纸：实时预览和离线重渲染（render_session.py）共用同一套实现"""
+import cv2
+import numpy as np
+
+
+def apply_sepia(img):
+    # 复古棕褐色滤镜
+    sepia_filter = np.array([[0.393, 0.769, 0.189],
+                             [0.349, 0.686, 0.168],
+                             [0.272, 0.534, 0.131]])
+    sepia_img = cv2.transform(img, sepia_filter)
+    sepia_img = np.clip(sepia_img, 0, 255).astype(np.uint8)
+    return sepia_img
+
+
+def apply_sketch(img):
+    # 素描效果
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    inv_gray = 255 - gray
+    blurred = cv2.GaussianBlur(inv_gray, (21, 21), 0)
+    sketch = cv2.divide(gray, 255 - blurred, scale=256)
+    return cv2.cvtColor(sketch, cv2.COLOR_GRAY2BGR)
+
+
+def apply_cartoon(img):
+    # 卡通效果
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    blur = cv2.medianBlur(gray, 5)
+    edges = cv2.adaptiveThreshold(blur, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
+                                  cv2.THRESH_BINARY, 9, 9)
+    color = cv2.bilateralFilter(img, 9, 300, 300)
+    cartoon = cv2.bitwise_and(color, color, mask=edges)
+    return cartoon
+
+
+def apply_edge_detection(img):
+    # 边缘检测
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    edges = cv2.Canny(blurred, 50, 150)
+    return cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
+
+
+def apply_emboss(img):
+    # 浮雕效果
+    kernel = np.array([[0, -1, -1],
+                       [1, 0, -1],
+                       [1, 1, 0]])
+    emboss = cv2.filter2D(img, -1, kernel) + 128
+    return emboss
+
+
+def apply_neon(img):
+    # 霓虹效果
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    blurred = cv2.GaussianBlur(gray, (21, 21), 0)
+    edges = cv2.divide(gray, blurred, scale=256)
+    edges = cv2.normalize(edges, None, 0, 255, cv2.NORM_MINMAX)
+    edges = cv2.threshold(edges, 50, 255, cv2.THRESH_BINARY)[1]
+    edges = cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
+
+    # 添加霓虹色彩
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    h, s, v = cv2.split(hsv)
+    # 随机调整色相
+    h = (h + np.random.randint(0, 180)) % 180
+    s = np.clip(s * 1.5, 0, 255).astype(np.uint8)
+    hsv = cv2.merge([h, s, v])
+    colored = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+
+    # 结合边缘和颜色
+    result = cv2.bitwise_and(colored, edges)
+    return result
+
+
+def apply_pixelate(img):
+    # 像素化效果
+    height, width = img.shape[:2]
+
+    # 定义像素块大小
+    block_size = 15
+
+    # 缩小图像
+    small = cv2.resize(img, (width // block_size, height // block_size),
+                       interpolation=cv2.INTER_LINEAR)
+
+    # 放大回原始尺寸
+    pixelated = cv2.resize(small, (width, height),
+                           interpolation=cv2.INTER_NEAREST)
+
+    return pixelated
+
+
+FILTERS = {
+    "无": lambda img: img,
+    "复古": apply_sepia,
+    "素描": apply_sketch,
+    "卡通": apply_cartoon,
+    "边缘检测": apply_edge_detection,
+    "浮雕": apply_emboss,
+    "霓虹": apply_neon,
+    "像素化": apply_pixelate,
+}
+
+STICKER_POSITIONS = {
+    "额头": "forehead",
+    "鼻子": "nose",
+    "眼睛": "eyes",
+    "嘴巴": "mouth",
+    "左耳": "left_ear",
+    "右耳": "right_ear",
+}
+
+
+def load_sticker(path):
+    # 保留透明通道，使用numpy读取以支持中文路径
+    return cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+
+
+def sticker_anchors(face):
+    """按106点关键点计算各贴纸位置的 (中心点, 边长)；没有关键点时返回 None"""
+    landmarks = face.landmark_2d_106
+    if landmarks is None or len(landmarks) < 106:
+        return None
+
+    landmarks = landmarks.astype(np.int32)
+
+    # 额头位置（使用眉毛上方）
+    forehead_center = (int((landmarks[33][0] + landmarks[38][0]) / 2),
+                       int(landmarks[33][1] - (landmarks[66][1] - landmarks[33][1]) * 0.5))
+    forehead_size = int((landmarks[38][0] - landmarks[33][0]) * 1.2)
+
+    # 鼻子位置
+    nose_center = (int(landmarks[51][0]), int(landmarks[51][1]))
+    nose_size = int((landmarks[54][0] - landmarks[48][0]) * 0.8)
+
+    # 眼睛位置（两眼中心）
+    left_eye = (int((landmarks[60][0] + landmarks[61][0]) / 2),
+                int((landmarks[60][1] + landmarks[61][1]) / 2))
+    right_eye = (int((landmarks[68][0] + landmarks[69][0]) / 2),
+                 int((landmarks[68][1] + landmarks[69][1]) / 2))
+    eyes_center = (int((left_eye[0] + right_eye[0]) / 2),
+                   int((left_eye[1] + right_eye[1]) / 2))
+    eyes_size = int((right_eye[0] - left_eye[0]) * 1.5)
+
+    # 嘴巴位置
+    mouth_center = (int((landmarks[76][0] + landmarks[82][0]) / 2),
+                    int((landmarks[76][1] + landmarks[82][1]) / 2))
+    mouth_size = int((landmarks[82][0] - landmarks[76][0]) * 1.2)
+
+    # 左耳和右耳位置（估计位置，实际关键点可能没有耳朵）
+    face_width = int(face.bbox[2] - face.bbox[0])
+    left_ear_center = (int(face.bbox[0] - face_width * 0.1), eyes_center[1])
+    right_ear_center = (int(face.bbox[2] + face_width * 0.1), eyes_center[1])
+    ear_size = int(face_width * 0.2)
+
+    return {
+        "forehead": (forehead_center, forehead_size),
+        "nose": (nose_center, nose_size),
+        "eyes": (eyes_center, eyes_size),
+        "mouth": (mouth_center, mouth_size),
+        "left_ear": (left_ear_center, ear_size),
+        "right_ear": (right_ear_center, ear_size),
+    }
+
+
+def apply_stickers(frame, face, stickers):
+    """stickers: [(贴纸图片, 位置类型, ...)]，按顺序贴到 frame 上（原地修改）"""
+    anchors = sticker_anchors(face)
+    if anchors is None:
+        return
+    for sticker in stickers:
+        sticker_img, position = sticker[0], sticker[1]
+        if position in anchors:
+            center, size = anchors[position]
+            add_sticker_to_frame(frame, sticker_img, center, size)
+
+
+def add_sticker_to_frame(frame, sticker, center, size):
+    try:
+        # 调整贴纸大小
+        if sticker.shape[1] != size or sticker.shape[0] != size:
+            sticker = cv2.resize(sticker, (size, size))
+
+        # 确定贴纸在帧中的位置
+        x_offset = center[0] - size // 2
+        y_offset = center[1] - size // 2
+
+        # 检查贴纸是否超出帧的边界
+        if (x_offset < 0 or y_offset < 0 or
+                x_offset + sticker.shape[1] > frame.shape[1] or
+                y_offset + sticker.shape[0] > frame.shape[0]):
+            return
+
+        # 如果贴纸有透明通道（4通道）
+        if sticker.shape[2] == 4:
+            # 分离RGB和透明通道
+            rgb = sticker[:, :, 0:3]
+            alpha = sticker[:, :, 3] / 255.0
+
+            # 为透明通道创建广播数组
+            alpha = np.repeat(alpha[:, :, np.newaxis], 3, axis=2)
+
+            # 为贴纸区域创建ROI
+            roi = frame[y_offset:y_offset + sticker.shape[0], x_offset:x_offset + sticker.shape[1]]
+
+            # 使用alpha通道混合贴纸和原始图像
+            blended = (1.0 - alpha) * roi + alpha * rgb
+
+            # 将混合结果放回原始图像
+            frame[y_offset:y_offset + sticker.shape[0], x_offset:x_offset + sticker.shape[1]] = blended
+        else:
+            # 如果没有透明通道，直接叠加
+            frame[y_offset:y_offset + sticker.shape[0], x_offset:x_offset + sticker.shape[1]] = sticker
+    except Exception as e:
+        print(f"添加贴纸到帧失败: {str(e)}")
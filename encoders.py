@@ -0,0 +1,259 @@
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+import cv2
+
+# 界面可选的编码器；auto 会优先选用实际可用的硬件编码器，最后退回 libx264
+ENCODER_CHOICES = {
+    "自动": "auto",
+    "H.264 (x264)": "libx264",
+    "H.265 (x265)": "libx265",
+    "OpenCV mp4v": "mp4v",
+}
+
+HARDWARE_ENCODERS = ("h264_nvenc", "hevc_nvenc", "h264_qsv", "hevc_qsv",
+                     "h264_videotoolbox", "hevc_videotoolbox", "h264_amf", "hevc_amf")
+
+# x264 风格的速度预设到 NVENC p1~p7 的对应关系
+NVENC_PRESETS = {
+    "ultrafast": "p1", "superfast": "p2", "veryfast": "p3", "faster": "p4",
+    "fast": "p4", "medium": "p5", "slow": "p6", "slower": "p7", "veryslow": "p7",
+}
+
+# ffmpeg 的 stderr 只保留最后这么多字节，用于出错时的提示
+STDERR_TAIL_BYTES = 4096
+
+_encoder_cache = {}
+
+
+def ffmpeg_available():
+    return shutil.which("ffmpeg") is not None
+
+
+def list_ffmpeg_encoders():
+    if "list" not in _encoder_cache:
+        names = set()
+        if ffmpeg_available():
+            result = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"], capture_output=True)
+            for line in result.stdout.decode(errors="ignore").splitlines():
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].startswith("V"):
+                    names.add(parts[1])
+        _encoder_cache["list"] = names
+    return _encoder_cache["list"]
+
+
+def probe_encoder(codec):
+    """硬件编码器即使编进了ffmpeg也可能没有对应设备，实际编一帧确认"""
+    if codec not in _encoder_cache:
+        ok = False
+        if codec in list_ffmpeg_encoders():
+            cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-f", "lavfi",
+                   "-i", "color=size=256x256:rate=1", "-frames:v", "1", "-c:v", codec, "-f", "null", "-"]
+            try:
+                ok = subprocess.run(cmd, capture_output=True, timeout=10).returncode == 0
+            except subprocess.TimeoutExpired:
+                ok = False
+        _encoder_cache[codec] = ok
+    return _encoder_cache[codec]
+
+
+def resolve_codec(codec):
+    if codec != "auto":
+        return codec
+    for name in HARDWARE_ENCODERS:
+        if name.startswith("h264") and probe_encoder(name):
+            return name
+    return "libx264"
+
+
+class EncoderError(RuntimeError):
+    """编码器已无法继续写入（例如 ffmpeg 进程异常退出）"""
+
+
+class FrameEncoder:
+    """编码器公共接口：write 写入BGR帧，close 结束并等待写完，stats 返回统计
+
+    编码失败时 error 记录原因，之后的 write 和 close 抛出 EncoderError。
+    """
+
+    name = "base"
+
+    def __init__(self, path, frame_size, fps):
+        self.path = path
+        self.frame_size = frame_size
+        self.fps = fps
+        self.frames_written = 0
+        self.error = None
+        self.start_time = time.perf_counter()
+
+    def write(self, frame):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    @property
+    def stats(self):
+        elapsed = max(time.perf_counter() - self.start_time, 1e-6)
+        return {"encoder": self.name, "frames": self.frames_written,
+                "encode_fps": self.frames_written / elapsed}
+
+
+class VideoWriterEncoder(FrameEncoder):
+    """cv2.VideoWriter 后备实现（找不到ffmpeg时使用）"""
+
+    name = "mp4v"
+
+    def __init__(self, path, frame_size, fps, fourcc="mp4v"):
+        super().__init__(path, frame_size, fps)
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, frame_size)
+        if not self.writer.isOpened():
+            self.error = f"无法创建视频文件: {path}"
+
+    def write(self, frame):
+        if self.error is not None:
+            raise EncoderError(self.error)
+        self.writer.write(frame)
+        self.frames_written += 1
+        return True
+
+    def close(self):
+        self.writer.release()
+        if self.error is not None:
+            raise EncoderError(self.error)
+
+
+class FFmpegEncoder(FrameEncoder):
+    """把原始BGR帧通过管道送进 ffmpeg 子进程编码
+
+    写管道在独立线程里进行；队列满时 drop_when_full=True 丢帧（实时录制），否则阻塞等待（离线渲染），
+    两种情况都计入背压统计。stderr 由另一个线程持续读出、只留末尾，避免输出过多塞满管道卡住 ffmpeg。
+    """
+
+    def __init__(self, path, frame_size, fps, codec="libx264", preset="veryfast", crf=23,
+                 queue_size=32, drop_when_full=False, extra_args=None):
+        super().__init__(path, frame_size, fps)
+        self.name = codec
+        self.drop_when_full = drop_when_full
+        self.dropped = 0
+        self.blocked_ms = 0.0
+        self.max_queue_depth = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+
+        width, height = frame_size
+        cmd = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+               "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}",
+               "-r", str(fps), "-i", "-",
+               # yuv420p 要求宽高为偶数
+               "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-c:v", codec]
+        cmd += self._quality_args(codec, preset, crf)
+        cmd += list(extra_args or [])
+        cmd += ["-pix_fmt", "yuv420p", path]
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        self._stderr_tail = bytearray()
+        self._stderr_thread = threading.Thread(target=self._stderr_worker, daemon=True)
+        self._stderr_thread.start()
+        self._thread = threading.Thread(target=self._pipe_worker, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _quality_args(codec, preset, crf):
+        if codec in ("libx264", "libx265"):
+            return ["-preset", preset, "-crf", str(crf)]
+        if codec.endswith("_nvenc"):
+            return ["-preset", NVENC_PRESETS.get(preset, "p4"), "-rc", "vbr", "-cq", str(crf), "-b:v", "0"]
+        if codec.endswith("_qsv"):
+            return ["-preset", preset if preset in NVENC_PRESETS else "veryfast", "-global_quality", str(crf)]
+        if codec.endswith("_amf"):
+            return ["-rc", "cqp", "-qp_i", str(crf), "-qp_p", str(crf)]
+        if codec.endswith("_videotoolbox"):
+            # VideoToolbox 没有CRF，按画质系数给一个近似码率
+            return ["-q:v", str(max(1, min(100, 100 - 2 * crf)))]
+        return []
+
+    def _stderr_worker(self):
+        while True:
+            chunk = self.process.stderr.read1(STDERR_TAIL_BYTES)
+            if not chunk:
+                break
+            self._stderr_tail += chunk
+            del self._stderr_tail[:-STDERR_TAIL_BYTES]
+
+    def _stderr_text(self):
+        """ffmpeg 退出后读完的 stderr 末尾"""
+        self._stderr_thread.join()
+        return self._stderr_tail.decode(errors="ignore").strip()[-200:]
+
+    def _pipe_worker(self):
+        # 一直取到结束标记为止：ffmpeg 退出后仍要清空队列，否则阻塞的 write/close 会永远等在满队列上
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                self.process.stdin.write(frame.tobytes())
+                self.frames_written += 1
+            except (BrokenPipeError, OSError):
+                self.error = f"ffmpeg 编码进程已退出: {self._stderr_text()}"
+                print(self.error)
+
+    def write(self, frame):
+        """返回 False 表示该帧因背压被丢弃；编码进程已退出时抛出 EncoderError"""
+        if self.error is not None:
+            raise EncoderError(self.error)
+        if frame.shape[1] != self.frame_size[0] or frame.shape[0] != self.frame_size[1]:
+            frame = cv2.resize(frame, self.frame_size)
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        if self.drop_when_full:
+            try:
+                self._queue.put_nowait(frame)
+            except queue.Full:
+                self.dropped += 1
+                return False
+        else:
+            start = time.perf_counter()
+            self._queue.put(frame)
+            self.blocked_ms += (time.perf_counter() - start) * 1000.0
+        return True
+
+    def close(self):
+        """等待写完并结束 ffmpeg；编码失败时抛出 EncoderError"""
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.wait()
+        self._stderr_thread.join()
+        if self.error is None and self.process.returncode != 0:
+            self.error = f"ffmpeg 退出码 {self.process.returncode}: {self._stderr_text()}"
+        if self.error is not None:
+            raise EncoderError(self.error)
+
+    @property
+    def stats(self):
+        stats = super().stats
+        stats.update({"queue_depth": self._queue.qsize(), "max_queue_depth": self.max_queue_depth,
+                      "dropped": self.dropped, "blocked_ms": self.blocked_ms})
+        return stats
+
+
+def create_encoder(path, frame_size, fps, codec="auto", preset="veryfast", crf=23,
+                   drop_when_full=False):
+    """按需选择编码后端；没有ffmpeg或选择 mp4v 时使用 cv2.VideoWriter"""
+    if codec == "mp4v" or not ffmpeg_available():
+        return VideoWriterEncoder(path, frame_size, fps)
+    codec = resolve_codec(codec)
+    if codec not in list_ffmpeg_encoders():
+        print(f"ffmpeg 不支持编码器 {codec}，改用 libx264")
+        codec = "libx264"
+    return FFmpegEncoder(path, frame_size, fps, codec=codec, preset=preset, crf=crf,
+                         drop_when_full=drop_when_full)
@@ -0,0 +1,202 @@
+import numpy as np
+
+# 人脸库超过这个数量时自动建立倒排索引（IVF），之下直接做整矩阵点积
+IVF_MIN_SIZE = 10000
+
+
+def normalize(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores, k):
+    """按行取前k大，返回 (分数, 下标)，均按分数降序"""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.zeros((scores.shape[0], 0))
+        return empty.astype(np.float32), empty.astype(np.int64)
+    if k < scores.shape[1]:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    return np.take_along_axis(part_scores, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+
+class IVFIndex:
+    """倒排文件索引：k-means 把特征分到 nlist 个簇，查询时只精确计算最近 nprobe 个簇里的向量
+
+    512维 float32 特征十万条也只有两百MB，所以簇内保存原始向量（IVF-Flat），不做PQ压缩。
+    """
+
+    def __init__(self, embeddings, nlist=None, nprobe=8, iterations=10, seed=0):
+        count = len(embeddings)
+        self.nlist = nlist or max(1, int(np.sqrt(count)))
+        self.nprobe = nprobe
+        rng = np.random.default_rng(seed)
+        # 用抽样训练质心，十万级数据也只需零点几秒
+        sample = embeddings[rng.choice(count, min(count, self.nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), self.nlist, replace=False)]
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(self.nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = normalize(centroids)
+        self.centroids = centroids
+        self.assign(embeddings)
+
+    def assign(self, embeddings):
+        labels = np.argmax(embeddings @ self.centroids.T, axis=1)
+        self.lists = [np.flatnonzero(labels == c) for c in range(self.nlist)]
+
+    def add(self, index, embedding):
+        c = int(np.argmax(self.centroids @ embedding))
+        self.lists[c] = np.append(self.lists[c], index)
+
+    def remove(self, index):
+        # 删除后面的下标整体前移一位
+        lists = []
+        for members in self.lists:
+            members = members[members != index]
+            lists.append(np.where(members > index, members - 1, members))
+        self.lists = lists
+
+    def search(self, embeddings, queries, k):
+        probes = _top_k(queries @ self.centroids.T, self.nprobe)[1]
+        all_scores = np.full((len(queries), k), -1.0, dtype=np.float32)
+        all_indices = np.full((len(queries), k), -1, dtype=np.int64)
+        for i, query in enumerate(queries):
+            candidates = np.concatenate([self.lists[c] for c in probes[i]])
+            if not len(candidates):
+                continue
+            scores, order = _top_k((embeddings[candidates] @ query)[None], k)
+            n = scores.shape[1]
+            all_scores[i, :n] = scores[0]
+            all_indices[i, :n] = candidates[order[0]]
+        return all_scores, all_indices
+
+
+class FaceIndex:
+    """人脸库特征索引：所有特征归一化后存成一个连续的 (N, D) float32 矩阵，余弦相似度即点积
+
+    行号与人脸库下标一一对应。库规模达到 IVF_MIN_SIZE 后自动改用 IVF 近似检索。
+    """
+
+    def __init__(self, dim=512, ivf_min_size=IVF_MIN_SIZE, nprobe=8):
+        self.dim = dim
+        self.ivf_min_size = ivf_min_size
+        self.nprobe = nprobe
+        self.embeddings = np.zeros((0, dim), dtype=np.float32)
+        self._count = 0
+        self._ivf = None
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def matrix(self):
+        return self.embeddings[:self._count]
+
+    def add(self, embedding):
+        """追加一条特征，返回其行号；容量按倍数增长，避免每次都整体复制"""
+        embedding = normalize(embedding).reshape(-1)
+        if self._count == len(self.embeddings):
+            grown = np.zeros((max(16, 2 * len(self.embeddings)), self.dim), dtype=np.float32)
+            grown[:self._count] = self.embeddings[:self._count]
+            self.embeddings = grown
+        self.embeddings[self._count] = embedding
+        index = self._count
+        self._count += 1
+        if self._ivf is not None:
+            self._ivf.add(index, embedding)
+        return index
+
+    def remove(self, index):
+        self.embeddings[index:self._count - 1] = self.embeddings[index + 1:self._count]
+        self._count -= 1
+        if self._ivf is not None:
+            self._ivf.remove(index)
+
+    def rebuild(self, embeddings):
+        embeddings = normalize(embeddings).reshape(-1, self.dim) if len(embeddings) else \
+            np.zeros((0, self.dim), dtype=np.float32)
+        self.embeddings = np.ascontiguousarray(embeddings)
+        self._count = len(embeddings)
+        self._ivf = None
+
+    def _ensure_ivf(self):
+        if self._count < self.ivf_min_size:
+            self._ivf = None
+        elif self._ivf is None:
+            self._ivf = IVFIndex(self.matrix, nprobe=self.nprobe)
+        return self._ivf
+
+    def search(self, queries, k=1, exact=False):
+        """queries 为 (D,) 或 (Q, D)；返回 (Q, k) 的相似度和行号，不足k条时下标为 -1"""
+        queries = normalize(queries).reshape(-1, self.dim)
+        ivf = None if exact else self._ensure_ivf()
+        if ivf is not None:
+            return ivf.search(self.matrix, queries, k)
+        scores, indices = _top_k(queries @ self.matrix.T, k)
+        if scores.shape[1] < k:
+            pad = k - scores.shape[1]
+            scores = np.pad(scores, ((0, 0), (0, pad)), constant_values=-1.0)
+            indices = np.pad(indices, ((0, 0), (0, pad)), constant_values=-1)
+        return scores, indices
+
+    def best_match(self, embedding):
+        """返回 (行号, 相似度)；库为空时返回 (-1, -1.0)"""
+        scores, indices = self.search(embedding, k=1)
+        return int(indices[0, 0]), float(scores[0, 0])
+
+
+# 相似度超过此值视为同一人的重复照片
+DUPLICATE_THRESHOLD = 0.6
+# 自动映射时，与人脸库最相似的人脸余弦相似度超过此值才认定为同一人
+AUTO_MATCH_THRESHOLD = 0.4
+
+
+def auto_source(index, embedding, identity_sources, default_source, threshold=AUTO_MATCH_THRESHOLD):
+    """按人脸库识别一张人脸并决定换成哪张源人脸
+
+    返回 (身份行号, 相似度, 源人脸下标)。identity_sources 为 {身份行号: 源人脸下标}，没有配置的身份
+    换成 default_source；库为空、相似度低于阈值或没有可用源人脸时源人脸下标为 -1。
+    """
+    identity, score = index.best_match(embedding)
+    if identity < 0 or score < threshold:
+        return identity, score, -1
+    return identity, score, identity_sources.get(identity, default_source)
+
+
+def duplicate_groups(index, threshold=DUPLICATE_THRESHOLD, k=10):
+    """对整个人脸库聚类查重：每条特征只查 k 个近邻，相似度超过阈值的连边，再用并查集合并成组
+
+    返回行号列表的列表（每组按行号升序，只包含两张以上的组）。
+    """
+    count = len(index)
+    if count < 2:
+        return []
+    parent = np.arange(count)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    scores, neighbors = index.search(index.matrix, k=min(k + 1, count))
+    rows, cols = np.nonzero(scores >= threshold)
+    for i, j in zip(rows, neighbors[rows, cols]):
+        if j >= 0 and i != j:
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    groups = {}
+    for i in range(count):
+        groups.setdefault(find(i), []).append(i)
+    return [members for members in groups.values() if len(members) > 1]
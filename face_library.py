@@ -0,0 +1,166 @@
+import os
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+import face_ops
+from face_index import FaceIndex
+
+# 原图缓存默认上限（MB），可用环境变量 SWAPPER_IMAGE_CACHE_MB 或配置文件 image_cache_mb 修改
+DEFAULT_CACHE_MB = 256
+THUMBNAIL_HEIGHT = 120
+
+
+def read_image(path):
+    # 使用numpy直接读取文件，避免cv2中文路径问题
+    return cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def make_thumbnail(img, height=THUMBNAIL_HEIGHT):
+    h, w = img.shape[:2]
+    width = max(1, int(round(height * w / h)))
+    return cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA)
+
+
+class ImageCache:
+    """按路径缓存解码后的原图，总字节数超过上限时淘汰最久未用的"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._images = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, path):
+        img = self._images.get(path)
+        if img is not None:
+            self._images.move_to_end(path)
+            self.stats["hits"] += 1
+            return img
+        self.stats["misses"] += 1
+        img = read_image(path)
+        if img is not None:
+            self.put(path, img)
+        return img
+
+    def put(self, path, img):
+        self.discard(path)
+        if img.nbytes > self.max_bytes:
+            return
+        self._images[path] = img
+        self.bytes += img.nbytes
+        while self.bytes > self.max_bytes:
+            _, evicted = self._images.popitem(last=False)
+            self.bytes -= evicted.nbytes
+            self.stats["evictions"] += 1
+
+    def discard(self, path):
+        img = self._images.pop(path, None)
+        if img is not None:
+            self.bytes -= img.nbytes
+
+    def clear(self):
+        self._images.clear()
+        self.bytes = 0
+
+
+class LibraryEntry:
+    """人脸库中的一张源人脸：只保存路径、名称、特征、latent 和缩略图，原图需要时再解码
+
+    带有 normed_embedding 属性，可以直接作为 swapper.get 的 source_face 使用。
+    """
+
+    __slots__ = ("path", "name", "embedding", "normed_embedding", "latent", "thumbnail")
+
+    def __init__(self, path, name, embedding, latent, thumbnail):
+        self.path = path
+        self.name = name
+        self.embedding = np.asarray(embedding, dtype=np.float32)
+        self.normed_embedding = self.embedding / np.linalg.norm(self.embedding)
+        self.latent = latent
+        self.thumbnail = thumbnail
+
+
+class FaceLibrary:
+    """源人脸库：条目列表 + 特征索引 + 原图LRU缓存，下标在三者之间保持一致"""
+
+    def __init__(self, cache_mb=DEFAULT_CACHE_MB, thumbnail_height=THUMBNAIL_HEIGHT):
+        self.entries = []
+        self.index = FaceIndex()
+        self.images = ImageCache(int(cache_mb * 1024 * 1024))
+        self.thumbnail_height = thumbnail_height
+        # 设置后在添加时预先计算换脸用的 latent
+        self.swapper = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, idx):
+        return self.entries[idx]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    @property
+    def names(self):
+        return [entry.name for entry in self.entries]
+
+    def add(self, path, name, img, face):
+        """img 只用来生成缩略图，条目和缓存都不持有原图；需要原图时由 image() 重新解码"""
+        latent = None
+        if self.swapper is not None:
+            latent = face_ops.source_latent(self.swapper, face.normed_embedding)
+        entry = LibraryEntry(path, name, face.embedding, latent, make_thumbnail(img, self.thumbnail_height))
+        self.entries.append(entry)
+        self.index.add(entry.normed_embedding)
+        return entry
+
+    def remove(self, idx):
+        entry = self.entries.pop(idx)
+        self.index.remove(idx)
+        # 同一文件可能被导入多次，只有最后一个条目删除时才清出缓存
+        if not any(other.path == entry.path for other in self.entries):
+            self.images.discard(entry.path)
+        return entry
+
+    def reanalyze(self, analyze):
+        """用 analyze(原图) 返回的人脸重新计算每个条目的特征（例如检测分辨率改变后）
+
+        原图逐张按需解码，不会同时全部留在内存里；文件已丢失或检测不到人脸的条目被移除。
+        返回 {旧下标: 新下标}。
+        """
+        old_entries = self.entries
+        self.entries = []
+        self.index = FaceIndex()
+        mapping = {}
+        for i, entry in enumerate(old_entries):
+            img = self._decode(entry.path)
+            face = analyze(img) if img is not None else None
+            if face is None:
+                continue
+            mapping[i] = len(self.entries)
+            self.add(entry.path, entry.name, img, face)
+        return mapping
+
+    def image(self, idx):
+        """按需解码原图（经过LRU缓存）；文件已被移走时返回 None"""
+        return self._decode(self.entries[idx].path)
+
+    def _decode(self, path):
+        if not os.path.exists(path):
+            return None
+        return self.images.get(path)
+
+    @property
+    def memory_bytes(self):
+        """缩略图 + 特征 + 缓存中原图的总字节数"""
+        entries = sum(entry.thumbnail.nbytes + entry.embedding.nbytes * 2
+                      + (entry.latent.nbytes if entry.latent is not None else 0) for entry in self.entries)
+        return entries + self.index.embeddings.nbytes + self.images.bytes
+
+    def summary(self):
+        stats = self.images.stats
+        return (f"人脸库 {len(self.entries)} 张，内存 {self.memory_bytes / (1024 * 1024):.1f}MB"
+                f"（原图缓存 {self.images.bytes / (1024 * 1024):.1f}MB，"
+                f"命中 {stats['hits']} / 未命中 {stats['misses']} / 淘汰 {stats['evictions']}）")
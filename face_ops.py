@@ -0,0 +1,273 @@
+import functools
+
+import cv2
+import numpy as np
+
+# ArcFace 标准五点模板（112x112），与 insightface.utils.face_align 一致
+ARCFACE_DST = np.array([[38.2946, 51.6963], [73.5318, 51.5014], [56.0252, 71.7366],
+                        [41.5493, 92.3655], [70.7299, 92.2041]], dtype=np.float32)
+
+
+def _umeyama(src, dst):
+    # 相似变换最小二乘估计（旋转+等比缩放+平移）
+    num, dim = src.shape
+    src_mean = src.mean(axis=0)
+    dst_mean = dst.mean(axis=0)
+    src_demean = src - src_mean
+    dst_demean = dst - dst_mean
+
+    A = dst_demean.T @ src_demean / num
+    d = np.ones((dim,), dtype=np.float64)
+    if np.linalg.det(A) < 0:
+        d[dim - 1] = -1
+
+    U, S, V = np.linalg.svd(A)
+    T = np.eye(dim + 1, dtype=np.float64)
+    T[:dim, :dim] = U @ np.diag(d) @ V
+    scale = 1.0 / src_demean.var(axis=0).sum() * (S @ d)
+    T[:dim, dim] = dst_mean - scale * (T[:dim, :dim] @ src_mean)
+    T[:dim, :dim] *= scale
+    return T[:2]
+
+
+def estimate_norm(kps, image_size=112):
+    """计算把五点关键点对齐到标准模板的仿射矩阵"""
+    if image_size % 112 == 0:
+        ratio = image_size / 112.0
+        diff_x = 0.0
+    else:
+        ratio = image_size / 128.0
+        diff_x = 8.0 * ratio
+    dst = ARCFACE_DST * ratio
+    dst[:, 0] += diff_x
+    return _umeyama(np.asarray(kps, dtype=np.float64), dst.astype(np.float64)).astype(np.float32)
+
+
+def align_crop(img, kps, image_size=128):
+    M = estimate_norm(kps, image_size)
+    aimg = cv2.warpAffine(img, M, (image_size, image_size), borderValue=0.0)
+    return aimg, M
+
+
+def letterbox_params(height, width, input_size):
+    # 与 RetinaFace.detect 相同的等比缩放规则（左上角对齐，右下补零）
+    im_ratio = float(height) / width
+    model_ratio = float(input_size[1]) / input_size[0]
+    if im_ratio > model_ratio:
+        new_height = input_size[1]
+        new_width = int(new_height / im_ratio)
+    else:
+        new_width = input_size[0]
+        new_height = int(new_width * im_ratio)
+    det_scale = float(new_height) / height
+    return new_width, new_height, det_scale
+
+
+def letterbox(img, input_size):
+    new_width, new_height, det_scale = letterbox_params(img.shape[0], img.shape[1], input_size)
+    det_img = np.zeros((input_size[1], input_size[0], 3), dtype=np.uint8)
+    det_img[:new_height, :new_width] = cv2.resize(img, (new_width, new_height))
+    return det_img, det_scale
+
+
+def detector_supports_batch(det_model):
+    """检测模型能否一次推理多张图：导出时带 batch 维的模型输出为 (batch, N, C) 三维
+
+    buffalo_l 自带的 det_10g 输出是二维、batch 固定为1，只能逐张推理。结果缓存在 det_model.batched 上。
+    """
+    batched = getattr(det_model, "batched", None)
+    if batched is None:
+        batched = all(len(output.shape) == 3 for output in det_model.session.get_outputs())
+        det_model.batched = batched
+    return batched
+
+
+def detector_blob(det_model, det_img):
+    input_size = (det_img.shape[1], det_img.shape[0])
+    mean = det_model.input_mean
+    return cv2.dnn.blobFromImage(det_img, 1.0 / det_model.input_std, input_size,
+                                 (mean, mean, mean), swapRB=True)
+
+
+def _anchor_centers(det_model, height, width, stride):
+    key = (height, width, stride)
+    centers = det_model.center_cache.get(key)
+    if centers is None:
+        centers = np.stack(np.mgrid[:height, :width][::-1], axis=-1).astype(np.float32)
+        centers = (centers * stride).reshape((-1, 2))
+        if det_model._num_anchors > 1:
+            centers = np.stack([centers] * det_model._num_anchors, axis=1).reshape((-1, 2))
+        if len(det_model.center_cache) < 100:
+            det_model.center_cache[key] = centers
+    return centers
+
+
+def nms(dets, thresh):
+    x1, y1, x2, y2, scores = dets[:, 0], dets[:, 1], dets[:, 2], dets[:, 3], dets[:, 4]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        w = np.maximum(0.0, xx2 - xx1 + 1)
+        h = np.maximum(0.0, yy2 - yy1 + 1)
+        inter = w * h
+        ovr = inter / (areas[i] + areas[order[1:]] - inter)
+        order = order[np.where(ovr <= thresh)[0] + 1]
+    return keep
+
+
+def decode_detections(det_model, net_outs, input_size, det_scale, batch_index=0, threshold=None):
+    """把 det_10g 的原始输出解码为 (N,5) 框+分数 和 (N,5,2) 关键点，坐标已还原到原图"""
+    threshold = det_model.det_thresh if threshold is None else threshold
+    input_width, input_height = input_size
+    fmc = det_model.fmc
+    scores_list, bboxes_list, kpss_list = [], [], []
+    for idx, stride in enumerate(det_model._feat_stride_fpn):
+        scores = net_outs[idx]
+        bbox_preds = net_outs[idx + fmc]
+        kps_preds = net_outs[idx + fmc * 2] if det_model.use_kps else None
+        if scores.ndim == 3:
+            scores = scores[batch_index]
+            bbox_preds = bbox_preds[batch_index]
+            if kps_preds is not None:
+                kps_preds = kps_preds[batch_index]
+        bbox_preds = bbox_preds * stride
+
+        height = input_height // stride
+        width = input_width // stride
+        centers = _anchor_centers(det_model, height, width, stride)
+
+        pos_inds = np.where(scores >= threshold)[0]
+        d = bbox_preds[pos_inds]
+        c = centers[pos_inds]
+        bboxes_list.append(np.stack([c[:, 0] - d[:, 0], c[:, 1] - d[:, 1],
+                                     c[:, 0] + d[:, 2], c[:, 1] + d[:, 3]], axis=-1))
+        scores_list.append(scores[pos_inds])
+        if kps_preds is not None:
+            k = (kps_preds[pos_inds] * stride).reshape((-1, 5, 2))
+            kpss_list.append(k + c[:, None, :])
+
+    scores = np.vstack(scores_list).ravel()
+    if scores.size == 0:
+        return np.zeros((0, 5), dtype=np.float32), np.zeros((0, 5, 2), dtype=np.float32)
+    order = scores.argsort()[::-1]
+    bboxes = np.vstack(bboxes_list) / det_scale
+    pre_det = np.hstack((bboxes, scores[:, None])).astype(np.float32, copy=False)[order]
+    keep = nms(pre_det, det_model.nms_thresh)
+    det = pre_det[keep]
+    if kpss_list:
+        kpss = (np.vstack(kpss_list) / det_scale)[order][keep].astype(np.float32)
+    else:
+        kpss = np.zeros((len(det), 5, 2), dtype=np.float32)
+    return det, kpss
+
+
+def source_latent(swapper, normed_embedding):
+    latent = np.asarray(normed_embedding, dtype=np.float32).reshape((1, -1))
+    latent = np.dot(latent, swapper.emap)
+    latent /= np.linalg.norm(latent)
+    return latent.astype(np.float32)
+
+
+def swapper_blob(swapper, aimg):
+    mean = swapper.input_mean
+    return cv2.dnn.blobFromImage(aimg, 1.0 / swapper.input_std, swapper.input_size,
+                                 (mean, mean, mean), swapRB=True)
+
+
+def pred_to_bgr(pred):
+    img_fake = pred.transpose((0, 2, 3, 1))[0]
+    return np.clip(255 * img_fake, 0, 255).astype(np.uint8)[:, :, ::-1]
+
+
+def run_swapper(swapper, blob, latent):
+    pred = swapper.session.run(swapper.output_names,
+                               {swapper.input_names[0]: blob, swapper.input_names[1]: latent})[0]
+    return pred_to_bgr(pred)
+
+
+def paste_mask_params(M, image_size=128):
+    """把 INSwapper.get 在整帧上的遮罩参数换算到对齐空间，返回 (腐蚀边宽, 高斯核大小)
+
+    INSwapper 按人脸在原图中外接框的边长 mask_size 用 max(mask_size//10, 10) 的方形核腐蚀，
+    再做核大小为 2*max(mask_size//20, 5)+1 的高斯模糊。两个下限让小脸的羽化相对更宽，
+    所以对齐空间里的参数随人脸大小和旋转变化。
+    """
+    scale = float(np.sqrt(abs(np.linalg.det(M[:, :2]))))
+    angle = np.arctan2(M[1, 0], M[0, 0])
+    # 旋转后的人脸在原图中的外接框、以及轴对齐方形核沿人脸边的腐蚀深度，都要乘这个系数
+    spread = abs(np.cos(angle)) + abs(np.sin(angle))
+    mask_size = int(image_size / scale * spread)
+    erode = max(mask_size // 10, 10)
+    blur = 2 * max(mask_size // 20, 5) + 1
+    margin = min(max(1, int(round(erode / 2 * scale * spread))), image_size // 2 - 1)
+    ksize = max(3, int(round(blur * scale)) | 1)
+    return margin, ksize
+
+
+@functools.lru_cache(maxsize=64)
+def _feather_mask(image_size, margin, ksize):
+    mask = np.zeros((image_size, image_size), dtype=np.float32)
+    mask[margin:-margin, margin:-margin] = 1.0
+    mask = cv2.GaussianBlur(mask, (ksize, ksize), 0)
+    # 多张人脸、多个线程共用同一个缓存数组
+    mask.setflags(write=False)
+    return mask
+
+
+def paste_mask(M, image_size=128):
+    """该人脸在对齐空间里的羽化遮罩，与 INSwapper.get 整帧腐蚀+高斯模糊的效果一致；按参数缓存，只读"""
+    return _feather_mask(image_size, *paste_mask_params(M, image_size))
+
+
+def warped_bounds(IM, image_size, width, height):
+    # 对齐裁剪块逆变换回原图后的外接矩形，裁到画面范围内
+    corners = np.array([[0, 0, 1], [image_size, 0, 1],
+                        [0, image_size, 1], [image_size, image_size, 1]], dtype=np.float32)
+    pts = corners @ IM.T
+    x0 = max(int(np.floor(pts[:, 0].min())), 0)
+    y0 = max(int(np.floor(pts[:, 1].min())), 0)
+    x1 = min(int(np.ceil(pts[:, 0].max())) + 1, width)
+    y1 = min(int(np.ceil(pts[:, 1].max())) + 1, height)
+    return x0, y0, x1, y1
+
+
+def warp_back(bgr_fake, M, width, height):
+    """把换脸结果和遮罩逆变换回原图坐标，返回 (x0, y0, x1, y1, fake, alpha)；不在画面内时返回 None
+
+    只读不写原图，可以在工作线程里提前算好，再由 composite 按顺序贴回。
+    """
+    mask = paste_mask(M, bgr_fake.shape[0])
+    IM = cv2.invertAffineTransform(M)
+    x0, y0, x1, y1 = warped_bounds(IM, bgr_fake.shape[0], width, height)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    IM[:, 2] -= (x0, y0)
+    size = (x1 - x0, y1 - y0)
+    fake = cv2.warpAffine(bgr_fake, IM, size, borderValue=0.0).astype(np.float32)
+    alpha = cv2.warpAffine(mask, IM, size, borderValue=0.0)[:, :, None]
+    return x0, y0, x1, y1, fake, alpha
+
+
+def composite(img, warped, blend=1.0):
+    """把 warp_back 的结果混合到 img 上（原地修改）"""
+    if warped is None:
+        return img
+    x0, y0, x1, y1, fake, alpha = warped
+    if blend < 1.0:
+        alpha = alpha * blend
+    roi = img[y0:y1, x0:x1].astype(np.float32)
+    img[y0:y1, x0:x1] = (roi + alpha * (fake - roi)).astype(np.uint8)
+    return img
+
+
+def paste_back(img, bgr_fake, M, blend=1.0):
+    """把换脸结果贴回原图（原地修改），只处理人脸所在的局部区域"""
+    h, w = img.shape[:2]
+    return composite(img, warp_back(bgr_fake, M, w, h), blend)
@@ -0,0 +1,91 @@
+import numpy as np
+
+
+def iou_matrix(a, b):
+    """a (M,4), b (N,4) -> (M,N)"""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-6)
+
+
+class Track:
+    __slots__ = ("track_id", "bbox", "hits", "misses", "identified", "identity", "identity_score")
+
+    def __init__(self, track_id, bbox):
+        self.track_id = track_id
+        self.bbox = bbox
+        self.hits = 1
+        self.misses = 0
+        # 自动映射：每条轨迹只识别一次
+        self.identified = False
+        self.identity = -1
+        self.identity_score = 0.0
+
+
+class FaceTracker:
+    """按框的IoU贪心匹配前后帧人脸，给每个人一个稳定的轨迹ID
+
+    连续 max_misses 帧没匹配上的轨迹被移除，移除的ID通过 update 的返回值告知调用方。
+    """
+
+    def __init__(self, iou_threshold=0.3, max_misses=15):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.tracks = {}
+        self._next_id = 1
+
+    def reset(self):
+        """清空所有轨迹，返回被移除的ID（与 update 的 removed 一样需要调用方清理映射）；ID不会重新从1开始"""
+        removed = list(self.tracks.keys())
+        self.tracks = {}
+        return removed
+
+    def update(self, bboxes):
+        """bboxes (N,4)；返回 (每个检测框对应的轨迹ID列表, 本帧被移除的轨迹ID列表)"""
+        bboxes = np.asarray(bboxes, dtype=np.float32).reshape(-1, 4)
+        track_ids = list(self.tracks.keys())
+        assigned = [-1] * len(bboxes)
+
+        if track_ids and len(bboxes):
+            ious = iou_matrix([self.tracks[t].bbox for t in track_ids], bboxes)
+            # 从IoU最大的配对开始贪心分配
+            pairs = np.dstack(np.unravel_index(np.argsort(-ious, axis=None), ious.shape))[0]
+            used_tracks = set()
+            for ti, di in pairs:
+                if ious[ti, di] < self.iou_threshold:
+                    break
+                if ti in used_tracks or assigned[di] != -1:
+                    continue
+                used_tracks.add(ti)
+                assigned[di] = track_ids[ti]
+
+        matched = set()
+        for di, track_id in enumerate(assigned):
+            if track_id == -1:
+                track_id = self._next_id
+                self._next_id += 1
+                self.tracks[track_id] = Track(track_id, bboxes[di])
+                assigned[di] = track_id
+            else:
+                track = self.tracks[track_id]
+                track.bbox = bboxes[di]
+                track.hits += 1
+                track.misses = 0
+            matched.add(track_id)
+
+        removed = []
+        for track_id in list(self.tracks.keys()):
+            if track_id not in matched:
+                track = self.tracks[track_id]
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    del self.tracks[track_id]
+                    removed.append(track_id)
+        return assigned, removed
@@ -0,0 +1,115 @@
+import time
+
+# 每帧留给换脸的时间（毫秒），预览定时器为30ms一帧
+DEFAULT_BUDGET_MS = 20.0
+# 映射后多少帧内算作"刚映射"，优先刷新
+RECENT_FRAMES = 30
+NEVER = -10 ** 9
+
+
+class FrameBudget:
+    """多人脸换脸的每帧时间预算
+
+    每帧按优先级排序：从未换过的脸最先，其次是距上次刷新的帧数、人脸大小和是否刚映射。
+    按顺序换脸，预计下一张会超出预算时，剩下的人脸直接贴回各自最近一次的换脸结果（CachedSwapper.paste_cached）。
+    被推迟的脸下一帧优先级更高，所以人多时各张脸轮流刷新，帧率不随人数线性下降。
+    """
+
+    def __init__(self, budget_ms=DEFAULT_BUDGET_MS, enabled=True, recent_frames=RECENT_FRAMES, cost_alpha=0.2):
+        self.budget_ms = budget_ms
+        self.enabled = enabled
+        self.recent_frames = recent_frames
+        self.cost_alpha = cost_alpha
+        # 单张人脸推理耗时的滑动平均（毫秒）
+        self.cost_ms = 0.0
+        self.frame = 0
+        self._last_refresh = {}
+        self._mapped_at = {}
+        self._sources = {}
+        self.stats = {"frames": 0, "refreshed": 0, "deferred": 0, "over_budget": 0}
+
+    def forget(self, track_key):
+        self._last_refresh.pop(track_key, None)
+        self._mapped_at.pop(track_key, None)
+        self._sources.pop(track_key, None)
+
+    def clear(self):
+        self._last_refresh.clear()
+        self._mapped_at.clear()
+        self._sources.clear()
+
+    def prioritize(self, jobs):
+        """jobs: [(track_key, kps, source, bbox)]，返回按优先级从高到低的下标"""
+        areas = [max(0.0, float((b[2] - b[0]) * (b[3] - b[1]))) for _, _, _, b in jobs]
+        max_area = max(areas) if areas else 0.0
+        scores = []
+        for (key, _, source, _), area in zip(jobs, areas):
+            if self._sources.get(key) != id(source):
+                self._sources[key] = id(source)
+                self._mapped_at[key] = self.frame
+            staleness = self.frame - self._last_refresh.get(key, NEVER)
+            recent = self.frame - self._mapped_at.get(key, NEVER) < self.recent_frames
+            scores.append(staleness + 2.0 * (area / max_area if max_area else 0.0) + (3.0 if recent else 0.0))
+        return sorted(range(len(jobs)), key=lambda i: -scores[i])
+
+    def _update_cost(self, cost):
+        self.cost_ms = cost if not self.cost_ms else self.cost_ms + self.cost_alpha * (cost - self.cost_ms)
+
+    def _run_parallel(self, swapper, img, output, jobs, blend, executor, order, start):
+        # 并行时无法边换边计时：按上一帧测得的"每次推理的墙钟耗时"预先算出能刷新几张，其余复用
+        limit = len(order)
+        if self.enabled and self.cost_ms:
+            limit = max(1, int(self.budget_ms // self.cost_ms))
+        reuse = {jobs[i][0] for i in order[limit:]}
+        statuses = swapper.swap_many(img, output, [(key, kps, source) for key, kps, source, _ in jobs],
+                                     blend=blend, executor=executor, reuse=reuse)
+        inferred = statuses.count("miss")
+        if inferred:
+            self._update_cost((time.perf_counter() - start) * 1000 / inferred)
+        refreshed = 0
+        for (key, _, _, _), status in zip(jobs, statuses):
+            if status == "deferred":
+                self.stats["deferred"] += 1
+            else:
+                self._last_refresh[key] = self.frame
+                refreshed += 1
+        return refreshed
+
+    def _run_serial(self, swapper, img, output, jobs, blend, order, start):
+        refreshed = 0
+        for i in order:
+            key, kps, source, _ = jobs[i]
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            # 每帧至少刷新一张，避免预算过小时全部停住
+            if (self.enabled and refreshed and elapsed_ms + self.cost_ms > self.budget_ms
+                    and swapper.paste_cached(output, kps, source, track_key=key, blend=blend)):
+                self.stats["deferred"] += 1
+                continue
+
+            misses = swapper.stats["misses"]
+            t0 = time.perf_counter()
+            swapper.swap(img, output, kps, source, track_key=key, blend=blend)
+            if swapper.stats["misses"] != misses:
+                # 只用真正推理的耗时更新估计，缓存命中不算
+                self._update_cost((time.perf_counter() - t0) * 1000)
+            self._last_refresh[key] = self.frame
+            refreshed += 1
+        return refreshed
+
+    def run(self, swapper, img, output, jobs, blend=1.0, executor=None):
+        """在预算内对 jobs 换脸（从 img 裁剪，贴到 output 上），返回本帧实际刷新的人脸数
+
+        传入 SwapExecutor 时被选中刷新的人脸并行推理，贴回按 jobs 顺序进行。
+        """
+        self.frame += 1
+        self.stats["frames"] += 1
+        start = time.perf_counter()
+        order = self.prioritize(jobs)
+        if executor is not None:
+            refreshed = self._run_parallel(swapper, img, output, jobs, blend, executor, order, start)
+        else:
+            refreshed = self._run_serial(swapper, img, output, jobs, blend, order, start)
+        self.stats["refreshed"] += refreshed
+        if (time.perf_counter() - start) * 1000 > self.budget_ms:
+            self.stats["over_budget"] += 1
+        return refreshed
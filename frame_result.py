@@ -0,0 +1,149 @@
+import cv2
+import numpy as np
+
+import face_ops
+
+
+class FaceView:
+    """FrameFaces 中单张人脸的只读视图，属性名与 insightface 的 Face 一致，可直接传给 swapper.get"""
+
+    __slots__ = ("faces", "index")
+
+    def __init__(self, faces, index):
+        self.faces = faces
+        self.index = index
+
+    @property
+    def bbox(self):
+        return self.faces.bboxes[self.index]
+
+    @property
+    def kps(self):
+        return self.faces.kpss[self.index]
+
+    @property
+    def det_score(self):
+        return float(self.faces.scores[self.index])
+
+    @property
+    def landmark_2d_106(self):
+        if self.faces.landmarks is None:
+            return None
+        return self.faces.landmarks[self.index]
+
+    @property
+    def embedding(self):
+        if self.faces.embeddings is None or not self.faces.embedded[self.index]:
+            return None
+        return self.faces.embeddings[self.index]
+
+    @property
+    def normed_embedding(self):
+        embedding = self.embedding
+        if embedding is None:
+            return None
+        return embedding / np.linalg.norm(embedding)
+
+
+class FrameFaces:
+    """一帧的全部检测结果，按人脸堆叠成数组：bboxes (N,4)、scores (N,)、kpss (N,5,2)，
+    可选 landmarks (N,106,2) 和 embeddings (N,D)（embedded 标记哪些行已计算）"""
+
+    __slots__ = ("bboxes", "scores", "kpss", "landmarks", "embeddings", "embedded")
+
+    def __init__(self, bboxes, scores, kpss):
+        self.bboxes = bboxes
+        self.scores = scores
+        self.kpss = kpss
+        self.landmarks = None
+        self.embeddings = None
+        self.embedded = None
+
+    @classmethod
+    def from_detections(cls, dets, kpss):
+        dets = np.asarray(dets, dtype=np.float32).reshape(-1, 5)
+        if kpss is None:
+            kpss = np.zeros((len(dets), 5, 2), dtype=np.float32)
+        return cls(dets[:, :4], dets[:, 4], np.asarray(kpss, dtype=np.float32).reshape(-1, 5, 2))
+
+    @classmethod
+    def empty(cls):
+        return cls.from_detections(np.zeros((0, 5), dtype=np.float32), None)
+
+    def __len__(self):
+        return len(self.bboxes)
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+        return FaceView(self, index % len(self))
+
+    def __iter__(self):
+        return (FaceView(self, i) for i in range(len(self)))
+
+    def hit_test(self, x, y):
+        """返回第一个包含点 (x, y) 的人脸下标，没有时返回 -1"""
+        b = self.bboxes
+        hits = np.flatnonzero((b[:, 0] <= x) & (x <= b[:, 2]) & (b[:, 1] <= y) & (y <= b[:, 3]))
+        return int(hits[0]) if len(hits) else -1
+
+
+def detect_faces(app, img, max_num=0, input_size=None):
+    """只做检测，不构造 Face 对象，也不跑识别等其他子模型
+
+    input_size 可临时指定更小的检测输入（如待机时的 (160, 160)），None 表示使用 prepare 时的 det_size。
+    推理服务的检测尺寸由服务端固定，此参数对其无效。
+    """
+    if hasattr(app, "det_model"):
+        dets, kpss = app.det_model.detect(img, input_size=input_size, max_num=max_num, metric="default")
+    else:
+        # 推理服务客户端
+        dets, kpss = app.detect(img, max_num=max_num)
+    return FrameFaces.from_detections(dets, kpss)
+
+
+def compute_embeddings(app, img, faces, indices=None):
+    """按需为部分人脸计算识别特征，一批送入识别模型"""
+    if indices is None:
+        indices = range(len(faces))
+    if faces.embeddings is None:
+        faces.embedded = np.zeros(len(faces), dtype=bool)
+    indices = [i for i in indices if not faces.embedded[i]]
+    if not indices:
+        return faces
+
+    if hasattr(app, "det_model"):
+        rec = app.models["recognition"]
+        crops = [face_ops.align_crop(img, faces.kpss[i], rec.input_size[0])[0] for i in indices]
+        blob = cv2.dnn.blobFromImages(crops, 1.0 / rec.input_std, rec.input_size,
+                                      (rec.input_mean,) * 3, swapRB=True)
+        embeddings = rec.session.run(rec.output_names, {rec.input_name: blob})[0]
+    else:
+        embeddings = app.embed(img, faces.kpss[indices])
+
+    if faces.embeddings is None:
+        faces.embeddings = np.zeros((len(faces), embeddings.shape[1]), dtype=np.float32)
+    faces.embeddings[indices] = embeddings
+    faces.embedded[indices] = True
+    return faces
+
+
+def compute_landmarks(model, img, faces):
+    """106点关键点（与 insightface Landmark.get 相同的裁剪和还原），结果存入 faces.landmarks"""
+    from insightface.utils import face_align
+
+    size = model.input_size[0]
+    landmarks = np.zeros((len(faces), model.lmk_num, 2), dtype=np.float32)
+    for i, bbox in enumerate(faces.bboxes):
+        w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+        center = ((bbox[2] + bbox[0]) / 2, (bbox[3] + bbox[1]) / 2)
+        scale = size / (max(w, h) * 1.5)
+        aimg, M = face_align.transform(img, center, size, scale, 0)
+        blob = cv2.dnn.blobFromImage(aimg, 1.0 / model.input_std, model.input_size,
+                                     (model.input_mean,) * 3, swapRB=True)
+        pred = model.session.run(model.output_names, {model.input_name: blob})[0][0]
+        pred = pred.reshape((-1, 2))[-model.lmk_num:]
+        pred = (pred + 1) * (size // 2)
+        landmarks[i] = face_align.trans_points(pred, cv2.invertAffineTransform(M))
+    faces.landmarks = landmarks
+    return faces
@@ -0,0 +1,319 @@
+"""可替换的画面来源：摄像头、视频文件、图片序列和本地网络流（RTSP/HTTP）
+
+都提供与 cv2.VideoCapture 相同的 isOpened / read / release，update_frame 不需要区分来源。
+视频文件和图片序列在后台线程里提前解码到有上限的队列中，并支持 seek；
+realtime 为 False 的来源可以不按帧率、全速驱动处理流程，用于演示、测试和性能评测。
+"""
+import glob
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+STREAM_PREFIXES = ("rtsp://", "rtmp://", "http://", "https://", "udp://", "tcp://")
+DEFAULT_PREFETCH = 32
+
+
+class FrameSource:
+    # 实时来源（摄像头、网络流）只能按其自身速度读取；非实时来源可以全速读取
+    realtime = True
+    # 摄像头画面需要水平翻转成镜像
+    mirror = False
+    seekable = False
+    name = ""
+
+    def isOpened(self):
+        raise NotImplementedError
+
+    def read(self):
+        """返回 (ok, frame)，与 cv2.VideoCapture.read 相同"""
+        raise NotImplementedError
+
+    def release(self):
+        pass
+
+    @property
+    def fps(self):
+        return 30.0
+
+    @property
+    def frame_count(self):
+        return 0
+
+    @property
+    def position(self):
+        return 0
+
+    def seek(self, index):
+        raise NotImplementedError(f"{type(self).__name__} 不支持跳转")
+
+
+class CameraSource(FrameSource):
+    mirror = True
+
+    def __init__(self, indices=(0, 1, -1)):
+        # 依次尝试不同的摄像头索引
+        self.cap = None
+        for idx in indices:
+            self.cap = cv2.VideoCapture(idx)
+            if self.cap.isOpened():
+                self.name = f"摄像头 {idx}"
+                break
+
+    def isOpened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def read(self):
+        return self.cap.read()
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+class StreamSource(FrameSource):
+    """网络流：后台线程持续读取、只保留最新一帧，处理慢时不会在解码器缓冲里积压越来越旧的画面"""
+
+    def __init__(self, url):
+        self.name = url
+        self.cap = cv2.VideoCapture(url)
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._taken = 0
+        self._running = self.cap.isOpened()
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._reader, daemon=True)
+        if self._running:
+            self._thread.start()
+
+    def _reader(self):
+        while self._running:
+            ret, frame = self.cap.read()
+            with self._cond:
+                if not ret:
+                    self._running = False
+                    self._cond.notify()
+                    break
+                if self._taken < self._seq:
+                    self.dropped += 1
+                self._frame = frame
+                self._seq += 1
+                self._cond.notify()
+
+    @property
+    def fps(self):
+        return self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    def isOpened(self):
+        return self._running or self._taken < self._seq
+
+    def read(self, timeout=1.0):
+        with self._cond:
+            if self._taken >= self._seq and self._running:
+                self._cond.wait(timeout)
+            if self._taken >= self._seq:
+                return False, None
+            self._taken = self._seq
+            return True, self._frame
+
+    def release(self):
+        self._running = False
+        if self._thread.is_alive():
+            self._thread.join(timeout=1.0)
+        self.cap.release()
+
+
+class _PrefetchSource(FrameSource):
+    """按帧号顺序在后台线程解码到有上限的队列；seek 时递增代号让旧的预取结果作废"""
+
+    realtime = False
+    seekable = True
+
+    def __init__(self, prefetch=DEFAULT_PREFETCH, loop=False):
+        self.loop = loop
+        self._queue = queue.Queue(maxsize=prefetch)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._next_index = 0
+        self._position = 0
+        self._finished = False
+        self._running = True
+        self.stats = {"decoded": 0, "decode_ms": 0.0, "underruns": 0}
+        self._thread = threading.Thread(target=self._decoder, daemon=True)
+
+    def _start(self):
+        self._thread.start()
+
+    # 子类实现：把解码位置设到 index，以及按顺序解码下一帧，返回 (帧号, 帧)，没有更多帧时帧为 None；
+    # 帧号由子类给出，跳过读不出的帧后 position 和 seek 仍与实际帧号一致
+    def _seek_decoder(self, index):
+        raise NotImplementedError
+
+    def _decode_next(self):
+        raise NotImplementedError
+
+    def _decoder(self):
+        generation = -1
+        while self._running:
+            with self._lock:
+                if generation != self._generation:
+                    generation = self._generation
+                    self._seek_decoder(self._next_index)
+                start = time.perf_counter()
+                index, frame = self._decode_next()
+                if frame is None and self.loop and index > 0:
+                    self._next_index = 0
+                    self._seek_decoder(0)
+                    continue
+                self._next_index = index + 1
+            if frame is not None:
+                self.stats["decoded"] += 1
+                self.stats["decode_ms"] += (time.perf_counter() - start) * 1000
+            item = (generation, index, frame)
+            while self._running:
+                try:
+                    self._queue.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    if generation != self._generation:
+                        break
+            if frame is None:
+                # 到达结尾，等待 seek 或关闭
+                while self._running and generation == self._generation:
+                    time.sleep(0.01)
+
+    def isOpened(self):
+        return self._running and not self._finished
+
+    def read(self):
+        while self._running:
+            if self._queue.empty():
+                self.stats["underruns"] += 1
+            try:
+                generation, index, frame = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                return False, None
+            if generation != self._generation:
+                continue
+            if frame is None:
+                self._finished = True
+                return False, None
+            self._position = index
+            return True, frame
+        return False, None
+
+    @property
+    def position(self):
+        return self._position
+
+    def seek(self, index):
+        index = max(0, min(int(index), max(0, self.frame_count - 1)))
+        with self._lock:
+            self._generation += 1
+            self._next_index = index
+            self._finished = False
+        # 清掉旧代号的预取帧，解码线程发现代号变化后从新位置开始
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+    def release(self):
+        self._running = False
+        if self._thread.is_alive():
+            self._thread.join(timeout=1.0)
+
+
+class VideoFileSource(_PrefetchSource):
+    def __init__(self, path, prefetch=DEFAULT_PREFETCH, loop=False):
+        super().__init__(prefetch, loop)
+        self.name = os.path.basename(path)
+        self.cap = cv2.VideoCapture(path)
+        self._fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self._count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        self._decoded_index = 0
+        if self.cap.isOpened():
+            self._start()
+        else:
+            self._running = False
+
+    @property
+    def fps(self):
+        return self._fps
+
+    @property
+    def frame_count(self):
+        return self._count
+
+    def _seek_decoder(self, index):
+        if index != self._decoded_index:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        self._decoded_index = index
+
+    def _decode_next(self):
+        ret, frame = self.cap.read()
+        if not ret:
+            return self._decoded_index, None
+        self._decoded_index += 1
+        return self._decoded_index - 1, frame
+
+    def release(self):
+        super().release()
+        self.cap.release()
+
+
+class ImageSequenceSource(_PrefetchSource):
+    def __init__(self, pattern, fps=30.0, prefetch=DEFAULT_PREFETCH, loop=False):
+        super().__init__(prefetch, loop)
+        if os.path.isdir(pattern):
+            files = [os.path.join(pattern, f) for f in os.listdir(pattern)]
+            self.name = os.path.basename(os.path.normpath(pattern))
+        else:
+            files = glob.glob(pattern)
+            self.name = pattern
+        self.files = sorted(f for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+        self._fps = fps
+        self._index = 0
+        if self.files:
+            self._start()
+        else:
+            self._running = False
+
+    @property
+    def fps(self):
+        return self._fps
+
+    @property
+    def frame_count(self):
+        return len(self.files)
+
+    def _seek_decoder(self, index):
+        self._index = index
+
+    def _decode_next(self):
+        while self._index < len(self.files):
+            path = self.files[self._index]
+            self._index += 1
+            # 使用numpy读取，支持中文路径；读不出的文件跳过
+            frame = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is not None:
+                return self._index - 1, frame
+            print(f"无法读取图片: {path}")
+        return self._index, None
+
+
+def open_source(spec=None, **kwargs):
+    """按描述打开来源：None 或数字为摄像头，rtsp:// 等地址为网络流，目录或通配符为图片序列，其余为视频文件"""
+    if spec is None or (isinstance(spec, int)) or (isinstance(spec, str) and spec.lstrip("-").isdigit()):
+        return CameraSource() if spec is None else CameraSource((int(spec),))
+    if spec.lower().startswith(STREAM_PREFIXES):
+        return StreamSource(spec)
+    if os.path.isdir(spec) or any(ch in spec for ch in "*?["):
+        return ImageSequenceSource(spec, **kwargs)
+    return VideoFileSource(spec, **kwargs)
@@ -0,0 +1,230 @@
+import cv2
+import numpy as np
+
+import face_ops
+
+
+def cuda_device_count():
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount()
+    except (AttributeError, cv2.error):
+        return 0
+
+
+class GpuFramePipeline:
+    """整帧常驻显存的换脸流水线：上传 -> 翻转 -> 检测letterbox -> 对齐裁剪 -> inswapper(IOBinding) -> 贴回 -> 下载
+
+    没有CUDA版OpenCV或会话不在CUDA上时，自动退回到等价的CPU实现。
+    """
+
+    def __init__(self, app, swapper, use_cuda=True, mirror=True):
+        self.app = app
+        self.swapper = swapper
+        self.mirror = mirror
+        self.crop_size = swapper.input_size[0]
+        self.use_cuda = use_cuda and self._cuda_ready()
+        # 遮罩随人脸大小变化，按参数缓存已上传的 (遮罩, 1-遮罩)
+        self._gpu_masks = {}
+        self.stats = {
+            "frames": 0,
+            "uploads": 0,
+            "upload_bytes": 0,
+            "downloads": 0,
+            "download_bytes": 0,
+            "fallbacks": 0,
+        }
+
+    @property
+    def backend(self):
+        return "cuda" if self.use_cuda else "cpu"
+
+    def _cuda_ready(self):
+        if cuda_device_count() <= 0:
+            return False
+        if not hasattr(cv2.cuda_GpuMat, "cudaPtr"):
+            return False
+        # 两个会话都必须真正跑在CUDA上，IOBinding才能直接吃显存指针
+        for session in (self.app.det_model.session, self.swapper.session):
+            if "CUDAExecutionProvider" not in session.get_providers():
+                return False
+        return True
+
+    def source_latent(self, face):
+        return face_ops.source_latent(self.swapper, face.normed_embedding)
+
+    def process(self, frame, latent, max_faces=1):
+        """返回 (输出帧BGR, 检测框(N,5), 关键点(N,5,2))"""
+        self.stats["frames"] += 1
+        if self.use_cuda:
+            try:
+                return self._process_cuda(frame, latent, max_faces)
+            except Exception as e:
+                print(f"GPU流水线失败，切换到CPU路径: {str(e)}")
+                self.use_cuda = False
+                self.stats["fallbacks"] += 1
+        return self._process_cpu(frame, latent, max_faces)
+
+    # ---------- CPU 路径 ----------
+
+    def _process_cpu(self, frame, latent, max_faces):
+        det_model = self.app.det_model
+        if self.mirror:
+            frame = cv2.flip(frame, 1)
+        det_img, det_scale = face_ops.letterbox(frame, det_model.input_size)
+        blob = face_ops.detector_blob(det_model, det_img)
+        net_outs = det_model.session.run(det_model.output_names, {det_model.input_name: blob})
+        dets, kpss = face_ops.decode_detections(det_model, net_outs, det_model.input_size, det_scale)
+
+        output = frame.copy()
+        if latent is not None:
+            self._swap_faces_cpu(frame, output, kpss[:max_faces], latent)
+        return output, dets, kpss
+
+    def _swap_faces_cpu(self, frame, output, kpss, latent):
+        for kps in kpss:
+            aimg, M = face_ops.align_crop(frame, kps, self.crop_size)
+            bgr_fake = face_ops.run_swapper(self.swapper, face_ops.swapper_blob(self.swapper, aimg), latent)
+            face_ops.paste_back(output, bgr_fake, M)
+
+    # ---------- CUDA 路径 ----------
+
+    def _upload(self, array):
+        gpu = cv2.cuda_GpuMat()
+        gpu.upload(np.ascontiguousarray(array))
+        self.stats["uploads"] += 1
+        self.stats["upload_bytes"] += array.nbytes
+        return gpu
+
+    def _download(self, gpu):
+        array = gpu.download()
+        self.stats["downloads"] += 1
+        self.stats["download_bytes"] += array.nbytes
+        return array
+
+    def _planar_blob(self, src, alpha, beta):
+        # BGR uint8 -> RGB float32 NCHW，结果放在一块连续显存里供IOBinding使用
+        width, height = src.size()
+        rgb = cv2.cuda.cvtColor(src, cv2.COLOR_BGR2RGB)
+        rgb = rgb.convertTo(cv2.CV_32FC3, alpha=alpha, beta=beta)
+        blob = cv2.cuda.createContinuous(3 * height, width, cv2.CV_32FC1)
+        for i, plane in enumerate(cv2.cuda.split(rgb)):
+            plane.copyTo(blob.rowRange(i * height, (i + 1) * height))
+        return blob
+
+    def _detect_cuda(self, gpu_frame):
+        det_model = self.app.det_model
+        input_w, input_h = det_model.input_size
+        width, height = gpu_frame.size()
+        new_w, new_h, det_scale = face_ops.letterbox_params(height, width, det_model.input_size)
+
+        resized = cv2.cuda.resize(gpu_frame, (new_w, new_h))
+        padded = cv2.cuda.copyMakeBorder(resized, 0, input_h - new_h, 0, input_w - new_w,
+                                         cv2.BORDER_CONSTANT, value=(0, 0, 0, 0))
+        blob = self._planar_blob(padded, 1.0 / det_model.input_std,
+                                 -det_model.input_mean / det_model.input_std)
+
+        session = det_model.session
+        binding = session.io_binding()
+        binding.bind_input(det_model.input_name, "cuda", 0, np.float32,
+                           [1, 3, input_h, input_w], blob.cudaPtr())
+        for name in det_model.output_names:
+            binding.bind_output(name, "cuda")
+        session.run_with_iobinding(binding)
+        # 检测输出只有几十KB，拷回主机做解码和NMS
+        net_outs = binding.copy_outputs_to_cpu()
+        self.stats["downloads"] += 1
+        self.stats["download_bytes"] += sum(o.nbytes for o in net_outs)
+        return face_ops.decode_detections(det_model, net_outs, det_model.input_size, det_scale)
+
+    def _infer_cuda(self, aligned, latent):
+        size = self.crop_size
+        blob = self._planar_blob(aligned, 1.0 / self.swapper.input_std,
+                                 -self.swapper.input_mean / self.swapper.input_std)
+        session = self.swapper.session
+        binding = session.io_binding()
+        binding.bind_input(self.swapper.input_names[0], "cuda", 0, np.float32,
+                           [1, 3, size, size], blob.cudaPtr())
+        binding.bind_cpu_input(self.swapper.input_names[1], latent)
+        binding.bind_output(self.swapper.output_names[0], "cuda")
+        session.run_with_iobinding(binding)
+        pred = binding.get_outputs()[0]
+
+        if hasattr(cv2.cuda, "createGpuMatFromCudaMemory"):
+            planar = cv2.cuda.createGpuMatFromCudaMemory(3 * size, size, cv2.CV_32FC1, pred.data_ptr())
+        else:
+            # 旧版OpenCV无法包装外部显存，128x128的结果走一次小拷贝
+            planar = self._upload(pred.numpy().reshape(3 * size, size))
+            self.stats["downloads"] += 1
+            self.stats["download_bytes"] += 3 * size * size * 4
+
+        r = planar.rowRange(0, size)
+        g = planar.rowRange(size, 2 * size)
+        b = planar.rowRange(2 * size, 3 * size)
+        merged = cv2.cuda.merge([b, g, r])
+        bgr_fake = merged.convertTo(cv2.CV_8UC3, alpha=255.0)
+        # 转换完成前pred必须保持存活
+        del pred
+        return bgr_fake
+
+    def _paste_cuda(self, gpu_frame, bgr_fake, M):
+        params = face_ops.paste_mask_params(M, self.crop_size)
+        if params not in self._gpu_masks:
+            mask = face_ops.paste_mask(M, self.crop_size)
+            self._gpu_masks[params] = (self._upload(mask), self._upload(1.0 - mask))
+        gpu_mask, gpu_inv_mask = self._gpu_masks[params]
+
+        width, height = gpu_frame.size()
+        IM = cv2.invertAffineTransform(M)
+        x0, y0, x1, y1 = face_ops.warped_bounds(IM, self.crop_size, width, height)
+        if x1 <= x0 or y1 <= y0:
+            return
+        IM[:, 2] -= (x0, y0)
+        size = (x1 - x0, y1 - y0)
+
+        fake = cv2.cuda.warpAffine(bgr_fake, IM, size)
+        alpha = cv2.cuda.warpAffine(gpu_mask, IM, size)
+        inv_alpha = cv2.cuda.warpAffine(gpu_inv_mask, IM, size,
+                                        borderMode=cv2.BORDER_CONSTANT, borderValue=(1, 1, 1, 1))
+        roi = cv2.cuda_GpuMat(gpu_frame, (x0, y0, size[0], size[1]))
+        blended = cv2.cuda.blendLinear(fake, roi, alpha, inv_alpha)
+        blended.copyTo(roi)
+
+    def _process_cuda(self, frame, latent, max_faces):
+        gpu_frame = self._upload(frame)
+        if self.mirror:
+            gpu_frame = cv2.cuda.flip(gpu_frame, 1)
+
+        dets, kpss = self._detect_cuda(gpu_frame)
+        if latent is not None and len(kpss):
+            self._swap_faces_cuda(gpu_frame, kpss[:max_faces], latent)
+        return self._download(gpu_frame), dets, kpss
+
+    def _swap_faces_cuda(self, gpu_frame, kpss, latent):
+        # 先把所有人脸裁出来再贴回，避免后一张脸读到前一张脸的结果
+        crops = []
+        for kps in kpss:
+            M = face_ops.estimate_norm(kps, self.crop_size)
+            crops.append((cv2.cuda.warpAffine(gpu_frame, M, (self.crop_size, self.crop_size)), M))
+        for aligned, M in crops:
+            self._paste_cuda(gpu_frame, self._infer_cuda(aligned, latent), M)
+
+    def warm_up(self, frame_size=(720, 1280)):
+        """空白帧跑一遍检测，再用合成关键点跑一遍对齐/换脸/贴回，让首帧不再承担初始化开销"""
+        frame = np.zeros((frame_size[0], frame_size[1], 3), dtype=np.uint8)
+        dim = self.swapper.emap.shape[1]
+        latent = np.full((1, dim), 1.0 / np.sqrt(dim), dtype=np.float32)
+        kps = face_ops.ARCFACE_DST * 2.0 + np.array([frame_size[1] / 2 - 112, frame_size[0] / 2 - 112],
+                                                     dtype=np.float32)
+        self.process(frame, latent)
+        if self.use_cuda:
+            try:
+                self._swap_faces_cuda(self._upload(frame), kps[None], latent)
+            except Exception as e:
+                print(f"GPU流水线预热失败，切换到CPU路径: {str(e)}")
+                self.use_cuda = False
+                self.stats["fallbacks"] += 1
+        if not self.use_cuda:
+            self._swap_faces_cpu(frame, frame.copy(), kps[None], latent)
+        for key in self.stats:
+            if key != "fallbacks":
+                self.stats[key] = 0
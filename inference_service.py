@@ -0,0 +1,463 @@
+"""本机推理服务：一份 buffalo_l + inswapper 会话供多个界面/离线任务共用
+
+服务端监听 Unix 套接字（Windows 上为 127.0.0.1 的 TCP 端口），提供 detect / embed / swap 三种操作。
+每种操作有一个批处理线程：收到第一个请求后再等待几毫秒，把这段时间内各客户端的请求拼成一批推理。
+
+客户端只传送必要的小图：检测发送 letterbox 后的检测输入图，识别发送 112 对齐人脸，换脸发送 128 对齐人脸和
+latent；对齐、坐标还原和贴回都在客户端完成。RemoteFaceAnalysis / RemoteSwapper 与 FaceAnalysis / INSwapper
+的用法一致，界面可以直接替换。
+
+启动服务: python inference_service.py --address /tmp/swapper_inference.sock
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import face_ops
+import runtime_profile
+
+if sys.platform == "win32":
+    DEFAULT_ADDRESS = "127.0.0.1:50717"
+else:
+    DEFAULT_ADDRESS = "/tmp/swapper_inference.sock"
+
+_LENGTH = struct.Struct("<I")
+
+
+# ---------- 消息格式：4字节长度 + JSON头（含各数组的dtype和shape） + 数组原始字节 ----------
+
+def _recv_exact(sock, size):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            return None
+        received += n
+    return buf
+
+
+def send_message(sock, meta, arrays=()):
+    arrays = [np.ascontiguousarray(a) for a in arrays]
+    meta = dict(meta)
+    meta["arrays"] = [[a.dtype.str, list(a.shape)] for a in arrays]
+    head = json.dumps(meta).encode("utf-8")
+    sock.sendall(_LENGTH.pack(len(head)) + head)
+    for a in arrays:
+        sock.sendall(memoryview(a).cast("B"))
+
+
+def recv_message(sock):
+    raw = _recv_exact(sock, _LENGTH.size)
+    if raw is None:
+        return None, None
+    head = _recv_exact(sock, _LENGTH.unpack(raw)[0])
+    if head is None:
+        return None, None
+    meta = json.loads(head.decode("utf-8"))
+    arrays = []
+    for dtype, shape in meta.pop("arrays", []):
+        dtype = np.dtype(dtype)
+        data = _recv_exact(sock, int(np.prod(shape)) * dtype.itemsize)
+        if data is None:
+            return None, None
+        arrays.append(np.frombuffer(data, dtype=dtype).reshape(shape))
+    return meta, arrays
+
+
+def parse_address(address):
+    """"host:port" 为TCP，其余视为Unix套接字路径"""
+    if ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+
+def service_running(address, timeout=1.0):
+    """该地址上是否有服务在接受连接"""
+    family, connect_address = parse_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(connect_address)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+# ---------- 服务端 ----------
+
+class _Request:
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.items = len(arrays[0]) if arrays and arrays[0].ndim == 4 else 1
+        self.submitted = time.perf_counter()
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class DynamicBatcher:
+    """单线程独占一个会话：拿到第一个请求后在 window_ms 内继续收集，凑成一批再推理"""
+
+    def __init__(self, name, run_batch, window_ms=3.0, max_batch=8):
+        self.name = name
+        self.run_batch = run_batch
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self.stats = {"requests": 0, "batches": 0, "items": 0, "avg_batch": 0.0,
+                      "wait_ms_avg": 0.0, "infer_ms_avg": 0.0}
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def submit(self, arrays):
+        request = _Request(arrays)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise RuntimeError(request.error)
+        return request.result
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        items = batch[0].items
+        deadline = time.perf_counter() + self.window
+        while items < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            items += request.items
+        return batch, items
+
+    def _worker(self):
+        while True:
+            batch, items = self._collect()
+            start = time.perf_counter()
+            try:
+                results = self.run_batch([request.arrays for request in batch])
+                for request, result in zip(batch, results):
+                    request.result = result
+            except Exception as e:
+                for request in batch:
+                    request.error = f"{self.name}: {str(e)}"
+            infer_ms = (time.perf_counter() - start) * 1000.0
+
+            stats = self.stats
+            stats["batches"] += 1
+            stats["requests"] += len(batch)
+            stats["items"] += items
+            stats["avg_batch"] = stats["items"] / stats["batches"]
+            wait_ms = sum(start - request.submitted for request in batch) * 1000.0 / len(batch)
+            n = min(stats["batches"], 100)
+            stats["wait_ms_avg"] += (wait_ms - stats["wait_ms_avg"]) / n
+            stats["infer_ms_avg"] += (infer_ms - stats["infer_ms_avg"]) / n
+            for request in batch:
+                request.done.set()
+
+
+def _batch_dim_fixed(session):
+    dim = session.get_inputs()[0].shape[0]
+    return isinstance(dim, int) and dim > 0
+
+
+class InferenceService:
+    def __init__(self, profile, swapper_path, det_size=(320, 320), window_ms=3.0, max_batch=8,
+                 name="buffalo_l", root="~/.insightface"):
+        print("正在加载模型...")
+        self.app = runtime_profile.create_face_analysis(name, profile, root=root,
+                                                        allowed_modules=["detection", "recognition"])
+        self.app.prepare(ctx_id=0, det_size=det_size)
+        self.det_model = self.app.det_model
+        self.rec_model = self.app.models["recognition"]
+        self.swapper = runtime_profile.load_model(swapper_path, profile)
+        self.det_size = tuple(det_size)
+
+        self.batchers = {
+            "detect": DynamicBatcher("detect", self._detect_batch, window_ms, max_batch),
+            "embed": DynamicBatcher("embed", self._embed_batch, window_ms, max_batch),
+            "swap": DynamicBatcher("swap", self._swap_batch, window_ms, max_batch),
+        }
+        self._warm_up()
+
+    def _detect_batch(self, requests):
+        det_model = self.det_model
+        blobs = np.concatenate([face_ops.detector_blob(det_model, arrays[0]) for arrays in requests])
+        if len(blobs) > 1 and face_ops.detector_supports_batch(det_model):
+            net_outs = det_model.session.run(det_model.output_names, {det_model.input_name: blobs})
+            outs = [(net_outs, i) for i in range(len(blobs))]
+        else:
+            outs = [(det_model.session.run(det_model.output_names, {det_model.input_name: blob[None]}), 0)
+                    for blob in blobs]
+        # 坐标保持在检测输入图上，由客户端按自己的缩放比例还原
+        return [list(face_ops.decode_detections(det_model, net_outs, self.det_size, 1.0, batch_index=i))
+                for net_outs, i in outs]
+
+    def _embed_batch(self, requests):
+        rec = self.rec_model
+        crops = np.concatenate([arrays[0] for arrays in requests])
+        blob = cv2.dnn.blobFromImages(list(crops), 1.0 / rec.input_std, rec.input_size,
+                                      (rec.input_mean,) * 3, swapRB=True)
+        embeddings = rec.session.run(rec.output_names, {rec.input_name: blob})[0]
+        return self._split(requests, [embeddings])
+
+    def _swap_batch(self, requests):
+        swapper = self.swapper
+        crops = np.concatenate([arrays[0] for arrays in requests])
+        latents = np.concatenate([arrays[1] for arrays in requests]).astype(np.float32)
+        mean = swapper.input_mean
+        blobs = cv2.dnn.blobFromImages(list(crops), 1.0 / swapper.input_std, swapper.input_size,
+                                       (mean, mean, mean), swapRB=True)
+        if _batch_dim_fixed(swapper.session):
+            # 模型固定 batch=1 时逐张推理，但仍由同一线程在一个批处理周期内完成
+            preds = [swapper.session.run(swapper.output_names,
+                                         {swapper.input_names[0]: blobs[i:i + 1],
+                                          swapper.input_names[1]: latents[i:i + 1]})[0]
+                     for i in range(len(blobs))]
+            preds = np.concatenate(preds)
+        else:
+            preds = swapper.session.run(swapper.output_names, {swapper.input_names[0]: blobs,
+                                                               swapper.input_names[1]: latents})[0]
+        fakes = np.stack([face_ops.pred_to_bgr(preds[i:i + 1]) for i in range(len(preds))])
+        return self._split(requests, [fakes])
+
+    @staticmethod
+    def _split(requests, outputs):
+        results, offset = [], 0
+        for arrays in requests:
+            count = len(arrays[0])
+            results.append([output[offset:offset + count] for output in outputs])
+            offset += count
+        return results
+
+    def _warm_up(self):
+        det_img = np.zeros((self.det_size[1], self.det_size[0], 3), dtype=np.uint8)
+        self.batchers["detect"].submit([det_img])
+        self.batchers["embed"].submit([np.zeros((1, 112, 112, 3), dtype=np.uint8)])
+        crop = self.swapper.input_size[0]
+        dim = self.swapper.emap.shape[1]
+        self.batchers["swap"].submit([np.zeros((1, crop, crop, 3), dtype=np.uint8),
+                                      np.full((1, dim), 1.0 / np.sqrt(dim), dtype=np.float32)])
+        for batcher in self.batchers.values():
+            for key in batcher.stats:
+                batcher.stats[key] = 0
+
+    def info(self):
+        meta = {"det_size": list(self.det_size),
+                "rec_size": self.rec_model.input_size[0],
+                "crop_size": self.swapper.input_size[0],
+                "model_dir": self.app.model_dir}
+        return meta, [self.swapper.emap.astype(np.float32)]
+
+    def handle(self, sock):
+        while True:
+            meta, arrays = recv_message(sock)
+            if meta is None:
+                return
+            op = meta.get("op")
+            try:
+                if op == "info":
+                    reply, outputs = self.info()
+                elif op == "stats":
+                    reply, outputs = {"stats": {k: b.stats for k, b in self.batchers.items()}}, []
+                elif op in self.batchers:
+                    reply, outputs = {}, self.batchers[op].submit(arrays)
+                else:
+                    raise ValueError(f"未知操作: {op}")
+                send_message(sock, reply, outputs)
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            except Exception as e:
+                send_message(sock, {"error": str(e)})
+
+    def create_server(self, address=DEFAULT_ADDRESS):
+        """绑定地址并返回 socketserver；该地址上已有服务在运行时抛出 RuntimeError，不抢占它的套接字"""
+        service = self
+        family, bind_address = parse_address(address)
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                service.handle(self.request)
+
+        if service_running(address):
+            raise RuntimeError(f"推理服务已在运行: {address}")
+        if family == socket.AF_UNIX:
+            # 连不上说明是上次异常退出留下的套接字文件
+            if os.path.exists(bind_address):
+                os.remove(bind_address)
+            server = socketserver.ThreadingUnixStreamServer(bind_address, Handler)
+        else:
+            server = socketserver.ThreadingTCPServer(bind_address, Handler)
+        server.daemon_threads = True
+        return server
+
+    def serve(self, address=DEFAULT_ADDRESS):
+        family, bind_address = parse_address(address)
+        server = self.create_server(address)
+        print(f"推理服务已启动: {address}")
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if family == socket.AF_UNIX and os.path.exists(bind_address):
+                os.remove(bind_address)
+
+
+# ---------- 客户端 ----------
+
+class InferenceClient:
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=10.0):
+        family, connect_address = parse_address(address)
+        self.address = address
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(connect_address)
+        if family == socket.AF_INET:
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._lock = threading.Lock()
+
+    def call(self, op, arrays=()):
+        with self._lock:
+            send_message(self.sock, {"op": op}, arrays)
+            meta, outputs = recv_message(self.sock)
+        if meta is None:
+            raise ConnectionError("推理服务已断开")
+        if "error" in meta:
+            raise RuntimeError(meta["error"])
+        return meta, outputs
+
+    def detect(self, det_img):
+        _, (dets, kpss) = self.call("detect", [det_img])
+        return dets.copy(), kpss.copy()
+
+    def embed(self, crops):
+        return self.call("embed", [crops])[1][0]
+
+    def swap(self, crops, latents):
+        return self.call("swap", [crops, latents])[1][0]
+
+    def stats(self):
+        return self.call("stats")[0]["stats"]
+
+    def close(self):
+        self.sock.close()
+
+
+class RemoteFaceAnalysis:
+    """与 FaceAnalysis.get 用法一致；检测和识别在服务端，其他本地追加的子模型（如106点关键点）在本地运行"""
+
+    def __init__(self, client, info):
+        self.client = client
+        self.det_size = tuple(info["det_size"])
+        self.rec_size = info["rec_size"]
+        self.model_dir = info["model_dir"]
+        self.models = {}
+
+    def prepare(self, ctx_id=0, det_size=None):
+        # 检测尺寸由服务端决定
+        pass
+
+    def detect(self, img, max_num=0):
+        """与 RetinaFace.detect 相同，返回原图坐标的 (N,5) 框+分数 和 (N,5,2) 关键点"""
+        det_img, det_scale = face_ops.letterbox(img, self.det_size)
+        dets, kpss = self.client.detect(det_img)
+        if max_num > 0:
+            dets, kpss = dets[:max_num], kpss[:max_num]
+        dets[:, :4] /= det_scale
+        kpss /= det_scale
+        return dets, kpss
+
+    def embed(self, img, kpss):
+        crops = np.stack([face_ops.align_crop(img, kps, self.rec_size)[0] for kps in kpss])
+        return self.client.embed(crops)
+
+    def get(self, img, max_num=0):
+        from insightface.app.common import Face
+
+        dets, kpss = self.detect(img, max_num)
+        if not len(dets):
+            return []
+        embeddings = self.embed(img, kpss)
+        faces = []
+        for det, kps, embedding in zip(dets, kpss, embeddings):
+            face = Face(bbox=det[:4], kps=kps, det_score=det[4])
+            face.embedding = embedding
+            for model in self.models.values():
+                model.get(img, face)
+            faces.append(face)
+        return faces
+
+
+class RemoteSwapper:
+    """与 INSwapper.get 用法一致：本地对齐出128人脸和latent，送服务端换脸，再在本地贴回"""
+
+    taskname = "inswapper"
+
+    def __init__(self, client, info, emap):
+        self.client = client
+        crop_size = info["crop_size"]
+        self.input_size = (crop_size, crop_size)
+        self.input_mean = 0.0
+        self.input_std = 255.0
+        self.emap = emap
+
+    def get(self, img, target_face, source_face, paste_back=True):
+        latent = face_ops.source_latent(self, source_face.normed_embedding)
+        aimg, M = face_ops.align_crop(img, target_face.kps, self.input_size[0])
+        bgr_fake = self.client.swap(aimg[None], latent)[0]
+        if not paste_back:
+            return bgr_fake, M
+        return face_ops.paste_back(img.copy(), bgr_fake, M)
+
+
+def connect(address=DEFAULT_ADDRESS):
+    """连接推理服务，返回可替代 (FaceAnalysis, INSwapper) 的 (RemoteFaceAnalysis, RemoteSwapper)"""
+    client = InferenceClient(address)
+    info, (emap,) = client.call("info")
+    return RemoteFaceAnalysis(client, info), RemoteSwapper(client, info, emap.copy())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本机推理服务：多个进程共用一份模型，并把并发请求合批推理")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="Unix套接字路径或 host:port")
+    parser.add_argument("--window-ms", type=float, default=3.0, help="合批等待窗口（毫秒）")
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--det-size", type=int, default=320)
+    parser.add_argument("--buffalo", default="buffalo_l")
+    parser.add_argument("--root", default="~/.insightface")
+    parser.add_argument("--inswapper", default="./models/inswapper_128.onnx")
+    parser.add_argument("--profile", default=None, help="运行时配置文件（默认 runtime_profile.json）")
+    args = parser.parse_args()
+
+    # 加载模型要几秒，先确认没有同一地址的服务在运行
+    if service_running(args.address):
+        print(f"推理服务已在运行: {args.address}")
+        sys.exit(1)
+    profile = runtime_profile.load_profile(args.profile,
+                                           default_providers=["CUDAExecutionProvider", "CPUExecutionProvider"])
+    service = InferenceService(profile, args.inswapper, det_size=(args.det_size, args.det_size),
+                               window_ms=args.window_ms, max_batch=args.max_batch,
+                               name=args.buffalo, root=args.root)
+    service.serve(args.address)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import time
+import traceback
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+import runtime_profile
+
+
+class ModelLoader(QThread):
+    """后台线程加载并预热模型，界面可以先显示出来"""
+
+    progress = pyqtSignal(str)
+    loaded = pyqtSignal(object, object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, profile, swapper_path, det_size, allowed_modules=None, service_address=None,
+                 parent=None):
+        super().__init__(parent)
+        self.profile = profile
+        # 指定推理服务地址时不在本进程加载模型，改为连接共用的推理服务
+        self.service_address = service_address
+        self.swapper_path = swapper_path
+        self.det_size = det_size
+        self.allowed_modules = allowed_modules
+        # 可选：在加载线程里额外执行的预热（例如GPU流水线），参数为 (app, swapper)
+        self.warm_up_hook = None
+
+    def run(self):
+        try:
+            start = time.perf_counter()
+            if self.service_address:
+                import inference_service
+                self.progress.emit(f"正在连接推理服务 {self.service_address}...")
+                app, swapper = inference_service.connect(self.service_address)
+                print(f"已连接推理服务，用时 {time.perf_counter() - start:.2f} 秒")
+                self.loaded.emit(app, swapper)
+                return
+
+            self.progress.emit("正在加载人脸分析模型...")
+            app = runtime_profile.create_face_analysis("buffalo_l", self.profile,
+                                                       allowed_modules=self.allowed_modules)
+            app.prepare(ctx_id=0, det_size=self.det_size)
+
+            self.progress.emit("正在加载换脸模型...")
+            swapper = runtime_profile.load_model(self.swapper_path, self.profile)
+
+            self.progress.emit("正在预热模型...")
+            runtime_profile.warm_up(app, swapper)
+            if self.warm_up_hook is not None:
+                self.warm_up_hook(app, swapper)
+
+            print(f"模型加载完成，用时 {time.perf_counter() - start:.2f} 秒")
+            self.loaded.emit(app, swapper)
+        except Exception as e:
+            traceback.print_exc()
+            self.failed.emit(str(e))
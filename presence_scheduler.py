@@ -0,0 +1,98 @@
+import time
+
+import cv2
+import numpy as np
+
+MOTION_SIZE = (80, 60)
+
+
+class PresenceScheduler:
+    """按画面中有没有人切换检测策略
+
+    active：每帧全分辨率检测。连续 idle_after 帧没有人脸后进入 idle。
+    idle：每 idle_interval 秒最多检测一次，且使用更小的检测输入；开启运动门控时，画面与上次检测时相比
+    没有明显变化就不检测（最长 max_idle_gap 秒仍会检测一次）。idle 检测到人脸后立刻切回 active，
+    调用方应在同一帧用全分辨率重新检测，因此人出现后一两帧内就恢复正常换脸。
+    """
+
+    def __init__(self, enabled=True, idle_after=15, idle_interval=0.25, idle_input_size=(160, 160),
+                 motion_gating=True, motion_threshold=4.0, max_idle_gap=2.0):
+        self.enabled = enabled
+        self.idle_after = idle_after
+        self.idle_interval = idle_interval
+        self.idle_input_size = tuple(idle_input_size)
+        self.motion_gating = motion_gating
+        self.motion_threshold = motion_threshold
+        self.max_idle_gap = max_idle_gap
+
+        self.mode = "active"
+        self._empty_frames = 0
+        self._last_detect = 0.0
+        self._reference = None
+        self._last_tick = None
+        self.stats = {
+            "active_seconds": 0.0,
+            "idle_seconds": 0.0,
+            "active_detections": 0,
+            "idle_detections": 0,
+            "motion_skips": 0,
+            "rate_skips": 0,
+            "wakeups": 0,
+        }
+
+    def _tick(self, now):
+        if self._last_tick is not None:
+            self.stats[f"{self.mode}_seconds"] += now - self._last_tick
+        self._last_tick = now
+
+    def _motion(self, frame):
+        small = cv2.cvtColor(cv2.resize(frame, MOTION_SIZE, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        small = small.astype(np.int16)
+        if self._reference is None:
+            return small, float("inf")
+        return small, float(np.abs(small - self._reference).mean())
+
+    def plan(self, frame, now=None):
+        """返回 (本帧是否检测, 检测输入尺寸)；尺寸为 None 表示使用模型默认的全分辨率"""
+        now = time.monotonic() if now is None else now
+        self._tick(now)
+        if not self.enabled or self.mode == "active":
+            self.stats["active_detections"] += 1
+            return True, None
+
+        since_last = now - self._last_detect
+        if since_last < self.idle_interval:
+            self.stats["rate_skips"] += 1
+            return False, None
+        if self.motion_gating:
+            small, motion = self._motion(frame)
+            if motion < self.motion_threshold and since_last < self.max_idle_gap:
+                self.stats["motion_skips"] += 1
+                return False, None
+            self._reference = small
+        self._last_detect = now
+        self.stats["idle_detections"] += 1
+        return True, self.idle_input_size
+
+    def update(self, has_faces):
+        """报告本次检测结果；返回 True 表示刚从 idle 唤醒，需要立即用全分辨率重新检测"""
+        if has_faces:
+            self._empty_frames = 0
+            if self.mode == "idle":
+                self.mode = "active"
+                self.stats["wakeups"] += 1
+                return True
+            return False
+        self._empty_frames += 1
+        if self.enabled and self.mode == "active" and self._empty_frames >= self.idle_after:
+            self.mode = "idle"
+            self._reference = None
+            self._last_detect = 0.0
+        return False
+
+    def summary(self):
+        total = self.stats["active_seconds"] + self.stats["idle_seconds"]
+        if total <= 0:
+            return ""
+        return (f"待机 {self.stats['idle_seconds']:.0f}s ({self.stats['idle_seconds'] / total:.0%})，"
+                f"工作 {self.stats['active_seconds']:.0f}s")
@@ -0,0 +1,271 @@
+import base64
+import hashlib
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+BOUNDARY = "swapperframe"
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+INDEX_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>实时换脸预览</title></head>
+<body style="margin:0;background:#000">
+<img src="/stream.mjpg" style="max-width:100%;display:block;margin:auto">
+</body></html>
+"""
+
+
+class LatestFrameSlot:
+    """每个观看者一个只保留最新一帧的槽：来不及发送的旧帧直接被覆盖并计入丢帧"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._data = None
+        self._seq = 0
+        self._taken = 0
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, seq, data):
+        with self._cond:
+            if self._data is not None and self._taken < self._seq:
+                self.dropped += 1
+            self._seq, self._data = seq, data
+            self._cond.notify()
+
+    def get(self, timeout=1.0):
+        with self._cond:
+            if self._taken >= self._seq and not self.closed:
+                self._cond.wait(timeout)
+            if self.closed or self._taken >= self._seq:
+                return None
+            self._taken = self._seq
+            self.sent += 1
+            return self._data
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+
+class _PreviewHandler(BaseHTTPRequestHandler):
+    server_version = "SwapperPreview/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        preview = self.server.preview
+        path = self.path.split("?")[0]
+        if path == "/":
+            body = INDEX_HTML.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif path == "/snapshot.jpg":
+            jpeg = preview.latest_jpeg
+            if jpeg is None:
+                self.send_error(503, "no frame yet")
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(jpeg)))
+            self.end_headers()
+            self.wfile.write(jpeg)
+        elif path == "/stream.mjpg":
+            self._serve_mjpeg(preview)
+        elif path == "/ws" and self.headers.get("Upgrade", "").lower() == "websocket":
+            self._serve_websocket(preview)
+        else:
+            self.send_error(404)
+
+    def _serve_mjpeg(self, preview):
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        slot = preview.add_viewer()
+        try:
+            while preview.running:
+                jpeg = slot.get()
+                if jpeg is None:
+                    continue
+                self.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                 f"Content-Length: {len(jpeg)}\r\n\r\n".encode("ascii"))
+                self.wfile.write(jpeg)
+                self.wfile.write(b"\r\n")
+        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+            pass
+        finally:
+            preview.remove_viewer(slot)
+
+    def _serve_websocket(self, preview):
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode("ascii")).digest()).decode("ascii")
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        slot = preview.add_viewer()
+        try:
+            while preview.running:
+                jpeg = slot.get()
+                if jpeg is None:
+                    continue
+                # 服务端发往客户端的帧不加掩码，每帧一条二进制消息
+                length = len(jpeg)
+                if length < 126:
+                    header = struct.pack("!BB", 0x82, length)
+                elif length < 65536:
+                    header = struct.pack("!BBH", 0x82, 126, length)
+                else:
+                    header = struct.pack("!BBQ", 0x82, 127, length)
+                self.wfile.write(header + jpeg)
+        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+            pass
+        finally:
+            preview.remove_viewer(slot)
+        self.close_connection = True
+
+
+class PreviewServer:
+    """内嵌预览服务：/stream.mjpg 为 MJPEG 流，/ws 为 WebSocket 二进制JPEG帧，/snapshot.jpg 为单帧
+
+    submit 只把最新帧放进待编码槽；编码线程每帧只做一次 JPEG 编码，再分发到各观看者的最新帧槽。
+    没有观看者时不编码。默认只监听 127.0.0.1。
+    """
+
+    def __init__(self, host="127.0.0.1", port=8080, quality=80, max_fps=15.0):
+        self.host = host
+        self.port = port
+        self.quality = quality
+        self.max_fps = max_fps
+        self.running = False
+        self.latest_jpeg = None
+
+        self._viewers = []
+        self._viewers_lock = threading.Lock()
+        self._pending = None
+        self._pending_cond = threading.Condition()
+        self._last_submit = 0.0
+        self._seq = 0
+        self._httpd = None
+        self._threads = []
+
+        self.stats = {
+            "submitted": 0,
+            "encoded": 0,
+            "skipped": 0,
+            "encode_ms_avg": 0.0,
+            "bytes_avg": 0.0,
+        }
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/"
+
+    @property
+    def viewer_count(self):
+        with self._viewers_lock:
+            return len(self._viewers)
+
+    def add_viewer(self):
+        slot = LatestFrameSlot()
+        with self._viewers_lock:
+            self._viewers.append(slot)
+        # 新观看者先拿到最近一帧，不必等下一次编码
+        if self.latest_jpeg is not None:
+            slot.put(self._seq, self.latest_jpeg)
+        return slot
+
+    def remove_viewer(self, slot):
+        slot.close()
+        with self._viewers_lock:
+            if slot in self._viewers:
+                self._viewers.remove(slot)
+
+    def viewer_stats(self):
+        with self._viewers_lock:
+            return [{"sent": slot.sent, "dropped": slot.dropped} for slot in self._viewers]
+
+    def submit(self, frame):
+        """界面线程调用，不阻塞；超过 max_fps 或没有观看者时直接跳过"""
+        if not self.running or not self.viewer_count:
+            return
+        now = time.monotonic()
+        if self.max_fps and now - self._last_submit < 1.0 / self.max_fps:
+            return
+        self._last_submit = now
+        with self._pending_cond:
+            if self._pending is not None:
+                self.stats["skipped"] += 1
+            self._pending = frame.copy()
+            self.stats["submitted"] += 1
+            self._pending_cond.notify()
+
+    def _encode_worker(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        while self.running:
+            with self._pending_cond:
+                if self._pending is None:
+                    self._pending_cond.wait(0.5)
+                frame, self._pending = self._pending, None
+            if frame is None:
+                continue
+
+            start = time.perf_counter()
+            ok, buf = cv2.imencode(".jpg", frame, params)
+            if not ok:
+                continue
+            jpeg = buf.tobytes()
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+
+            encoded = self.stats["encoded"] + 1
+            self.stats["encoded"] = encoded
+            self.stats["encode_ms_avg"] += (elapsed_ms - self.stats["encode_ms_avg"]) / min(encoded, 100)
+            self.stats["bytes_avg"] += (len(jpeg) - self.stats["bytes_avg"]) / min(encoded, 100)
+
+            self._seq += 1
+            self.latest_jpeg = jpeg
+            with self._viewers_lock:
+                viewers = list(self._viewers)
+            for slot in viewers:
+                slot.put(self._seq, jpeg)
+
+    def start(self):
+        if self.running:
+            return
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _PreviewHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.preview = self
+        # 端口为0时由系统分配
+        self.port = self._httpd.server_address[1]
+        self.running = True
+        self._threads = [threading.Thread(target=self._httpd.serve_forever, daemon=True),
+                         threading.Thread(target=self._encode_worker, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        with self._viewers_lock:
+            viewers = list(self._viewers)
+        for slot in viewers:
+            slot.close()
+        with self._pending_cond:
+            self._pending_cond.notify()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        self._threads = []
@@ -0,0 +1,262 @@
+import argparse
+import copy
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+import onnxruntime
+from onnxruntime.quantization import CalibrationDataReader
+
+import face_ops
+import runtime_profile
+
+# 可生成的模型变体，fp32 是对照组
+BUILD_MODES = ("int8_dynamic", "int8_static", "fp16")
+
+
+def read_image(path):
+    # 使用numpy直接读取文件，避免cv2中文路径问题
+    return cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def load_fp32_models(args):
+    # 对照组固定用CPU上的原始fp32模型，不受主机运行时配置影响
+    profile = copy.deepcopy(runtime_profile.DEFAULT_PROFILE)
+    from insightface.utils.storage import ensure_available
+    model_dir = ensure_available("models", args.buffalo, root=args.root)
+    det_model = runtime_profile.load_model(os.path.join(model_dir, "det_10g.onnx"), profile)
+    det_model.prepare(0, input_size=(args.det_size, args.det_size))
+    rec_model = runtime_profile.load_model(os.path.join(model_dir, "w600k_r50.onnx"), profile)
+    swapper = runtime_profile.load_model(args.inswapper, profile)
+    return {
+        "det_10g": det_model,
+        "w600k_r50": rec_model,
+        "inswapper_128": swapper,
+    }
+
+
+def build_calibration_set(models, calib_dir, limit):
+    """用人脸库图片生成三个模型各自的输入样本（以及检测还原坐标所需的缩放比例）"""
+    det_model = models["det_10g"]
+    rec_model = models["w600k_r50"]
+    swapper = models["inswapper_128"]
+
+    det_feeds, det_scales, rec_feeds, crops, embeddings = [], [], [], [], []
+    files = sorted(f for f in os.listdir(calib_dir) if f.lower().endswith((".png", ".jpg", ".jpeg")))
+    for filename in files[:limit]:
+        img = read_image(os.path.join(calib_dir, filename))
+        if img is None:
+            continue
+        det_img, det_scale = face_ops.letterbox(img, det_model.input_size)
+        blob = face_ops.detector_blob(det_model, det_img)
+        det_feeds.append({det_model.input_name: blob})
+        det_scales.append(det_scale)
+
+        net_outs = det_model.session.run(det_model.output_names, {det_model.input_name: blob})
+        _, kpss = face_ops.decode_detections(det_model, net_outs, det_model.input_size, det_scale)
+        if not len(kpss):
+            continue
+        aimg, _ = face_ops.align_crop(img, kpss[0], rec_model.input_size[0])
+        rec_feed = {rec_model.input_name: cv2.dnn.blobFromImage(
+            aimg, 1.0 / rec_model.input_std, rec_model.input_size,
+            (rec_model.input_mean,) * 3, swapRB=True)}
+        rec_feeds.append(rec_feed)
+        embedding = rec_model.session.run(rec_model.output_names, rec_feed)[0][0]
+        embeddings.append(embedding / np.linalg.norm(embedding))
+        crops.append(face_ops.align_crop(img, kpss[0], swapper.input_size[0])[0])
+
+    # 换脸样本：每张脸换成库里下一张脸
+    swap_feeds = []
+    for i, aimg in enumerate(crops):
+        latent = face_ops.source_latent(swapper, embeddings[(i + 1) % len(embeddings)])
+        swap_feeds.append({swapper.input_names[0]: face_ops.swapper_blob(swapper, aimg),
+                           swapper.input_names[1]: latent})
+
+    print(f"校准样本: 检测 {len(det_feeds)} 张, 识别/换脸 {len(rec_feeds)} 张")
+    return {
+        "det_10g": det_feeds,
+        "w600k_r50": rec_feeds,
+        "inswapper_128": swap_feeds,
+        "det_scales": det_scales,
+    }
+
+
+class FeedDataReader(CalibrationDataReader):
+    def __init__(self, feeds):
+        self.feeds = feeds
+        self.index = 0
+
+    def get_next(self):
+        if self.index >= len(self.feeds):
+            return None
+        feed = self.feeds[self.index]
+        self.index += 1
+        return feed
+
+    def rewind(self):
+        self.index = 0
+
+
+def build_variant(mode, src, dst, feeds):
+    from onnxruntime import quantization
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    if mode == "int8_dynamic":
+        quantization.quantize_dynamic(src, dst, weight_type=quantization.QuantType.QUInt8)
+    elif mode == "int8_static":
+        # 先做形状推断和图预处理，静态量化的效果更稳定；失败时直接用原图
+        prepared = dst + ".pre.onnx"
+        try:
+            quant_pre_process(src, prepared)
+        except Exception as e:
+            print(f"量化预处理失败，使用原始模型: {str(e)}")
+            prepared = src
+        quantization.quantize_static(prepared, dst, FeedDataReader(feeds),
+                                     quant_format=quantization.QuantFormat.QDQ,
+                                     per_channel=True,
+                                     activation_type=quantization.QuantType.QUInt8,
+                                     weight_type=quantization.QuantType.QInt8,
+                                     calibrate_method=quantization.CalibrationMethod.MinMax)
+        if prepared != src:
+            os.remove(prepared)
+    elif mode == "fp16":
+        try:
+            import onnx
+            from onnxconverter_common import float16
+        except ImportError:
+            print("生成fp16模型需要安装 onnxconverter-common，已跳过")
+            return False
+        model = float16.convert_float_to_float16(onnx.load(src), keep_io_types=True)
+        onnx.save(model, dst)
+    return True
+
+
+def benchmark(session, feeds, runs):
+    # 先跑一遍全部样本取输出，同时充当预热
+    outputs = [session.run(None, feed) for feed in feeds]
+    start = time.perf_counter()
+    for i in range(runs):
+        session.run(None, feeds[i % len(feeds)])
+    latency_ms = (time.perf_counter() - start) * 1000.0 / runs
+    return latency_ms, outputs
+
+
+def _iou(a, b):
+    x1, y1 = np.maximum(a[0], b[:, 0]), np.maximum(a[1], b[:, 1])
+    x2, y2 = np.minimum(a[2], b[:, 2]), np.minimum(a[3], b[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a + area_b - inter + 1e-6)
+
+
+def compare_detection(det_model, det_scales, ref_outputs, outputs):
+    ious, score_diffs, matched, total = [], [], 0, 0
+    for scale, ref, out in zip(det_scales, ref_outputs, outputs):
+        ref_det, _ = face_ops.decode_detections(det_model, ref, det_model.input_size, scale)
+        det, _ = face_ops.decode_detections(det_model, out, det_model.input_size, scale)
+        total += len(ref_det)
+        for box in ref_det:
+            if not len(det):
+                break
+            overlap = _iou(box, det)
+            best = int(np.argmax(overlap))
+            if overlap[best] >= 0.5:
+                matched += 1
+                ious.append(overlap[best])
+                score_diffs.append(abs(box[4] - det[best, 4]))
+    return {
+        "recall_vs_fp32": matched / total if total else 1.0,
+        "mean_iou": float(np.mean(ious)) if ious else 0.0,
+        "mean_score_diff": float(np.mean(score_diffs)) if score_diffs else 0.0,
+    }
+
+
+def compare_embedding(ref_outputs, outputs):
+    sims = []
+    for ref, out in zip(ref_outputs, outputs):
+        a = ref[0][0] / np.linalg.norm(ref[0][0])
+        b = out[0][0] / np.linalg.norm(out[0][0])
+        sims.append(float(np.dot(a, b)))
+    return {"mean_cosine": float(np.mean(sims)), "min_cosine": float(np.min(sims))}
+
+
+def compare_swap(ref_outputs, outputs):
+    diffs, psnrs = [], []
+    for ref, out in zip(ref_outputs, outputs):
+        a = face_ops.pred_to_bgr(ref[0]).astype(np.float32)
+        b = face_ops.pred_to_bgr(out[0]).astype(np.float32)
+        diffs.append(float(np.abs(a - b).mean()))
+        mse = float(((a - b) ** 2).mean())
+        psnrs.append(100.0 if mse == 0 else 10 * np.log10(255.0 ** 2 / mse))
+    return {"mean_pixel_diff": float(np.mean(diffs)), "mean_psnr": float(np.mean(psnrs))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成量化/半精度模型变体，并与fp32对比速度和精度")
+    parser.add_argument("--models", nargs="+", default=["det_10g", "w600k_r50", "inswapper_128"])
+    parser.add_argument("--modes", nargs="+", default=list(BUILD_MODES), choices=BUILD_MODES)
+    parser.add_argument("--calib", default="faces", help="校准图片目录（默认使用人脸库）")
+    parser.add_argument("--max-calib", type=int, default=64)
+    parser.add_argument("--out", default="./models/variants")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--det-size", type=int, default=320)
+    parser.add_argument("--buffalo", default="buffalo_l")
+    parser.add_argument("--root", default="~/.insightface")
+    parser.add_argument("--inswapper", default="./models/inswapper_128.onnx")
+    parser.add_argument("--skip-build", action="store_true", help="只评测已存在的变体")
+    args = parser.parse_args()
+
+    models = load_fp32_models(args)
+    feeds = build_calibration_set(models, args.calib, args.max_calib)
+    os.makedirs(args.out, exist_ok=True)
+
+    report = {}
+    for name in args.models:
+        model = models[name]
+        if not feeds[name]:
+            print(f"{name}: 没有可用的校准样本，跳过")
+            continue
+        so = onnxruntime.SessionOptions()
+        ref_session = onnxruntime.InferenceSession(model.model_file, sess_options=so,
+                                                   providers=["CPUExecutionProvider"])
+        ref_ms, ref_outputs = benchmark(ref_session, feeds[name], args.runs)
+        report[name] = {"fp32": {"latency_ms": ref_ms}}
+        print(f"{name} fp32: {ref_ms:.1f} ms")
+
+        for mode in args.modes:
+            dst = runtime_profile.variant_path(args.out, model.model_file, mode)
+            if not args.skip_build:
+                print(f"正在生成 {dst} ...")
+                if not build_variant(mode, model.model_file, dst, feeds[name]):
+                    continue
+            if not os.path.exists(dst):
+                continue
+
+            session = onnxruntime.InferenceSession(dst, sess_options=so,
+                                                   providers=["CPUExecutionProvider"])
+            latency_ms, outputs = benchmark(session, feeds[name], args.runs)
+            if name == "det_10g":
+                accuracy = compare_detection(model, feeds["det_scales"], ref_outputs, outputs)
+            elif name == "w600k_r50":
+                accuracy = compare_embedding(ref_outputs, outputs)
+            else:
+                accuracy = compare_swap(ref_outputs, outputs)
+
+            entry = {"latency_ms": latency_ms, "speedup": ref_ms / latency_ms,
+                     "size_mb": os.path.getsize(dst) / 1e6}
+            entry.update(accuracy)
+            report[name][mode] = entry
+            details = ", ".join(f"{k}={v:.4f}" for k, v in accuracy.items())
+            print(f"{name} {mode}: {latency_ms:.1f} ms, 加速 {entry['speedup']:.2f}x, {details}")
+
+    report_path = os.path.join(args.out, "quantize_report.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"评测报告已保存: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
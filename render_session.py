@@ -0,0 +1,194 @@
+"""离线重渲染原始素材录制（session_recorder.py）
+
+实时预览为了帧率会降低检测尺寸、跳帧、复用换脸结果；重渲染时没有实时约束：
+每帧用完整 det_size（或分块检测）重新检测，每张人脸都重新推理，源人脸、混合比例、滤镜和贴纸按录制时的元数据还原。
+输出不含预览上的人脸框、ID等标注，也不含音频。
+
+    python render_session.py sessions/session_20240101-120000 --det-size 640 --crf 18
+"""
+import argparse
+import os
+import sys
+
+import cv2
+import numpy as np
+
+import effects
+import runtime_profile
+from encoders import EncoderError, create_encoder
+from face_library import FaceLibrary, read_image
+from face_tracker import iou_matrix
+from frame_result import compute_landmarks, detect_faces
+from session_recorder import RAW_FILE, load_session
+from swap_cache import CachedSwapper
+from tiled_detector import TiledDetector
+
+# 重新检测的人脸与录制时的人脸框 IoU 超过此值才认为是同一人，沿用录制时的轨迹映射
+MATCH_IOU = 0.3
+
+
+def output_schedule(records, default_fps):
+    """按录制时每帧的实际时间 t 换算输出帧率和每帧的写入次数
+
+    实时预览的处理帧率通常低于名义帧率且会波动，raw.mp4 只是按顺序存帧；
+    输出帧率取录制期间的平均帧率，再按时间戳补帧（重复写入）或丢帧（0 次），回放速度与现场一致。
+    """
+    times = [record.get("t") for record in records]
+    if len(records) < 2 or any(t is None for t in times) or times[-1] <= times[0]:
+        return default_fps, [1] * len(records)
+    fps = (len(records) - 1) / (times[-1] - times[0])
+    repeats = []
+    written = 0
+    for t in times:
+        target = int(round((t - times[0]) * fps)) + 1
+        repeats.append(max(0, target - written))
+        written = max(written, target)
+    return fps, repeats
+
+
+class SessionRenderer:
+    def __init__(self, app, swapper, tiled_detector=None):
+        self.app = app
+        self.tiled_detector = tiled_detector
+        # 不复用换脸结果，每帧每张人脸都重新推理
+        self.swapper = CachedSwapper(swapper, enabled=False)
+        self.library = FaceLibrary()
+        self.library.swapper = swapper
+        self._sources = {}
+        self._stickers = {}
+
+    def source(self, path):
+        """按路径加载源人脸（每个路径只分析一次），无法使用时返回 None"""
+        if path not in self._sources:
+            entry = None
+            img = read_image(path) if path and os.path.exists(path) else None
+            faces = self.app.get(img) if img is not None else []
+            if faces:
+                name = os.path.splitext(os.path.basename(path))[0]
+                entry = self.library.add(path, name, img, faces[0])
+            else:
+                print(f"无法加载源人脸: {path}")
+            self._sources[path] = entry
+        return self._sources[path]
+
+    def sticker(self, path):
+        if path not in self._stickers:
+            self._stickers[path] = effects.load_sticker(path) if os.path.exists(path) else None
+        return self._stickers[path]
+
+    def detect(self, frame):
+        if self.tiled_detector is not None:
+            return self.tiled_detector.detect(frame)
+        return detect_faces(self.app, frame)
+
+    def _match_tracks(self, faces, record):
+        """把重新检测到的人脸对应到录制时的轨迹ID，对应不上的为 None"""
+        recorded = np.asarray(record["bboxes"], dtype=np.float32).reshape(-1, 4)
+        track_ids = record.get("track_ids") or []
+        matched = [None] * len(faces)
+        if not len(faces) or not len(recorded) or not track_ids:
+            return matched
+        iou = iou_matrix(faces.bboxes, recorded)
+        for i in range(len(faces)):
+            j = int(iou[i].argmax())
+            if iou[i, j] >= MATCH_IOU:
+                matched[i] = track_ids[j]
+                iou[:, j] = -1
+        return matched
+
+    def render_frame(self, frame, record):
+        output = frame.copy()
+        faces = self.detect(frame)
+        stickers = [(self.sticker(path), position) for path, position in record["stickers"]]
+        stickers = [sticker for sticker in stickers if sticker[0] is not None]
+        if stickers and len(faces):
+            compute_landmarks(self.app.models["landmark_2d_106"], frame, faces)
+
+        blend = min(record["blend"], 1.0)
+        targets = []
+        if record["multi_face"]:
+            for i, track_id in enumerate(self._match_tracks(faces, record)):
+                path = record["mapping"].get(str(track_id)) if track_id is not None else None
+                if path:
+                    targets.append((i, self.source(path)))
+        elif len(faces) and record["source"]:
+            targets.append((0, self.source(record["source"])))
+
+        for i, source in targets:
+            if source is not None and blend > 0:
+                self.swapper.swap(frame, output, faces.kpss[i], source, track_key=i, blend=blend)
+        for i, _ in targets:
+            if stickers:
+                effects.apply_stickers(output, faces[i], stickers)
+
+        return effects.FILTERS.get(record["filter"], effects.FILTERS["无"])(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按录制的元数据离线重渲染原始素材")
+    parser.add_argument("session", help="原始素材录制目录")
+    parser.add_argument("--output", default=None, help="输出视频（默认 会话目录/rendered.mp4）")
+    parser.add_argument("--det-size", type=int, default=640)
+    parser.add_argument("--tile", type=int, default=0, help="大于0时使用该边长的分块检测，适合高分辨率素材")
+    parser.add_argument("--codec", default="auto", help="auto / libx264 / libx265 / h264_nvenc 等 ffmpeg 编码器，或 mp4v")
+    parser.add_argument("--preset", default="slow")
+    parser.add_argument("--crf", type=int, default=18)
+    parser.add_argument("--buffalo", default="buffalo_l")
+    parser.add_argument("--root", default="~/.insightface")
+    parser.add_argument("--inswapper", default="./models/inswapper_128.onnx")
+    parser.add_argument("--profile", default=None, help="运行时配置文件（默认 runtime_profile.json）")
+    args = parser.parse_args()
+
+    header, records = load_session(args.session)
+    output_path = args.output or os.path.join(args.session, "rendered.mp4")
+
+    profile = runtime_profile.load_profile(args.profile,
+                                           default_providers=["CUDAExecutionProvider", "CPUExecutionProvider"])
+    print("正在加载模型...")
+    app = runtime_profile.create_face_analysis(args.buffalo, profile, root=args.root,
+                                               allowed_modules=["detection", "recognition"])
+    app.prepare(ctx_id=0, det_size=(args.det_size, args.det_size))
+    if any(record["stickers"] for record in records):
+        runtime_profile.add_face_module(app, profile, "landmark_2d_106")
+    swapper = runtime_profile.load_model(args.inswapper, profile)
+    tiled = TiledDetector(app.det_model, tile_size=args.tile) if args.tile > 0 else None
+    renderer = SessionRenderer(app, swapper, tiled)
+
+    cap = cv2.VideoCapture(os.path.join(args.session, RAW_FILE))
+    frame_size = tuple(header["frame_size"])
+    fps, repeats = output_schedule(records, header["fps"])
+    print(f"按录制时间戳输出 {fps:.2f} fps")
+    # 离线渲染不丢帧：编码器满时阻塞等待
+    writer = create_encoder(output_path, frame_size, fps, codec=args.codec,
+                            preset=args.preset, crf=args.crf)
+    rendered = 0
+    error = None
+    try:
+        for record, repeat in zip(records, repeats):
+            ret, frame = cap.read()
+            if not ret:
+                print(f"原始画面在第 {rendered} 帧提前结束")
+                break
+            if repeat:
+                output = renderer.render_frame(frame, record)
+                for _ in range(repeat):
+                    writer.write(output)
+            rendered += 1
+            if rendered % 100 == 0:
+                print(f"已渲染 {rendered}/{len(records)} 帧")
+    except EncoderError as e:
+        error = e
+    finally:
+        cap.release()
+        try:
+            writer.close()
+        except EncoderError as e:
+            error = error or e
+    if error is not None:
+        print(f"渲染失败（已渲染 {rendered} 帧）: {error}")
+        sys.exit(1)
+    print(f"渲染完成: {output_path}（{rendered} 帧）")
+
+
+if __name__ == "__main__":
+    main()
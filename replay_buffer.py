@@ -0,0 +1,138 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from encoders import create_encoder
+
+DEFAULT_SECONDS = 10.0
+DEFAULT_MAX_MB = 64
+DEFAULT_FPS = 15.0
+DEFAULT_QUALITY = 80
+
+
+class ReplayBuffer:
+    """常开的即时回放缓冲：最近 seconds 秒处理后的画面，按JPEG压缩保存在内存里
+
+    内存占用同时受时长和 max_mb 限制，超出时丢弃最旧的帧。CPU开销由 fps（每秒最多缓存几帧）、
+    quality 和 scale（缓存前缩放）控制；JPEG编码在后台线程进行，来不及编码的帧直接跳过。
+    save 在另一个后台线程里把当前缓冲解码并编码成视频文件，不影响继续缓存。
+    """
+
+    def __init__(self, seconds=DEFAULT_SECONDS, max_mb=DEFAULT_MAX_MB, fps=DEFAULT_FPS,
+                 quality=DEFAULT_QUALITY, scale=1.0, enabled=True):
+        self.seconds = seconds
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.fps = fps
+        self.quality = quality
+        self.scale = scale
+        self.enabled = enabled
+
+        self._frames = deque()  # (时间戳, JPEG字节)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._last_submit = 0.0
+        self._queue = queue.Queue(maxsize=2)
+        self._encode_ms = 0.0
+        self._encoded = 0
+        self.skipped = 0
+        self.saving = False
+        self._thread = threading.Thread(target=self._encode_worker, daemon=True)
+        self._thread.start()
+
+    def submit(self, frame):
+        """在界面线程调用：按 fps 限速后非阻塞入队，编码线程忙时丢弃"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if now - self._last_submit < 1.0 / self.fps:
+            return
+        self._last_submit = now
+        try:
+            self._queue.put_nowait((now, frame.copy()))
+        except queue.Full:
+            self.skipped += 1
+
+    def _encode_worker(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)]
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            timestamp, frame = item
+            start = time.perf_counter()
+            if self.scale != 1.0:
+                frame = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+            ok, jpeg = cv2.imencode(".jpg", frame, params)
+            if not ok:
+                continue
+            data = jpeg.tobytes()
+            self._encode_ms += (time.perf_counter() - start) * 1000
+            self._encoded += 1
+            with self._lock:
+                self._frames.append((timestamp, data))
+                self._bytes += len(data)
+                self._trim(timestamp)
+
+    def _trim(self, now):
+        while self._frames and (now - self._frames[0][0] > self.seconds or self._bytes > self.max_bytes):
+            _, data = self._frames.popleft()
+            self._bytes -= len(data)
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._bytes = 0
+
+    @property
+    def stats(self):
+        with self._lock:
+            count = len(self._frames)
+            duration = self._frames[-1][0] - self._frames[0][0] if count > 1 else 0.0
+            memory = self._bytes
+        return {
+            "frames": count,
+            "seconds": duration,
+            "memory_mb": memory / (1024 * 1024),
+            "encode_ms": self._encode_ms / self._encoded if self._encoded else 0.0,
+            "skipped": self.skipped,
+        }
+
+    def save(self, path, on_finished=None):
+        """把当前缓冲写成视频（后台线程），完成后调用 on_finished(路径, 说明文字)；缓冲为空时返回 False"""
+        with self._lock:
+            frames = list(self._frames)
+        if len(frames) < 2 or self.saving:
+            return False
+        self.saving = True
+        threading.Thread(target=self._save_worker, args=(path, frames, on_finished), daemon=True).start()
+        return True
+
+    def _save_worker(self, path, frames, on_finished):
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            duration = frames[-1][0] - frames[0][0]
+            # 按实际缓存到的帧数和时长换算帧率，回放速度与现场一致
+            fps = (len(frames) - 1) / duration if duration > 0 else self.fps
+            first = cv2.imdecode(np.frombuffer(frames[0][1], dtype=np.uint8), cv2.IMREAD_COLOR)
+            height, width = first.shape[:2]
+            writer = create_encoder(path, (width, height), fps)
+            writer.write(first)
+            for _, data in frames[1:]:
+                writer.write(cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR))
+            writer.close()
+            message = f"{len(frames)} 帧，{duration:.1f} 秒"
+        except Exception as e:
+            message = f"保存失败: {e}"
+        finally:
+            self.saving = False
+        if on_finished is not None:
+            on_finished(path, message)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=1.0)
@@ -0,0 +1,111 @@
+import math
+
+import numpy as np
+
+import face_ops
+from frame_result import FrameFaces, detect_faces
+
+# 检测器输入中人脸的目标边长（像素），据此为每个区域选择输入尺寸
+TARGET_FACE_PX = 64
+MIN_INPUT = 96
+MAX_INPUT = 320
+
+
+def _round32(value):
+    return int(min(MAX_INPUT, max(MIN_INPUT, math.ceil(value / 32) * 32)))
+
+
+class RoiDetector:
+    """只在已知人脸附近检测，定期做一次全图检测发现新出现的人
+
+    以上一帧的人脸框为预测位置，向四周扩展 margin 倍边长（覆盖帧间移动）得到检测区域，重叠区域合并。
+    每个区域按其中最小人脸的大小选择检测输入，远处的小脸会被放大检测，比整帧缩到 det_size 召回更好。
+    以下情况退回全图检测：没有已知人脸、距上次全图检测已满 full_interval 帧、上一帧区域检测丢了人脸，
+    以及推理服务客户端（检测尺寸由服务端固定）。
+    """
+
+    def __init__(self, app, enabled=True, margin=1.0, full_interval=10, nms_threshold=0.4):
+        self.app = app
+        self.enabled = enabled
+        self.margin = margin
+        self.full_interval = full_interval
+        self.nms_threshold = nms_threshold
+        self._since_full = 0
+        self._lost = False
+        self.stats = {"full_scans": 0, "roi_scans": 0, "regions": 0}
+
+    def reset(self):
+        self._since_full = 0
+        self._lost = False
+
+    def regions(self, bboxes, width, height):
+        """返回 [(x0, y0, x1, y1, 区域内最小人脸边长)]，重叠的区域合并成外接矩形"""
+        rois = []
+        for x0, y0, x1, y1 in np.asarray(bboxes, dtype=np.float32).reshape(-1, 4):
+            side = max(x1 - x0, y1 - y0, 1.0)
+            pad = side * self.margin
+            rois.append([max(0.0, x0 - pad), max(0.0, y0 - pad),
+                         min(float(width), x1 + pad), min(float(height), y1 + pad), side])
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(rois)):
+                for j in range(i + 1, len(rois)):
+                    a, b = rois[i], rois[j]
+                    if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                        rois[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]),
+                                   min(a[4], b[4])]
+                        del rois[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return [(int(r[0]), int(r[1]), int(math.ceil(r[2])), int(math.ceil(r[3])), r[4]) for r in rois]
+
+    def detect(self, img, previous_bboxes, max_num=0):
+        """previous_bboxes 为上一帧的人脸框 (N,4)，返回本帧的 FrameFaces"""
+        need_full = (not self.enabled or not hasattr(self.app, "det_model") or len(previous_bboxes) == 0
+                     or self._lost or self._since_full >= self.full_interval)
+        if need_full:
+            self._since_full = 0
+            self._lost = False
+            self.stats["full_scans"] += 1
+            return detect_faces(self.app, img, max_num=max_num)
+
+        self._since_full += 1
+        self.stats["roi_scans"] += 1
+        height, width = img.shape[:2]
+        det_model = self.app.det_model
+        all_dets, all_kpss = [], []
+        for x0, y0, x1, y1, face_side in self.regions(previous_bboxes, width, height):
+            crop = img[y0:y1, x0:x1]
+            if crop.size == 0:
+                continue
+            size = _round32(max(x1 - x0, y1 - y0) * TARGET_FACE_PX / face_side)
+            dets, kpss = det_model.detect(crop, input_size=(size, size), metric="default")
+            self.stats["regions"] += 1
+            if len(dets) == 0:
+                continue
+            dets = dets.copy()
+            dets[:, [0, 2]] += x0
+            dets[:, [1, 3]] += y0
+            all_dets.append(dets)
+            if kpss is not None:
+                kpss = kpss.copy()
+                kpss[:, :, 0] += x0
+                kpss[:, :, 1] += y0
+                all_kpss.append(kpss)
+
+        if not all_dets:
+            self._lost = True
+            return FrameFaces.empty()
+        dets = np.concatenate(all_dets)
+        kpss = np.concatenate(all_kpss) if len(all_kpss) == len(all_dets) else None
+        keep = face_ops.nms(dets, self.nms_threshold)
+        if max_num > 0:
+            keep = keep[:max_num]
+        dets = dets[keep]
+        kpss = kpss[keep] if kpss is not None else None
+        # 有人离开或区域里没找到，下一帧做全图检测确认
+        self._lost = len(dets) < len(previous_bboxes)
+        return FrameFaces.from_detections(dets, kpss)
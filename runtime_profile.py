@@ -0,0 +1,306 @@
+import copy
+import glob
+import json
+import os
+
+# 运行时配置文件，可用环境变量 SWAPPER_RUNTIME_PROFILE 指定其他路径
+DEFAULT_PROFILE_PATH = "runtime_profile.json"
+
+# 模型精度：fp32 为原始模型，其余变体由 quantize_models.py 生成到 variant_dir
+PRECISIONS = ("fp32", "fp16", "int8_dynamic", "int8_static")
+
+DEFAULT_PROFILE = {
+    "providers": ["CPUExecutionProvider"],
+    "precision": "fp32",
+    "variant_dir": "./models/variants",
+    "provider_options": {},
+    "session": {
+        "intra_op_num_threads": 0,
+        "inter_op_num_threads": 0,
+        "execution_mode": "sequential",
+        "graph_optimization_level": "all",
+        "enable_cpu_mem_arena": True,
+        "enable_mem_pattern": True,
+        "optimized_model_dir": "",
+    },
+    "models": {},
+    # 本机推理服务地址（Unix套接字路径或 host:port），为空时在进程内加载模型
+    "inference_service": "",
+    # 人脸库原图缓存上限（MB）
+    "image_cache_mb": 256,
+    # 换脸结果复用：对齐人脸的平均像素差低于 threshold 且连续复用不超过 max_age 帧时不重新推理
+    "swap_cache": {"enabled": True, "threshold": 3.0, "max_age": 8},
+    # 无人时的待机检测：连续 idle_after 帧没有人脸后，每 idle_interval 秒用 idle_input_size 检测一次，
+    # motion_gating 开启时画面没有变化就跳过检测
+    "presence": {"enabled": True, "idle_after": 15, "idle_interval": 0.25, "idle_input_size": [160, 160],
+                 "motion_gating": True, "motion_threshold": 4.0},
+    # 多人脸时每帧留给换脸的毫秒数，超出的人脸复用最近一次结果、下一帧优先刷新
+    "frame_budget": {"enabled": True, "budget_ms": 20.0},
+    # 区域检测：上一帧人脸框向外扩 margin 倍作为检测区域，每 full_interval 帧做一次全图检测
+    "roi_detection": {"enabled": True, "margin": 1.0, "full_interval": 10},
+    # 多人脸并行换脸：workers 为 0 时取 CPU核数的一半（最多4）；sessions 为 shared（线程共用一个池会话）或 per_worker，
+    # 两种模式下池会话的线程数都取 CPU核数/workers
+    "swap_executor": {"enabled": True, "workers": 0, "sessions": "shared"},
+    # 即时回放缓冲：保留最近 seconds 秒、最多 max_mb 的JPEG帧；fps / quality / scale 控制CPU开销
+    "replay_buffer": {"enabled": True, "seconds": 10.0, "max_mb": 64, "fps": 15.0, "quality": 80, "scale": 1.0},
+    # 截图默认格式（JPEG / PNG / WebP）、质量和连拍间隔（秒）
+    "snapshot": {"format": "JPEG", "quality": 95, "interval": 0.2},
+}
+
+# onnxruntime 在第一次建会话时才导入，这里只记枚举名
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+EXECUTION_MODES = {
+    "sequential": "ORT_SEQUENTIAL",
+    "parallel": "ORT_PARALLEL",
+}
+
+# 这些执行器有自己的引擎/编译缓存，不再额外保存优化后的onnx
+SELF_CACHING_PROVIDERS = ("TensorrtExecutionProvider", "OpenVINOExecutionProvider")
+
+
+def _merge(base, override):
+    result = copy.deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = _merge(result[key], value)
+        else:
+            result[key] = value
+    return result
+
+
+def validate_profile(profile):
+    """检查全局设置和每个模型覆盖后的设置，拼错的取值在启动时就报出来，而不是建会话时才抛 KeyError"""
+    for key in [None] + sorted(profile.get("models", {})):
+        merged = profile if key is None else model_profile(profile, key)
+        where = "" if key is None else f"models.{key}."
+        if not isinstance(merged.get("providers"), list):
+            raise ValueError(f"{where}providers 应为执行器名称列表")
+        if merged.get("precision", "fp32") not in PRECISIONS:
+            raise ValueError(f"{where}precision 应为 {'/'.join(PRECISIONS)} 之一: {merged['precision']}")
+        settings = merged.get("session", {})
+        for name, choices in (("execution_mode", EXECUTION_MODES),
+                              ("graph_optimization_level", GRAPH_OPTIMIZATION_LEVELS)):
+            if name in settings and settings[name] not in choices:
+                raise ValueError(f"{where}session.{name} 应为 {'/'.join(choices)} 之一: {settings[name]}")
+
+
+def load_profile(path=None, default_providers=None):
+    """读取运行时配置；文件不存在时使用默认值（default_providers 为各脚本原来的执行器顺序）"""
+    profile = copy.deepcopy(DEFAULT_PROFILE)
+    if default_providers:
+        profile["providers"] = list(default_providers)
+
+    path = path or os.environ.get("SWAPPER_RUNTIME_PROFILE", DEFAULT_PROFILE_PATH)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            profile = _merge(profile, json.load(f))
+        try:
+            validate_profile(profile)
+        except ValueError as e:
+            raise ValueError(f"运行时配置 {path} 有误: {e}") from None
+        print(f"已加载运行时配置: {path}")
+    return profile
+
+
+def model_key(model_file):
+    return os.path.splitext(os.path.basename(model_file))[0]
+
+
+def model_profile(profile, model_file):
+    # 按模型文件名（不带扩展名）覆盖全局设置
+    override = profile.get("models", {}).get(model_key(model_file), {})
+    return _merge({k: v for k, v in profile.items() if k != "models"}, override)
+
+
+def resolve_providers(profile):
+    """按配置顺序保留当前 onnxruntime 实际可用的执行器，并附上各自的参数"""
+    import onnxruntime
+
+    available = onnxruntime.get_available_providers()
+    providers = [p for p in profile["providers"] if p in available]
+    if "CPUExecutionProvider" not in providers:
+        providers.append("CPUExecutionProvider")
+    options = [dict(profile.get("provider_options", {}).get(p, {})) for p in providers]
+    return providers, options
+
+
+def session_options(profile, providers):
+    import onnxruntime
+
+    settings = profile["session"]
+    so = onnxruntime.SessionOptions()
+    so.intra_op_num_threads = int(settings.get("intra_op_num_threads", 0))
+    so.inter_op_num_threads = int(settings.get("inter_op_num_threads", 0))
+    so.execution_mode = getattr(onnxruntime.ExecutionMode,
+                                EXECUTION_MODES[settings.get("execution_mode", "sequential")])
+    so.graph_optimization_level = getattr(onnxruntime.GraphOptimizationLevel,
+                                          GRAPH_OPTIMIZATION_LEVELS[settings.get("graph_optimization_level", "all")])
+    so.enable_cpu_mem_arena = bool(settings.get("enable_cpu_mem_arena", True))
+    so.enable_mem_pattern = bool(settings.get("enable_mem_pattern", True))
+
+    if providers[0] == "DmlExecutionProvider":
+        # DirectML 不支持内存模式复用和并行执行
+        so.enable_mem_pattern = False
+        so.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    return so
+
+
+def variant_path(variant_dir, model_file, precision):
+    return os.path.join(variant_dir, f"{model_key(model_file)}.{precision}.onnx")
+
+
+def resolve_model_file(profile, model_file):
+    """按配置的精度选择模型文件；对应变体不存在时退回原始fp32模型"""
+    precision = profile.get("precision", "fp32")
+    if precision == "fp32":
+        return model_file
+    if precision not in PRECISIONS:
+        raise ValueError(f"未知的模型精度: {precision}")
+    variant = variant_path(profile["variant_dir"], model_file, precision)
+    if not os.path.exists(variant):
+        print(f"未找到{precision}模型 {variant}，使用原始模型")
+        return model_file
+    return variant
+
+
+def _optimized_path(profile, model_file, providers):
+    cache_dir = profile["session"].get("optimized_model_dir")
+    if not cache_dir or providers[0] in SELF_CACHING_PROVIDERS:
+        return None
+    # 优化后的图与执行器和优化级别相关，文件名里带上两者
+    tag = providers[0].replace("ExecutionProvider", "").lower()
+    level = profile["session"].get("graph_optimization_level", "all")
+    name = os.path.splitext(os.path.basename(model_file))[0]
+    return os.path.join(cache_dir, f"{name}.{tag}.{level}.onnx")
+
+
+def create_session(model_file, profile):
+    import onnxruntime
+
+    profile = model_profile(profile, model_file)
+    providers, provider_options = resolve_providers(profile)
+    so = session_options(profile, providers)
+
+    source_file = resolve_model_file(profile, model_file)
+    session_file = source_file
+    optimized = _optimized_path(profile, source_file, providers)
+    if optimized:
+        if os.path.exists(optimized) and os.path.getmtime(optimized) >= os.path.getmtime(source_file):
+            # 已有缓存：直接加载优化后的图，跳过启动时的图优化
+            session_file = optimized
+            so.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+        else:
+            os.makedirs(os.path.dirname(optimized), exist_ok=True)
+            so.optimized_model_filepath = optimized
+
+    return onnxruntime.InferenceSession(session_file, sess_options=so,
+                                        providers=providers, provider_options=provider_options)
+
+
+def dummy_feed(session):
+    """全零输入，动态维度一律取1，只为触发会话的内存分配和内核选择"""
+    import numpy as np
+
+    feed = {}
+    for inp in session.get_inputs():
+        shape = [d if isinstance(d, int) and d > 0 else 1 for d in inp.shape]
+        feed[inp.name] = np.zeros(shape, dtype=np.float32)
+    return feed
+
+
+def warm_up(app, swapper, frame_size=(720, 1280), runs=2):
+    """用空白帧把每个会话都跑几遍，避免第一帧真实画面出现几百毫秒的卡顿"""
+    import numpy as np
+
+    frame = np.zeros((frame_size[0], frame_size[1], 3), dtype=np.uint8)
+    for _ in range(runs):
+        app.det_model.detect(frame, max_num=0, metric="default")
+        for model in app.models.values():
+            if model is not app.det_model:
+                model.session.run(None, dummy_feed(model.session))
+        if swapper is not None:
+            swapper.session.run(None, dummy_feed(swapper.session))
+
+
+def load_model(model_file, profile):
+    """与 insightface.model_zoo.get_model 相同的模型识别规则，但会话由配置创建"""
+    from insightface.model_zoo.arcface_onnx import ArcFaceONNX
+    from insightface.model_zoo.attribute import Attribute
+    from insightface.model_zoo.inswapper import INSwapper
+    from insightface.model_zoo.landmark import Landmark
+    from insightface.model_zoo.retinaface import RetinaFace
+
+    session = create_session(model_file, profile)
+    inputs = session.get_inputs()
+    input_shape = inputs[0].shape
+    outputs = session.get_outputs()
+    # model_file 始终传原始文件：INSwapper 要从原图里读 emap
+    if len(outputs) >= 5:
+        return RetinaFace(model_file=model_file, session=session)
+    elif input_shape[2] == 192 and input_shape[3] == 192:
+        return Landmark(model_file=model_file, session=session)
+    elif input_shape[2] == 96 and input_shape[3] == 96:
+        return Attribute(model_file=model_file, session=session)
+    elif len(inputs) == 2 and input_shape[2] == 128 and input_shape[3] == 128:
+        return INSwapper(model_file=model_file, session=session)
+    elif input_shape[2] == input_shape[3] and input_shape[2] >= 112 and input_shape[2] % 16 == 0:
+        return ArcFaceONNX(model_file=model_file, session=session)
+    return None
+
+
+# insightface 模型包里已知文件对应的任务，用于在建会话之前跳过不需要的模型
+MODEL_TASKS = {
+    "det_10g": "detection",
+    "det_500m": "detection",
+    "w600k_r50": "recognition",
+    "w600k_mbf": "recognition",
+    "2d106det": "landmark_2d_106",
+    "1k3d68": "landmark_3d_68",
+    "genderage": "genderage",
+}
+
+
+def create_face_analysis(name, profile, root="~/.insightface", allowed_modules=None):
+    """等价于 FaceAnalysis(name, root, allowed_modules)，每个子模型单独按配置建会话"""
+    from insightface.app import FaceAnalysis
+    from insightface.utils.storage import ensure_available
+
+    app = FaceAnalysis.__new__(FaceAnalysis)
+    app.models = {}
+    app.model_dir = ensure_available("models", name, root=root)
+    for onnx_file in sorted(glob.glob(os.path.join(app.model_dir, "*.onnx"))):
+        task = MODEL_TASKS.get(model_key(onnx_file))
+        if allowed_modules is not None and task is not None and task not in allowed_modules:
+            # 已知任务且不需要：连会话都不创建
+            continue
+        model = load_model(onnx_file, profile)
+        if model is None:
+            print(f"无法识别的模型: {onnx_file}")
+        elif allowed_modules is not None and model.taskname not in allowed_modules:
+            del model
+        elif model.taskname not in app.models:
+            print(f"加载模型: {onnx_file} {model.taskname} {model.session.get_providers()}")
+            app.models[model.taskname] = model
+    assert "detection" in app.models
+    app.det_model = app.models["detection"]
+    return app
+
+
+def add_face_module(app, profile, taskname, ctx_id=0):
+    """按需给已创建的 FaceAnalysis 追加一个子模型（例如启用贴纸时才加载106点关键点）"""
+    if taskname in app.models:
+        return app.models[taskname]
+    for onnx_file in sorted(glob.glob(os.path.join(app.model_dir, "*.onnx"))):
+        if MODEL_TASKS.get(model_key(onnx_file)) == taskname:
+            model = load_model(onnx_file, profile)
+            model.prepare(ctx_id)
+            app.models[taskname] = model
+            print(f"加载模型: {onnx_file} {taskname} {model.session.get_providers()}")
+            return model
+    raise FileNotFoundError(f"模型包中没有 {taskname} 模型")
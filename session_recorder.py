@@ -0,0 +1,152 @@
+"""原始素材录制：保存未处理的摄像头画面和每帧的检测/映射/效果参数，供 render_session.py 离线高质量重渲染
+
+一次录制对应一个目录：
+    raw.mp4        原始画面（默认 libx264 crf 10 近无损，crf=0 为无损；没有ffmpeg时退回 mp4v）
+    session.jsonl  第一行为会话信息，之后每行对应 raw.mp4 中的一帧；
+                   raw.mp4 按名义帧率顺序存帧，实际采集时间记录在每帧的 t 中，重渲染时据此还原速度
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+from encoders import EncoderError, create_encoder
+
+SESSION_VERSION = 1
+RAW_FILE = "raw.mp4"
+SIDECAR_FILE = "session.jsonl"
+
+
+def make_record(faces, track_ids, multi_face, mapping, source_path, blend, filter_name, stickers):
+    """一帧的元数据：faces 为 FrameFaces，mapping 为 {轨迹ID: 源人脸路径}，stickers 为 [(贴纸路径, 位置类型)]"""
+    return {
+        "bboxes": faces.bboxes.round(2).tolist(),
+        "kpss": faces.kpss.round(2).tolist(),
+        "track_ids": [int(t) for t in track_ids] if track_ids is not None else None,
+        "multi_face": bool(multi_face),
+        "mapping": {str(track_id): path for track_id, path in mapping.items()},
+        "source": source_path,
+        "blend": float(blend),
+        "filter": filter_name,
+        "stickers": [[path, position] for path, position in stickers],
+    }
+
+
+class SessionRecorder:
+    """画面和元数据成对入队，由后台线程写入；队列满时整对丢弃，保证 raw.mp4 的帧号与 jsonl 的行一一对应"""
+
+    def __init__(self, directory, frame_size, fps=30.0, det_size=(320, 320), codec="libx264",
+                 preset="ultrafast", crf=10):
+        self.directory = directory
+        self.frame_size = frame_size
+        self.fps = fps
+        self.det_size = det_size
+        self.codec = codec
+        self.preset = preset
+        self.crf = crf
+        self.encoder = None
+        # 结束回调 on_finished(目录, 说明文字)，在后台线程中调用
+        self.on_finished = None
+
+        self.start_time = None
+        self._queue = queue.Queue(maxsize=60)
+        self._thread = None
+        self._stopping = threading.Event()
+        self.error = None
+        self.stats = {"frames": 0, "dropped": 0}
+
+    @property
+    def raw_path(self):
+        return os.path.join(self.directory, RAW_FILE)
+
+    @property
+    def sidecar_path(self):
+        return os.path.join(self.directory, SIDECAR_FILE)
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.start_time = time.monotonic()
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def push(self, frame, record, timestamp=None):
+        """timestamp 为该帧的采集时刻（time.monotonic()），记录为 t"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        try:
+            self._queue.put_nowait((timestamp, frame.copy(), record))
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def stop(self):
+        """立即返回；后台线程写完已入队的帧后结束"""
+        self._stopping.set()
+
+    def wait(self):
+        if self._thread is not None:
+            self._thread.join()
+
+    def _pending_frames(self):
+        # 用停止标志而不是结束标记：写入线程异常退出后 stop() 也不会阻塞在满队列上
+        while True:
+            try:
+                yield self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+
+    def _worker(self):
+        sidecar = None
+        try:
+            # 编码器在后台线程里创建，首次使用时可能需要探测 ffmpeg
+            self.encoder = create_encoder(self.raw_path, self.frame_size, self.fps,
+                                          codec=self.codec, preset=self.preset, crf=self.crf)
+            sidecar = open(self.sidecar_path, "w", encoding="utf-8")
+            header = {
+                "version": SESSION_VERSION,
+                "fps": self.fps,
+                "frame_size": list(self.frame_size),
+                "det_size": list(self.det_size),
+                "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            sidecar.write(json.dumps(header, ensure_ascii=False) + "\n")
+            for timestamp, frame, record in self._pending_frames():
+                record = dict(record, frame=self.stats["frames"], t=round(timestamp - self.start_time, 4))
+                self.encoder.write(frame)
+                sidecar.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self.stats["frames"] += 1
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            if sidecar is not None:
+                sidecar.close()
+            if self.encoder is not None:
+                try:
+                    self.encoder.close()
+                except EncoderError as e:
+                    self.error = self.error or str(e)
+            self._finished()
+
+    def _finished(self):
+        # 无论成功与否都要回调，界面才能离开"保存中"状态
+        if self.on_finished is None:
+            return
+        message = f"{self.stats['frames']} 帧"
+        if self.stats["dropped"]:
+            message += f"，丢弃 {self.stats['dropped']} 帧"
+        if self.error is not None:
+            message += f"，录制失败: {self.error}"
+        self.on_finished(self.directory, message)
+
+
+def load_session(directory):
+    """返回 (会话信息, 每帧元数据列表)"""
+    with open(os.path.join(directory, SIDECAR_FILE), encoding="utf-8") as sidecar:
+        lines = [json.loads(line) for line in sidecar if line.strip()]
+    if not lines:
+        raise ValueError(f"会话元数据为空: {directory}")
+    header = lines[0]
+    if header.get("version") != SESSION_VERSION:
+        raise ValueError(f"不支持的会话版本: {header.get('version')}")
+    return header, lines[1:]
@@ -0,0 +1,208 @@
+"""共享内存帧输出：把处理后的画面发布到 multiprocessing.shared_memory 环形缓冲，供本机其他进程零拷贝读取
+
+内存布局（小端）：
+    全局头 64 字节：magic "SWPF"、版本、槽数、发布端进程号、每槽数据容量、最新序号
+    槽头   32 字节 x 槽数：序号、时间戳(time.monotonic)、高、宽、通道、行跨度
+    数据区 每槽容量字节 x 槽数，BGR uint8 按行存放
+
+每个槽用序号做 seqlock：写入前把序号置为奇数，写完再置为偶数；读者在拷贝前后各读一次序号，
+两次相同且为偶数才说明读到的是完整的一帧。其他语言按上面的布局解析即可。
+"""
+import os
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+DEFAULT_NAME = "swapper_frames"
+MAGIC = b"SWPF"
+VERSION = 1
+
+HEADER = struct.Struct("<4sIIIQQ32x")  # magic, version, slots, pid, slot_capacity, latest_seq
+LATEST_SEQ_OFFSET = 24
+SLOT_HEADER = struct.Struct("<QdIIII")  # seq, timestamp, height, width, channels, stride
+SLOT_HEADER_SIZE = 32
+
+
+def _process_alive(pid):
+    if pid <= 0:
+        return False
+    if sys.platform == "win32":
+        # Windows 上共享内存在最后一个句柄关闭时释放，还能打开就说明仍有进程在用
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _untrack(shm):
+    if sys.platform != "win32":
+        # 3.13 之前打开已有的段也会被 resource_tracker 登记，进程退出时会误删别人的共享内存
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+
+
+def _remove_stale(name):
+    """同名段是上次异常退出残留的才删除；其他实例正在使用或不是本程序的段时抛出 RuntimeError"""
+    stale = shared_memory.SharedMemory(name=name)
+    error = None
+    if stale.size < HEADER.size or bytes(stale.buf[:len(MAGIC)]) != MAGIC:
+        error = f"共享内存 {name} 已存在且不是换脸程序的帧输出"
+    else:
+        pid = HEADER.unpack_from(stale.buf, 0)[3]
+        if _process_alive(pid):
+            error = f"共享内存 {name} 正被另一个实例（进程 {pid}）使用"
+    stale.close()
+    if error is not None:
+        _untrack(stale)
+        raise RuntimeError(error)
+    stale.unlink()
+
+
+class SharedFramePublisher:
+    """写端：publish 每次写入下一个槽，写满后循环覆盖最旧的槽"""
+
+    def __init__(self, name=DEFAULT_NAME, max_shape=(1080, 1920, 3), slots=3):
+        self.name = name
+        self.slots = slots
+        self.max_shape = tuple(max_shape)
+        self.slot_capacity = int(np.prod(self.max_shape))
+        self.data_offset = HEADER.size + SLOT_HEADER_SIZE * slots
+        size = self.data_offset + self.slot_capacity * slots
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # 上次异常退出残留的同名段：确认发布端进程已不在后清掉重建
+            _remove_stale(name)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.seq = 0
+        self.stats = {"published": 0, "bytes": 0}
+        HEADER.pack_into(self.shm.buf, 0, MAGIC, VERSION, slots, os.getpid(), self.slot_capacity, 0)
+
+    def fits(self, frame):
+        return frame.nbytes <= self.slot_capacity
+
+    def publish(self, frame, timestamp=None):
+        if not self.fits(frame):
+            raise ValueError(f"帧大小 {frame.shape} 超出共享内存容量 {self.max_shape}")
+        frame = np.ascontiguousarray(frame)
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        stride = width * channels
+
+        self.seq += 1
+        slot = self.seq % self.slots
+        header_offset = HEADER.size + SLOT_HEADER_SIZE * slot
+        data_offset = self.data_offset + self.slot_capacity * slot
+        buf = self.shm.buf
+
+        # 奇数序号表示该槽正在写入
+        struct.pack_into("<Q", buf, header_offset, 2 * self.seq - 1)
+        np.frombuffer(buf, dtype=np.uint8, count=frame.nbytes, offset=data_offset)[:] = frame.reshape(-1)
+        SLOT_HEADER.pack_into(buf, header_offset, 2 * self.seq,
+                              time.monotonic() if timestamp is None else timestamp,
+                              height, width, channels, stride)
+        struct.pack_into("<Q", buf, LATEST_SEQ_OFFSET, self.seq)
+
+        self.stats["published"] += 1
+        self.stats["bytes"] += frame.nbytes
+
+    def close(self):
+        if self.shm is not None:
+            # 把最新序号清零，读者据此判断发布端已退出
+            struct.pack_into("<Q", self.shm.buf, LATEST_SEQ_OFFSET, 0)
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class SharedFrameReader:
+    """参考读端：read 返回 (序号, 时间戳, 帧)，没有新帧时返回 None"""
+
+    def __init__(self, name=DEFAULT_NAME):
+        self.shm = shared_memory.SharedMemory(name=name)
+        # 读端不能在退出时删除发布端的共享内存
+        _untrack(self.shm)
+        magic, version, self.slots, _, self.slot_capacity, _ = HEADER.unpack_from(self.shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{name} 不是换脸程序的帧输出")
+        self.data_offset = HEADER.size + SLOT_HEADER_SIZE * self.slots
+        self.last_seq = 0
+        self.stats = {"frames": 0, "skipped": 0, "torn": 0}
+
+    @property
+    def latest_seq(self):
+        return struct.unpack_from("<Q", self.shm.buf, LATEST_SEQ_OFFSET)[0]
+
+    def view(self, seq):
+        """返回指定序号帧的零拷贝视图及其槽头；视图在发布端绕回该槽前有效，可用 valid() 事后校验"""
+        slot = seq % self.slots
+        header_offset = HEADER.size + SLOT_HEADER_SIZE * slot
+        slot_seq, timestamp, height, width, channels, stride = SLOT_HEADER.unpack_from(self.shm.buf, header_offset)
+        if slot_seq != 2 * seq:
+            return None, None
+        data = np.frombuffer(self.shm.buf, dtype=np.uint8, count=height * stride,
+                             offset=self.data_offset + self.slot_capacity * slot)
+        frame = data.reshape(height, width, channels) if channels > 1 else data.reshape(height, width)
+        return frame, timestamp
+
+    def valid(self, seq):
+        header_offset = HEADER.size + SLOT_HEADER_SIZE * (seq % self.slots)
+        return struct.unpack_from("<Q", self.shm.buf, header_offset)[0] == 2 * seq
+
+    def read(self, copy=True):
+        seq = self.latest_seq
+        if seq == 0 or seq == self.last_seq:
+            return None
+        frame, timestamp = self.view(seq)
+        if frame is None:
+            self.stats["torn"] += 1
+            return None
+        if copy:
+            frame = frame.copy()
+            if not self.valid(seq):
+                # 拷贝过程中槽被覆盖
+                self.stats["torn"] += 1
+                return None
+        if self.last_seq and seq > self.last_seq + 1:
+            self.stats["skipped"] += seq - self.last_seq - 1
+        self.last_seq = seq
+        self.stats["frames"] += 1
+        return seq, timestamp, frame
+
+    def close(self):
+        self.shm.close()
+
+
+if __name__ == "__main__":
+    # 演示读端：显示共享内存里的画面，并打印帧率和端到端延迟
+    import cv2
+
+    name = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_NAME
+    reader = SharedFrameReader(name)
+    print(f"已连接共享内存 {name}，按 q 退出")
+    last_report = time.monotonic()
+    frames, latency = 0, 0.0
+    while True:
+        result = reader.read()
+        if result is None:
+            time.sleep(0.002)
+            continue
+        seq, timestamp, frame = result
+        frames += 1
+        latency += time.monotonic() - timestamp
+        cv2.imshow(name, frame)
+        if cv2.waitKey(1) & 0xFF == ord("q"):
+            break
+        now = time.monotonic()
+        if now - last_report >= 1.0:
+            print(f"seq={seq} {frames / (now - last_report):.1f} fps, "
+                  f"延迟 {1000.0 * latency / frames:.1f} ms, {reader.stats}")
+            last_report, frames, latency = now, 0, 0.0
+    reader.close()
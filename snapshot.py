@@ -0,0 +1,143 @@
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+# 截图格式 -> (扩展名, 质量参数)；PNG 为无损，质量换算成压缩级别（质量越高压缩越快、文件越大）
+SNAPSHOT_FORMATS = {
+    "JPEG": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+    "PNG": (".png", cv2.IMWRITE_PNG_COMPRESSION),
+    "WebP": (".webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+DEFAULT_INTERVAL = 0.2
+
+
+def encode_params(fmt, quality):
+    ext, flag = SNAPSHOT_FORMATS[fmt]
+    if fmt == "PNG":
+        return ext, [flag, max(0, min(9, 9 - int(quality) // 11))]
+    return ext, [flag, max(1, min(100, int(quality)))]
+
+
+class SnapshotWriter:
+    """截图和连拍：界面线程只复制当前帧入队，编码和写文件在后台线程进行
+
+    capture(count, interval) 登记一次拍摄请求，之后每帧调用 offer，按间隔取够 count 帧。
+    每保存一张调用一次 on_saved(路径, 说明文字)（在后台线程中）。
+    """
+
+    def __init__(self, directory="captures", fmt="JPEG", quality=95, interval=DEFAULT_INTERVAL, max_pending=30):
+        self.directory = directory
+        self.format = fmt
+        self.quality = quality
+        self.interval = interval
+        self.on_saved = None
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._burst_left = 0
+        self._burst_total = 0
+        self._burst_id = ""
+        self._last_burst_id = ""
+        self._repeat = 0
+        self._next_shot = 0.0
+        # 已入队但还没写完的张数
+        self._unsaved = 0
+        self._unsaved_lock = threading.Lock()
+        self._closing = threading.Event()
+        self.stats = {"saved": 0, "dropped": 0, "failed": 0, "encode_ms": 0.0}
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    @property
+    def busy(self):
+        return self._burst_left > 0
+
+    def capture(self, count=1, interval=None):
+        """登记拍摄 count 张（间隔 interval 秒）；上一组还没拍完时返回 False"""
+        if self._burst_left > 0:
+            return False
+        self._burst_left = self._burst_total = max(1, int(count))
+        self._burst_id = self._new_burst_id()
+        self.interval = self.interval if interval is None else interval
+        self._next_shot = 0.0
+        return True
+
+    def _new_burst_id(self):
+        # 精确到毫秒；同一毫秒内再次拍摄时加序号，保证不覆盖之前的文件
+        now = time.time()
+        burst_id = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"-{int(now * 1000) % 1000:03d}"
+        if burst_id == self._last_burst_id:
+            self._repeat += 1
+            return f"{burst_id}-{self._repeat}"
+        self._last_burst_id, self._repeat = burst_id, 0
+        return burst_id
+
+    def offer(self, frame):
+        """每帧在界面线程调用；有待拍请求且到了间隔时复制该帧入队"""
+        if self._burst_left <= 0:
+            return
+        now = time.monotonic()
+        if now < self._next_shot:
+            return
+        self._next_shot = now + self.interval
+        index = self._burst_total - self._burst_left + 1
+        self._burst_left -= 1
+        ext, params = encode_params(self.format, self.quality)
+        if self._burst_total == 1:
+            name = f"capture_{self._burst_id}{ext}"
+        else:
+            name = f"capture_{self._burst_id}_{index:02d}{ext}"
+        with self._unsaved_lock:
+            try:
+                self._queue.put_nowait((os.path.join(self.directory, name), frame.copy(), ext, params,
+                                        index, self._burst_total))
+                self._unsaved += 1
+            except queue.Full:
+                self.stats["dropped"] += 1
+
+    def _worker(self):
+        # close() 只设置停止标志：队列满、磁盘卡住时也不会阻塞调用方；写完队列里剩下的截图再退出
+        while True:
+            try:
+                item = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._closing.is_set():
+                    return
+                continue
+            path, frame, ext, params, index, total = item
+            self._save(path, frame, ext, params, index, total)
+            with self._unsaved_lock:
+                self._unsaved -= 1
+
+    def _save(self, path, frame, ext, params, index, total):
+        start = time.perf_counter()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            ok, data = cv2.imencode(ext, frame, params)
+            if not ok:
+                raise ValueError(f"无法编码为 {ext}")
+            # 用 tofile 写入，支持中文路径
+            data.tofile(path)
+        except Exception as e:
+            self.stats["failed"] += 1
+            if self.on_saved is not None:
+                self.on_saved(path, f"保存失败: {e}")
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        self.stats["saved"] += 1
+        self.stats["encode_ms"] += elapsed
+        if self.on_saved is not None:
+            message = f"{elapsed:.0f}ms" if total == 1 else f"{index}/{total}，{elapsed:.0f}ms"
+            self.on_saved(path, message)
+
+    def close(self, timeout=None):
+        """停止接收新的拍摄，等待已入队的截图全部写完；超时仍未写完时返回未保存的张数"""
+        self._burst_left = 0
+        self._closing.set()
+        self._thread.join(timeout)
+        unsaved = self._unsaved
+        if unsaved:
+            print(f"截图尚未写完，{unsaved} 张未保存")
+        return unsaved
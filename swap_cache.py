@@ -0,0 +1,124 @@
+import cv2
+import numpy as np
+
+import face_ops
+
+# 对齐后人脸缩成 32x32 灰度图做比较，平均像素差低于阈值（0~255）就复用上次的换脸结果
+DEFAULT_THRESHOLD = 3.0
+# 连续复用的最大帧数，超过后强制重新推理
+DEFAULT_MAX_AGE = 8
+SIGNATURE_SIZE = 32
+
+
+class _CacheEntry:
+    __slots__ = ("signature", "bgr_fake", "source_key", "age")
+
+    def __init__(self, signature, bgr_fake, source_key):
+        self.signature = signature
+        self.bgr_fake = bgr_fake
+        self.source_key = source_key
+        self.age = 0
+
+
+class CachedSwapper:
+    """按轨迹缓存换脸结果：人基本不动时不再跑 inswapper，直接用新的仿射矩阵把缓存的128人脸贴回
+
+    比较的是"上次真正推理时"的对齐输入，所以缓慢的累积变化也会在超过阈值时触发重新推理。
+    """
+
+    def __init__(self, swapper, threshold=DEFAULT_THRESHOLD, max_age=DEFAULT_MAX_AGE, enabled=True):
+        self.swapper = swapper
+        self.threshold = threshold
+        self.max_age = max_age
+        self.enabled = enabled
+        self.crop_size = swapper.input_size[0]
+        self._entries = {}
+        self.stats = {"hits": 0, "misses": 0, "deferred": 0}
+
+    @property
+    def hit_rate(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def _signature(self, aimg):
+        gray = cv2.cvtColor(aimg, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    def _infer(self, swapper, aimg, latent):
+        if hasattr(swapper, "client"):
+            # 推理服务客户端
+            return swapper.client.swap(aimg[None], latent)[0]
+        return face_ops.run_swapper(swapper, face_ops.swapper_blob(swapper, aimg), latent)
+
+    def _process(self, img, kps, source, track_key, reuse, width, height, swapper):
+        """单张人脸：对齐、比较缓存、必要时推理，并把结果逆变换回原图坐标
+
+        不修改缓存和统计，返回 (状态, 逆变换结果, 新缓存条目)，状态为 "deferred" / "hit" / "miss"。
+        可以在工作线程里执行，由调用线程统一更新缓存并按顺序贴回。
+        """
+        entry = self._entries.get(track_key)
+        source_key = id(source)
+        if reuse and entry is not None and entry.source_key == source_key:
+            M = face_ops.estimate_norm(kps, self.crop_size)
+            return "deferred", face_ops.warp_back(entry.bgr_fake, M, width, height), None
+
+        aimg, M = face_ops.align_crop(img, kps, self.crop_size)
+        signature = self._signature(aimg)
+        if (self.enabled and entry is not None and entry.source_key == source_key
+                and entry.age < self.max_age
+                and float(np.abs(signature - entry.signature).mean()) < self.threshold):
+            return "hit", face_ops.warp_back(entry.bgr_fake, M, width, height), None
+
+        latent = source.latent
+        if latent is None:
+            latent = face_ops.source_latent(self.swapper, source.normed_embedding)
+        bgr_fake = self._infer(swapper, aimg, latent)
+        new_entry = _CacheEntry(signature, bgr_fake, source_key)
+        return "miss", face_ops.warp_back(bgr_fake, M, width, height), new_entry
+
+    def swap_many(self, img, output, jobs, blend=1.0, executor=None, reuse=()):
+        """jobs: [(track_key, kps, source)]，从 img 裁剪换脸后按 jobs 顺序贴到 output 上（原地修改）
+
+        executor 为 SwapExecutor 时多张人脸并行推理（推理服务客户端不要传 executor），贴回仍在调用线程按顺序进行，结果与逐张调用 swap 相同。
+        reuse 中的轨迹直接贴回最近一次结果，不比较也不推理（没有可用结果时照常处理）。返回每张人脸的状态。
+        """
+        height, width = img.shape[:2]
+        tasks = [(img, kps, source, key, key in reuse, width, height) for key, kps, source in jobs]
+        if executor is not None and len(tasks) > 1:
+            results = executor.map(self._process, tasks)
+        else:
+            results = [self._process(*task, self.swapper) for task in tasks]
+
+        statuses = []
+        for (key, _, _), (status, warped, new_entry) in zip(jobs, results):
+            if status == "miss":
+                self._entries[key] = new_entry
+                self.stats["misses"] += 1
+            else:
+                if status == "hit":
+                    self._entries[key].age += 1
+                self.stats["hits" if status == "hit" else "deferred"] += 1
+            face_ops.composite(output, warped, blend)
+            statuses.append(status)
+        return statuses
+
+    def swap(self, img, output, kps, source, track_key=0, blend=1.0):
+        """从 img 对齐裁剪目标人脸，换成 source（人脸库条目）后贴到 output 上（原地修改）"""
+        self.swap_many(img, output, [(track_key, kps, source)], blend)
+        return output
+
+    def paste_cached(self, output, kps, source, track_key=0, blend=1.0):
+        """不做任何比较和推理，直接把该轨迹最近一次的换脸结果按新关键点贴回；没有可用结果时返回 False"""
+        entry = self._entries.get(track_key)
+        if entry is None or entry.source_key != id(source):
+            return False
+        M = face_ops.estimate_norm(kps, self.crop_size)
+        face_ops.paste_back(output, entry.bgr_fake, M, blend)
+        self.stats["deferred"] += 1
+        return True
+
+    def forget(self, track_key):
+        self._entries.pop(track_key, None)
+
+    def clear(self):
+        self._entries.clear()
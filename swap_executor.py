@@ -0,0 +1,96 @@
+import copy
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import runtime_profile
+
+SESSION_MODES = ("shared", "per_worker")
+
+
+def default_workers():
+    return max(1, min(4, (os.cpu_count() or 2) // 2))
+
+
+class SwapExecutor:
+    """多张人脸的 inswapper 推理和贴回准备（逆变换）放到线程池里并行，onnxruntime 推理期间会释放GIL
+
+    两种模式下线程池使用的会话 intra_op_num_threads 都取 CPU核数/线程数，避免多个线程各自占满所有核：
+    sessions="shared"：所有线程共用一个池会话（InferenceSession.run 可以并发调用），比主会话多占一份模型内存；
+    主会话保持原来的线程数，单人脸时仍用满所有核。
+    sessions="per_worker"：每个线程各用一个会话，每个会话都会单独占用一份模型内存。
+    会话应在加载线程里用 prepare() 提前创建并预热，否则第一次多人脸时才创建，那一帧会明显卡顿。
+    只处理本地模型；推理服务由服务端合批，不需要也不能在多个线程里共用同一个连接。
+    """
+
+    def __init__(self, swapper, profile, workers=0, sessions="shared"):
+        if sessions not in SESSION_MODES:
+            raise ValueError(f"未知的会话模式: {sessions}")
+        self.swapper = swapper
+        self.profile = profile
+        self.workers = workers or default_workers()
+        self.sessions = sessions
+        self._local = threading.local()
+        # prepare() 提前建好的会话，线程第一次使用时各取一个
+        self._prepared = queue.Queue()
+        # shared 模式下所有线程共用的池会话
+        self._shared = None
+        self._shared_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="swap")
+
+    def worker_profile(self):
+        """每个线程会话的配置：线程数按线程池大小平分 CPU 核
+
+        models 中该模型自己的 session 设置会覆盖全局设置，所以两处都要改。
+        """
+        profile = copy.deepcopy(self.profile)
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        profile["session"]["intra_op_num_threads"] = threads
+        key = runtime_profile.model_key(self.swapper.model_file)
+        model = profile.setdefault("models", {}).setdefault(key, {})
+        model.setdefault("session", {})["intra_op_num_threads"] = threads
+        return profile
+
+    def _load_swapper(self, warm_up_runs=0):
+        swapper = runtime_profile.load_model(self.swapper.model_file, self.worker_profile())
+        for _ in range(warm_up_runs):
+            swapper.session.run(None, runtime_profile.dummy_feed(swapper.session))
+        return swapper
+
+    def _shared_swapper(self, warm_up_runs=0):
+        with self._shared_lock:
+            if self._shared is None:
+                self._shared = self._load_swapper(warm_up_runs)
+            return self._shared
+
+    def prepare(self, warm_up_runs=2):
+        """创建并预热线程池使用的会话（在模型加载线程里调用）"""
+        if self.sessions == "shared":
+            self._shared_swapper(warm_up_runs)
+            return
+        for _ in range(self.workers - self._prepared.qsize()):
+            self._prepared.put(self._load_swapper(warm_up_runs))
+
+    def _worker_swapper(self):
+        if self.sessions == "shared":
+            return self._shared_swapper()
+        swapper = getattr(self._local, "swapper", None)
+        if swapper is None:
+            try:
+                swapper = self._prepared.get_nowait()
+            except queue.Empty:
+                swapper = self._load_swapper()
+            self._local.swapper = swapper
+        return swapper
+
+    def _call(self, fn, args):
+        return fn(*args, self._worker_swapper())
+
+    def map(self, fn, tasks):
+        """在线程池里执行 fn(*task, 该线程的swapper)，按 tasks 的顺序返回结果"""
+        futures = [self._pool.submit(self._call, fn, task) for task in tasks]
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
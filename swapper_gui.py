@@ -7,89 +7,171 @@ import random
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QLabel, QPushButton, QFileDialog, QGridLayout, QScrollArea,
                             QStatusBar, QSlider, QMenu, QAction, QMessageBox, QInputDialog,
-                            QComboBox, QCheckBox, QTabWidget, QListWidget, QListWidgetItem)
-from PyQt5.QtCore import Qt, QTimer, pyqtSlot, QSize
-from PyQt5.QtGui import QImage, QPixmap, QIcon, QColor
-from insightface.app import FaceAnalysis
-from insightface.model_zoo import get_model
-import pyaudio
-import wave
-import threading
-import scipy.signal as signal
+                            QComboBox, QCheckBox, QTabWidget, QListWidget, QListWidgetItem, QShortcut,
+                            QSpinBox)
+from PyQt5.QtCore import Qt, QTimer, pyqtSlot, pyqtSignal, QSize
+from PyQt5.QtGui import QImage, QPixmap, QIcon, QColor, QKeySequence
+
+import runtime_profile
+import effects
+from model_loader import ModelLoader
+from voice_changer import VOICE_EFFECTS, LATENCY_BUDGET_MS
+from av_recorder import AVRecorder
+from session_recorder import SessionRecorder, make_record
+from replay_buffer import ReplayBuffer
+from snapshot import SnapshotWriter, SNAPSHOT_FORMATS
+from frame_sources import open_source
+from encoders import ENCODER_CHOICES
+from face_index import DUPLICATE_THRESHOLD, auto_source, duplicate_groups, normalize
+from face_library import FaceLibrary, DEFAULT_CACHE_MB
+from swap_cache import CachedSwapper
+from presence_scheduler import PresenceScheduler
+from frame_budget import FrameBudget
+from roi_detector import RoiDetector
+from swap_executor import SwapExecutor
+from frame_result import FrameFaces, detect_faces, compute_embeddings, compute_landmarks
+from face_tracker import FaceTracker
 
 class FaceSwapperGUI(QMainWindow):
+    # 录制在后台线程收尾，完成后通过信号回到界面线程
+    recording_finished = pyqtSignal(str, str)
+    replay_saved = pyqtSignal(str, str)
+    snapshot_saved = pyqtSignal(str, str)
+    
     def __init__(self):
         super().__init__()
         self.setWindowTitle("实时换脸")
         self.setMinimumSize(1000, 600)
         
-        # 初始化模型
-        self.app = FaceAnalysis(name="buffalo_l", providers=["CPUExecutionProvider"])
-        self.app.prepare(ctx_id=0, det_size=(320, 320))
-        self.swapper = get_model("./models/inswapper_128.onnx", 
-                                download=False, 
-                                providers=["CPUExecutionProvider"])
+        # 模型在后台线程加载（执行器、线程数、图优化等由 runtime_profile.json 决定）
+        self.profile = runtime_profile.load_profile(default_providers=["CPUExecutionProvider"])
+        self.app = None
+        self.swapper = None
+        self.cached_swapper = None
+        self.roi_detector = None
+        self.swap_executor = None
+        # 画面中没人时降低检测频率和分辨率
+        self.presence = PresenceScheduler(**self.profile.get("presence", {}))
+        # 多人脸时每帧换脸的时间预算
+        self.frame_budget = FrameBudget(**self.profile.get("frame_budget", {}))
         
         # 存储人脸数据
-        self.face_images = []
-        self.face_features = []
-        self.face_names = []
+        # 人脸库只保留路径、特征、latent 和缩略图，原图按需解码并放在有上限的LRU缓存里
+        cache_mb = float(os.environ.get("SWAPPER_IMAGE_CACHE_MB") or self.profile.get("image_cache_mb", DEFAULT_CACHE_MB))
+        self.library = FaceLibrary(cache_mb=cache_mb)
         self.selected_face_idx = -1
         self.current_source_face = None
         
         # 多人脸映射
         self.multi_face_enabled = False
-        self.face_mapping = {}  # 目标脸索引 -> 源脸索引
+        self.face_mapping = {}  # 目标人脸轨迹ID -> 源脸索引
+        self.face_tracker = FaceTracker()
+        self.current_track_ids = []
+        self.current_faces = FrameFaces.empty()
+        # 自动映射：每条轨迹识别一次身份，再换成该身份配置的源人脸（未配置时用当前选中的人脸）
+        self.auto_mapping_enabled = False
+        self.identity_sources = {}  # 人脸库身份索引 -> 源脸索引
         
         # 艺术滤镜
         self.current_filter = "无"
-        self.available_filters = {
-            "无": lambda img: img,
-            "复古": self.apply_sepia,
-            "素描": self.apply_sketch,
-            "卡通": self.apply_cartoon,
-            "边缘检测": self.apply_edge_detection,
-            "浮雕": self.apply_emboss,
-            "霓虹": self.apply_neon,
-            "像素化": self.apply_pixelate
-        }
+        self.available_filters = effects.FILTERS
         
         # AR贴纸
         self.stickers_enabled = False
-        self.current_stickers = []  # 当前应用的贴纸列表 [(sticker_img, position_type), ...]
-        self.sticker_positions = {
-            "额头": "forehead",
-            "鼻子": "nose",
-            "眼睛": "eyes",
-            "嘴巴": "mouth",
-            "左耳": "left_ear",
-            "右耳": "right_ear"
-        }
-        
-        # 初始化摄像头
+        self.current_stickers = []  # 当前应用的贴纸列表 [(sticker_img, position_type, sticker_path), ...]
+        self.sticker_positions = effects.STICKER_POSITIONS
+        
+        # 画面来源：默认摄像头，也可以打开视频文件、图片序列或网络流（见 frame_sources.py）
         self.cap = None
+        self.source_spec = None
+        self.full_speed = False
+        self.processed_frames = 0
+        self.processing_start = 0.0
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_frame)
         
         # 视频录制参数
         self.is_recording = False
-        self.video_writer = None
+        self.recording_raw = False
+        self.recorder = None
         self.output_video_path = ""
+        self.recording_finished.connect(self.on_recording_finished)
+        
+        # 共享内存帧输出，首帧到来时按画面大小创建
+        self.shm_enabled = False
+        self.shm_publisher = None
+        
+        # 网页预览服务
+        self.preview_server = None
+        
+        # 即时回放：常开的最近N秒画面缓冲（JPEG压缩），按F9在后台保存
+        self.replay_buffer = ReplayBuffer(**self.profile.get("replay_buffer", {}))
+        self.replay_saved.connect(self.on_replay_saved)
+        
+        # 截图/连拍：编码和写文件在后台线程，保存结果通过信号回到界面线程显示
+        snapshot_settings = self.profile.get("snapshot", {})
+        self.snapshots = SnapshotWriter("captures", interval=snapshot_settings.get("interval", 0.2))
+        self.snapshots.on_saved = self.snapshot_saved.emit
+        self.snapshot_saved.connect(self.on_snapshot_saved)
         
         # 人脸交换参数
         self.blend_ratio = 1.0  # 1.0表示完全替换
         
+        # 实时变声（音频在PortAudio回调线程里处理，界面只定时读取统计）
+        self.voice_changer = None
+        self.voice_stats_timer = QTimer()
+        self.voice_stats_timer.timeout.connect(self.update_voice_stats)
+        
         # 设置界面
         self.setup_ui()
         
         # 初始化状态栏
         self.statusBar = QStatusBar()
         self.setStatusBar(self.statusBar)
-        self.statusBar.showMessage("准备就绪")
+        self.statusBar.showMessage("正在加载模型...")
         
-        # 加载默认人脸和贴纸
-        self.load_default_faces()
+        # 贴纸不依赖模型，直接加载
         self.load_default_stickers()
+        
+        # 只加载用得到的模型：检测+识别；性别年龄和3D关键点不加载，106点关键点在启用贴纸时再加载
+        self.load_button.setEnabled(False)
+        # 配置了推理服务（环境变量 SWAPPER_INFERENCE_SERVICE 或配置文件 inference_service）时共用服务端模型
+        service_address = os.environ.get("SWAPPER_INFERENCE_SERVICE") or self.profile.get("inference_service")
+        self.model_loader = ModelLoader(self.profile, "./models/inswapper_128.onnx", (320, 320),
+                                        allowed_modules=["detection", "recognition"],
+                                        service_address=service_address, parent=self)
+        # 多人脸并行换脸的线程池在加载线程里创建，线程池会话随模型一起预热
+        self.model_loader.warm_up_hook = self._prepare_swap_executor
+        self.model_loader.progress.connect(self.statusBar.showMessage)
+        self.model_loader.loaded.connect(self.on_models_loaded)
+        self.model_loader.failed.connect(self.on_models_failed)
+        self.model_loader.start()
+    
+    def _prepare_swap_executor(self, app, swapper):
+        # 在加载线程中执行；推理服务不经过这里（由服务端合批，不使用线程池）
+        executor_settings = dict(self.profile.get("swap_executor", {}))
+        if executor_settings.pop("enabled", True):
+            executor = SwapExecutor(swapper, self.profile, **executor_settings)
+            executor.prepare()
+            self.swap_executor = executor
+    
+    def on_models_loaded(self, app, swapper):
+        self.app = app
+        self.swapper = swapper
+        self.library.swapper = swapper
+        # 配置项 swap_cache 的 enabled / threshold / max_age 直接对应 CachedSwapper 的参数
+        self.cached_swapper = CachedSwapper(swapper, **self.profile.get("swap_cache", {}))
+        # 已知人脸附近的区域检测，配置项 roi_detection 对应 RoiDetector 的参数
+        self.roi_detector = RoiDetector(app, **self.profile.get("roi_detection", {}))
+        self.load_button.setEnabled(True)
+        
+        # 模型就绪后再分析人脸库
+        self.load_default_faces()
+        self.statusBar.showMessage(f"准备就绪 - 已加载 {len(self.library)} 个人脸")
+    
+    def on_models_failed(self, message):
+        self.statusBar.showMessage("模型加载失败")
+        QMessageBox.critical(self, "错误", f"模型加载失败: {message}")
 
     def setup_ui(self):
         # 主布局
@@ -131,6 +213,11 @@ class FaceSwapperGUI(QMainWindow):
         buttons_layout.addWidget(self.load_button)
         buttons_layout.addWidget(self.delete_button)
         buttons_layout.addWidget(self.rename_button)
+        
+        self.dedupe_button = QPushButton("查重")
+        self.dedupe_button.setToolTip("查找并合并人脸库中同一个人的重复照片")
+        self.dedupe_button.clicked.connect(self.dedupe_library)
+        buttons_layout.addWidget(self.dedupe_button)
         face_layout.addLayout(buttons_layout)
         
         # 贴纸选项卡
@@ -187,6 +274,13 @@ class FaceSwapperGUI(QMainWindow):
         self.multi_face_checkbox.stateChanged.connect(self.toggle_multi_face_mode)
         multi_face_layout.addWidget(self.multi_face_checkbox)
         
+        # 自动映射
+        self.auto_mapping_checkbox = QCheckBox("自动识别")
+        self.auto_mapping_checkbox.setToolTip("按人脸库识别画面中的每个人，自动换成其配置的源人脸（右键人脸库缩略图配置）")
+        self.auto_mapping_checkbox.stateChanged.connect(self.toggle_auto_mapping)
+        self.auto_mapping_checkbox.setEnabled(False)
+        multi_face_layout.addWidget(self.auto_mapping_checkbox)
+        
         # 清除映射按钮
         self.clear_mapping_button = QPushButton("清除映射")
         self.clear_mapping_button.setToolTip("清除所有人脸映射关系")
@@ -218,6 +312,70 @@ class FaceSwapperGUI(QMainWindow):
         filter_layout.addWidget(self.filter_combo)
         right_layout.addLayout(filter_layout)
         
+        # 变声选择
+        voice_layout = QHBoxLayout()
+        voice_layout.addWidget(QLabel("实时变声:"))
+        self.voice_combo = QComboBox()
+        self.voice_combo.addItem("关闭")
+        for effect_name in VOICE_EFFECTS.keys():
+            self.voice_combo.addItem(effect_name)
+        self.voice_combo.setToolTip("选择麦克风实时变声效果")
+        self.voice_combo.currentTextChanged.connect(self.change_voice_effect)
+        voice_layout.addWidget(self.voice_combo)
+        self.voice_status_label = QLabel("")
+        voice_layout.addWidget(self.voice_status_label)
+        right_layout.addLayout(voice_layout)
+        
+        # 录制编码器选择
+        encoder_layout = QHBoxLayout()
+        encoder_layout.addWidget(QLabel("录制编码:"))
+        self.encoder_combo = QComboBox()
+        for encoder_name in ENCODER_CHOICES.keys():
+            self.encoder_combo.addItem(encoder_name)
+        self.encoder_combo.setToolTip("自动：优先使用可用的硬件编码器，没有ffmpeg时使用OpenCV")
+        encoder_layout.addWidget(self.encoder_combo)
+        
+        # 原始素材录制：保存未处理画面和每帧元数据，之后用 render_session.py 高质量重渲染
+        self.raw_record_checkbox = QCheckBox("原始素材")
+        self.raw_record_checkbox.setToolTip("录制未处理的摄像头画面和检测/映射/效果参数，可用 render_session.py 离线高质量重渲染")
+        encoder_layout.addWidget(self.raw_record_checkbox)
+        
+        # 共享内存输出
+        self.shm_checkbox = QCheckBox("共享内存输出")
+        self.shm_checkbox.setToolTip("把处理后的画面发布到共享内存，供OBS等本机程序零拷贝读取")
+        self.shm_checkbox.stateChanged.connect(self.toggle_shared_output)
+        encoder_layout.addWidget(self.shm_checkbox)
+        
+        # 网页预览（MJPEG / WebSocket，仅本机）
+        self.preview_server_checkbox = QCheckBox("网页预览")
+        self.preview_server_checkbox.setToolTip("在本机启动MJPEG/WebSocket预览服务，用浏览器查看处理后的画面")
+        self.preview_server_checkbox.stateChanged.connect(self.toggle_preview_server)
+        encoder_layout.addWidget(self.preview_server_checkbox)
+        right_layout.addLayout(encoder_layout)
+        
+        # 截图格式、质量和连拍张数
+        snapshot_settings = self.profile.get("snapshot", {})
+        snapshot_layout = QHBoxLayout()
+        snapshot_layout.addWidget(QLabel("截图格式:"))
+        self.snapshot_format_combo = QComboBox()
+        for format_name in SNAPSHOT_FORMATS.keys():
+            self.snapshot_format_combo.addItem(format_name)
+        self.snapshot_format_combo.setCurrentText(snapshot_settings.get("format", "JPEG"))
+        snapshot_layout.addWidget(self.snapshot_format_combo)
+        snapshot_layout.addWidget(QLabel("质量:"))
+        self.snapshot_quality_spin = QSpinBox()
+        self.snapshot_quality_spin.setRange(1, 100)
+        self.snapshot_quality_spin.setValue(int(snapshot_settings.get("quality", 95)))
+        self.snapshot_quality_spin.setToolTip("JPEG/WebP 为画质；PNG 为无损，数值越高压缩越快、文件越大")
+        snapshot_layout.addWidget(self.snapshot_quality_spin)
+        snapshot_layout.addWidget(QLabel("连拍:"))
+        self.snapshot_burst_spin = QSpinBox()
+        self.snapshot_burst_spin.setRange(1, 30)
+        self.snapshot_burst_spin.setValue(1)
+        self.snapshot_burst_spin.setSuffix(" 张")
+        snapshot_layout.addWidget(self.snapshot_burst_spin)
+        right_layout.addLayout(snapshot_layout)
+        
         # 操作按钮
         control_layout = QHBoxLayout()
         
@@ -236,9 +394,29 @@ class FaceSwapperGUI(QMainWindow):
         self.record_button.clicked.connect(self.toggle_recording)
         self.record_button.setEnabled(False)
         
+        self.replay_button = QPushButton("保存回放")
+        self.replay_button.setToolTip("把最近几秒的画面保存为视频（F9）")
+        self.replay_button.clicked.connect(self.save_replay)
+        self.replay_button.setEnabled(False)
+        QShortcut(QKeySequence("F9"), self, self.save_replay)
+        
+        # 画面来源：摄像头 / 视频文件 / 图片序列 / 网络流
+        self.source_button = QPushButton("来源: 摄像头")
+        self.source_button.setToolTip("选择画面来源（视频文件和图片序列可用 Ctrl+←/→ 跳转5秒）")
+        self.source_button.clicked.connect(self.show_source_menu)
+        self.full_speed_checkbox = QCheckBox("全速")
+        self.full_speed_checkbox.setToolTip("视频文件和图片序列不按帧率播放，处理完一帧立即处理下一帧（用于测试和性能评测）")
+        self.full_speed_checkbox.stateChanged.connect(self.toggle_full_speed)
+        # 文件来源可用 Ctrl+左右方向键前后跳转5秒
+        QShortcut(QKeySequence("Ctrl+Left"), self, lambda: self.seek_source(-5))
+        QShortcut(QKeySequence("Ctrl+Right"), self, lambda: self.seek_source(5))
+        
+        control_layout.addWidget(self.source_button)
+        control_layout.addWidget(self.full_speed_checkbox)
         control_layout.addWidget(self.start_button)
         control_layout.addWidget(self.capture_button)
         control_layout.addWidget(self.record_button)
+        control_layout.addWidget(self.replay_button)
         
         right_layout.addLayout(control_layout)
         
@@ -334,6 +512,8 @@ class FaceSwapperGUI(QMainWindow):
     def toggle_multi_face_mode(self, state):
         self.multi_face_enabled = (state == Qt.Checked)
         self.clear_mapping_button.setEnabled(self.multi_face_enabled)
+        self.auto_mapping_checkbox.setEnabled(self.multi_face_enabled)
+        self.reset_tracks()
         
         if self.multi_face_enabled:
             self.statusBar.showMessage("已启用多人脸模式 - 点击预览窗口上的人脸进行映射")
@@ -347,12 +527,53 @@ class FaceSwapperGUI(QMainWindow):
             # 清除映射
             self.face_mapping = {}
     
+    def toggle_auto_mapping(self, state):
+        self.auto_mapping_enabled = (state == Qt.Checked)
+        # 保留轨迹和手动映射，只让画面中已有的人重新识别一次
+        for track in self.face_tracker.tracks.values():
+            track.identified = False
+        if self.auto_mapping_enabled:
+            self.statusBar.showMessage("已启用自动识别 - 右键人脸库缩略图可配置识别到此人时使用的源人脸")
+        else:
+            self.statusBar.showMessage("已关闭自动识别")
+    
+    def forget_tracks(self, track_ids):
+        """轨迹消失后清理它的映射、换脸缓存和耗时统计；返回其中有映射的轨迹数"""
+        mapped = 0
+        for track_id in track_ids:
+            mapped += self.face_mapping.pop(track_id, None) is not None
+            if self.cached_swapper is not None:
+                self.cached_swapper.forget(track_id)
+            self.frame_budget.forget(track_id)
+        return mapped
+    
+    def reset_tracks(self):
+        """重新开始跟踪：旧轨迹按正常消失处理，返回因此失效的映射数"""
+        self.current_track_ids = []
+        return self.forget_tracks(self.face_tracker.reset())
+    
     def clear_face_mapping(self):
         self.face_mapping = {}
+        for track in self.face_tracker.tracks.values():
+            track.identified = False
         self.statusBar.showMessage("已清除所有人脸映射")
     
+    def auto_assign_track(self, track_id, face):
+        track = self.face_tracker.tracks[track_id]
+        if track.identified:
+            return
+        track.identified = True
+        identity, score, source_idx = auto_source(self.library.index, face.normed_embedding,
+                                                  self.identity_sources, self.selected_face_idx)
+        track.identity, track.identity_score = identity, score
+        # 手动映射优先
+        if source_idx >= 0 and track_id not in self.face_mapping:
+            self.face_mapping[track_id] = source_idx
+            print(f"自动映射: 轨迹 {track_id} 识别为 '{self.library[identity].name}' ({score:.2f})"
+                  f" → 源人脸 '{self.library[source_idx].name}'")
+    
     def on_preview_click(self, event):
-        if not hasattr(self, 'current_frame') or not hasattr(self, 'current_faces'):
+        if not hasattr(self, 'current_frame'):
             return
             
         # 获取点击位置
@@ -377,24 +598,22 @@ class FaceSwapperGUI(QMainWindow):
         click_y = (event.y() - offset_y) / scale
         
         # 检查点击是否在某个人脸框内
-        for i, face in enumerate(self.current_faces):
-            box = face.bbox.astype(int)
-            if (box[0] <= click_x <= box[2]) and (box[1] <= click_y <= box[3]):
-                # 找到点击的人脸，弹出菜单选择源人脸
-                self.show_face_mapping_menu(i, event.globalPos())
-                break
+        i = self.current_faces.hit_test(click_x, click_y)
+        if 0 <= i < len(self.current_track_ids):
+            # 找到点击的人脸，弹出菜单选择源人脸
+            self.show_face_mapping_menu(self.current_track_ids[i], event.globalPos())
     
     def show_face_mapping_menu(self, target_face_idx, position):
-        if len(self.face_names) == 0:
+        if len(self.library) == 0:
             QMessageBox.warning(self, "警告", "请先添加源人脸图片")
             return
             
         # 创建菜单
         menu = QMenu(self)
-        menu.setTitle(f"为目标人脸 {target_face_idx+1} 选择源人脸")
+        menu.setTitle(f"为目标人脸 ID {target_face_idx} 选择源人脸")
         
         # 添加源人脸选项
-        for i, name in enumerate(self.face_names):
+        for i, name in enumerate(self.library.names):
             action = QAction(f"{i+1}. {name}", self)
             action.triggered.connect(lambda checked, s=i, t=target_face_idx: self.map_faces(t, s))
             menu.addAction(action)
@@ -412,13 +631,13 @@ class FaceSwapperGUI(QMainWindow):
     def map_faces(self, target_idx, source_idx):
         # 创建映射
         self.face_mapping[target_idx] = source_idx
-        source_name = self.face_names[source_idx]
-        self.statusBar.showMessage(f"已映射: 目标人脸 {target_idx+1} → 源人脸 '{source_name}'")
+        source_name = self.library[source_idx].name
+        self.statusBar.showMessage(f"已映射: 目标人脸 ID {target_idx} → 源人脸 '{source_name}'")
     
     def remove_face_mapping(self, target_idx):
         if target_idx in self.face_mapping:
             del self.face_mapping[target_idx]
-            self.statusBar.showMessage(f"已删除目标人脸 {target_idx+1} 的映射")
+            self.statusBar.showMessage(f"已删除目标人脸 ID {target_idx} 的映射")
     
     def update_blend_ratio(self, value):
         self.blend_ratio = value / 100.0
@@ -441,22 +660,23 @@ class FaceSwapperGUI(QMainWindow):
         print(f"faces文件夹中的文件: {files}")
         
         if files:
-            for filename in files:
-                if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    filepath = os.path.join(default_dir, filename)
-                    print(f"尝试加载人脸图片: {filepath}")
-                    # 使用文件名作为默认名称（不带扩展名）
-                    name = os.path.splitext(filename)[0]
-                    self.add_face_to_library(filepath, name)
+            # 使用文件名作为默认名称（不带扩展名）；重复的照片合并，不重复存储
+            image_files = [f for f in files if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+            self.import_faces([os.path.join(default_dir, f) for f in image_files],
+                              [os.path.splitext(f)[0] for f in image_files], ask_duplicates=False)
         else:
             print("faces文件夹为空")
             
         # 如果没有默认人脸，加载source_face.jpg
-        if len(self.face_images) == 0 and os.path.exists("source_face.jpg"):
+        if len(self.library) == 0 and os.path.exists("source_face.jpg"):
             print("尝试加载默认人脸: source_face.jpg")
             self.add_face_to_library("source_face.jpg", "默认人脸")
     
     def add_face_to_library(self, image_path, name=None):
+        self.import_faces([image_path], [name])
+    
+    def analyze_face_image(self, image_path):
+        """读取图片并检测人脸，返回 (图片, 第一个人脸)，失败时返回 None"""
         try:
             # 处理中文路径问题
             if os.path.exists(image_path):
@@ -465,11 +685,11 @@ class FaceSwapperGUI(QMainWindow):
                 img = cv2.imdecode(img, cv2.IMREAD_COLOR)
             else:
                 print(f"文件不存在: {image_path}")
-                return
+                return None
                 
             if img is None:
                 print(f"无法读取图片: {image_path}")
-                return
+                return None
                 
             print(f"成功读取图片: {image_path}, 尺寸: {img.shape}")
             
@@ -477,26 +697,12 @@ class FaceSwapperGUI(QMainWindow):
             if not faces:
                 print(f"未检测到人脸: {image_path}")
                 QMessageBox.warning(self, "警告", f"图片中未检测到人脸: {os.path.basename(image_path)}")
-                return
+                return None
                 
             print(f"检测到人脸数量: {len(faces)}")
             
             # 获取第一个人脸
-            face_feature = faces[0]
-            
-            # 如果没有提供名称，使用文件名（不带扩展名）
-            if name is None:
-                name = os.path.splitext(os.path.basename(image_path))[0]
-                
-            # 存储图片和特征
-            self.face_images.append(img)
-            self.face_features.append(face_feature)
-            self.face_names.append(name)
-            
-            # 更新界面
-            self.update_face_grid()
-            self.statusBar.showMessage(f"成功添加人脸: {name}")
-            print(f"成功添加人脸: {image_path}")
+            return img, faces[0]
             
         except Exception as e:
             print(f"添加人脸失败: {image_path}")
@@ -504,6 +710,75 @@ class FaceSwapperGUI(QMainWindow):
             import traceback
             traceback.print_exc()
             QMessageBox.critical(self, "错误", f"添加人脸失败: {str(e)}")
+            return None
+    
+    def find_import_duplicates(self, embeddings):
+        """一次矩阵查询找出与人脸库或本批中更早图片重复的新图片，返回 {下标: 重复对象说明}"""
+        duplicates = {}
+        scores, indices = self.library.index.search(embeddings, k=1)
+        for j in np.flatnonzero(scores[:, 0] >= DUPLICATE_THRESHOLD):
+            duplicates[int(j)] = f"人脸库中的 '{self.library[indices[j, 0]].name}' ({scores[j, 0]:.2f})"
+        # 同一批里互相重复的，只保留第一张
+        normed = normalize(embeddings)
+        batch_scores = np.triu(normed @ normed.T, k=1)
+        for j in range(len(embeddings)):
+            if j in duplicates:
+                continue
+            earlier = batch_scores[:j, j]
+            if len(earlier) and earlier.max() >= DUPLICATE_THRESHOLD:
+                duplicates[j] = f"同批导入的第 {int(earlier.argmax()) + 1} 张 ({earlier.max():.2f})"
+        return duplicates
+    
+    def import_faces(self, image_paths, names=None, ask_duplicates=True):
+        """批量导入：先全部分析，再统一查重，最后一次性刷新人脸网格
+
+        ask_duplicates 为 False 时（启动时加载 faces 目录）重复的图片直接合并到已有人脸，不再存储。
+        """
+        names = names or [None] * len(image_paths)
+        analyzed = []
+        for image_path, name in zip(image_paths, names):
+            result = self.analyze_face_image(image_path)
+            if result is None:
+                continue
+            img, face = result
+            # 如果没有提供名称，使用文件名（不带扩展名）
+            if name is None:
+                name = os.path.splitext(os.path.basename(image_path))[0]
+            analyzed.append((image_path, name, img, face))
+        if not analyzed:
+            return
+        
+        duplicates = self.find_import_duplicates(np.stack([face.normed_embedding for _, _, _, face in analyzed]))
+        skip = set()
+        if duplicates:
+            details = "\n".join(f"{analyzed[j][1]} 与 {target} 重复" for j, target in sorted(duplicates.items()))
+            print(f"导入时发现重复人脸:\n{details}")
+            if ask_duplicates:
+                reply = QMessageBox.question(self, "发现重复人脸",
+                                             f"{len(duplicates)} 张图片与已有人脸重复:\n{details}\n\n"
+                                             f"是否跳过这些图片？（选择\"否\"仍然导入）",
+                                             QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+                if reply == QMessageBox.Yes:
+                    skip = set(duplicates)
+            else:
+                skip = set(duplicates)
+        
+        added = []
+        for j, (image_path, name, img, face) in enumerate(analyzed):
+            if j in skip:
+                continue
+            # 只存储特征和缩略图，原图不保留
+            self.library.add(image_path, name, img, face)
+            added.append(name)
+            print(f"成功添加人脸: {image_path}")
+        
+        # 更新界面
+        self.update_face_grid()
+        message = f"成功添加 {len(added)} 个人脸" if len(added) != 1 else f"成功添加人脸: {added[0]}"
+        if skip:
+            message += f"，跳过 {len(skip)} 张重复图片"
+        print(self.library.summary())
+        self.statusBar.showMessage(f"{message}；{self.library.summary()}")
     
     def update_face_grid(self):
         # 清空网格
@@ -513,21 +788,14 @@ class FaceSwapperGUI(QMainWindow):
                 item.widget().deleteLater()
         
         # 重新填充网格
-        for i, img in enumerate(self.face_images):
+        for i, entry in enumerate(self.library):
             # 创建容器小部件
             face_widget = QWidget()
             face_layout = QVBoxLayout(face_widget)
             face_layout.setSpacing(2)
             
-            # 缩放图片
-            h, w = img.shape[:2]
-            aspect = w / h
-            thumb_h = 120
-            thumb_w = int(thumb_h * aspect)
-            thumb = cv2.resize(img, (thumb_w, thumb_h))
-            
-            # 转换为QPixmap
-            rgb_image = cv2.cvtColor(thumb, cv2.COLOR_BGR2RGB)
+            # 转换为QPixmap（缩略图在导入时已生成）
+            rgb_image = cv2.cvtColor(entry.thumbnail, cv2.COLOR_BGR2RGB)
             h, w, ch = rgb_image.shape
             q_img = QImage(rgb_image.data, w, h, w * ch, QImage.Format_RGB888)
             pixmap = QPixmap.fromImage(q_img)
@@ -537,14 +805,14 @@ class FaceSwapperGUI(QMainWindow):
             label.setPixmap(pixmap)
             label.setAlignment(Qt.AlignCenter)
             label.setStyleSheet("padding: 5px; border: 2px solid transparent;")
-            label.mousePressEvent = lambda event, idx=i: self.select_face(idx)
+            label.mousePressEvent = lambda event, idx=i: self.on_face_thumbnail_click(event, idx)
             
             # 如果是选中的人脸，添加高亮边框
             if i == self.selected_face_idx:
                 label.setStyleSheet("padding: 5px; border: 2px solid #4a86e8;")
             
             # 添加名称标签
-            name_label = QLabel(self.face_names[i])
+            name_label = QLabel(entry.name)
             name_label.setAlignment(Qt.AlignCenter)
             name_label.setStyleSheet("font-size: 12px;")
             
@@ -556,9 +824,44 @@ class FaceSwapperGUI(QMainWindow):
             row, col = divmod(i, 2)
             self.faces_grid.addWidget(face_widget, row, col)
     
+    def on_face_thumbnail_click(self, event, idx):
+        if event.button() == Qt.RightButton:
+            self.show_identity_source_menu(idx, event.globalPos())
+        else:
+            self.select_face(idx)
+    
+    def show_identity_source_menu(self, identity_idx, position):
+        # 配置自动识别到此人时换成哪张源人脸
+        menu = QMenu(self)
+        menu.addAction(QAction(f"识别到 '{self.library[identity_idx].name}' 时换成:", self, enabled=False))
+        for i, name in enumerate(self.library.names):
+            action = QAction(f"{i+1}. {name}", self, checkable=True)
+            action.setChecked(self.identity_sources.get(identity_idx) == i)
+            action.triggered.connect(lambda checked, s=i: self.set_identity_source(identity_idx, s))
+            menu.addAction(action)
+        menu.addSeparator()
+        default_action = QAction("使用当前选中的人脸（默认）", self, checkable=True)
+        default_action.setChecked(identity_idx not in self.identity_sources)
+        default_action.triggered.connect(lambda: self.set_identity_source(identity_idx, None))
+        menu.addAction(default_action)
+        menu.exec_(position)
+    
+    def set_identity_source(self, identity_idx, source_idx):
+        if source_idx is None:
+            self.identity_sources.pop(identity_idx, None)
+            self.statusBar.showMessage(f"'{self.library[identity_idx].name}' 将换成当前选中的人脸")
+        else:
+            self.identity_sources[identity_idx] = source_idx
+            self.statusBar.showMessage(f"识别到 '{self.library[identity_idx].name}' 时换成 '{self.library[source_idx].name}'")
+        # 已识别的轨迹按新配置重新识别
+        for track_id, track in self.face_tracker.tracks.items():
+            if track.identity == identity_idx:
+                track.identified = False
+                self.face_mapping.pop(track_id, None)
+    
     def select_face(self, idx):
         self.selected_face_idx = idx
-        self.current_source_face = self.face_features[idx]
+        self.current_source_face = self.library[idx]
         self.update_face_grid()
         
         # 更新按钮状态
@@ -566,13 +869,13 @@ class FaceSwapperGUI(QMainWindow):
         self.delete_button.setEnabled(True)
         self.rename_button.setEnabled(True)
         
-        self.statusBar.showMessage(f"已选择人脸: {self.face_names[idx]}")
+        self.statusBar.showMessage(f"已选择人脸: {self.library[idx].name}")
     
     def delete_selected_face(self):
         if self.selected_face_idx == -1:
             return
             
-        name = self.face_names[self.selected_face_idx]
+        name = self.library[self.selected_face_idx].name
         reply = QMessageBox.question(self, '确认删除', 
                                      f"确定要删除人脸 '{name}' 吗?",
                                      QMessageBox.Yes | QMessageBox.No, 
@@ -580,18 +883,7 @@ class FaceSwapperGUI(QMainWindow):
                                      
         if reply == QMessageBox.Yes:
             # 删除选中的人脸
-            del self.face_images[self.selected_face_idx]
-            del self.face_features[self.selected_face_idx]
-            del self.face_names[self.selected_face_idx]
-            
-            # 更新映射（如果有）
-            for target_idx in list(self.face_mapping.keys()):
-                if self.face_mapping[target_idx] == self.selected_face_idx:
-                    # 删除受影响的映射
-                    del self.face_mapping[target_idx]
-                elif self.face_mapping[target_idx] > self.selected_face_idx:
-                    # 更新索引大于删除索引的映射
-                    self.face_mapping[target_idx] -= 1
+            self.remove_face(self.selected_face_idx)
             
             # 重置选择
             self.selected_face_idx = -1
@@ -603,18 +895,67 @@ class FaceSwapperGUI(QMainWindow):
             self.rename_button.setEnabled(False)
             self.start_button.setEnabled(False)
             
-            self.statusBar.showMessage(f"已删除人脸: {name}")
+            self.statusBar.showMessage(f"已删除人脸: {name}；{self.library.summary()}")
+    
+    def remove_face(self, idx):
+        self.library.remove(idx)
+        
+        # 更新映射（如果有）
+        for target_idx in list(self.face_mapping.keys()):
+            if self.face_mapping[target_idx] == idx:
+                # 删除受影响的映射
+                del self.face_mapping[target_idx]
+            elif self.face_mapping[target_idx] > idx:
+                # 更新索引大于删除索引的映射
+                self.face_mapping[target_idx] -= 1
+        
+        # 更新自动识别的身份配置，并让已识别的轨迹重新识别
+        identity_sources = {}
+        for identity, source in self.identity_sources.items():
+            if identity == idx or source == idx:
+                continue
+            identity_sources[identity - (identity > idx)] = source - (source > idx)
+        self.identity_sources = identity_sources
+        for track in self.face_tracker.tracks.values():
+            track.identified = False
+    
+    def dedupe_library(self):
+        groups = duplicate_groups(self.library.index)
+        if not groups:
+            self.statusBar.showMessage("人脸库中没有重复的人脸")
+            return
+        
+        details = "\n".join(" / ".join(self.library[i].name for i in group) for group in groups)
+        extra = sum(len(group) - 1 for group in groups)
+        reply = QMessageBox.question(self, "人脸库查重",
+                                     f"发现 {len(groups)} 组重复人脸:\n{details}\n\n"
+                                     f"是否每组只保留第一张，删除其余 {extra} 张？",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+        
+        # 从后往前删，前面的下标不受影响
+        for idx in sorted((i for group in groups for i in group[1:]), reverse=True):
+            self.remove_face(idx)
+        
+        self.selected_face_idx = -1
+        self.current_source_face = None
+        self.update_face_grid()
+        self.delete_button.setEnabled(False)
+        self.rename_button.setEnabled(False)
+        self.start_button.setEnabled(False)
+        self.statusBar.showMessage(f"已合并 {len(groups)} 组重复人脸，删除 {extra} 张")
     
     def rename_selected_face(self):
         if self.selected_face_idx == -1:
             return
             
-        current_name = self.face_names[self.selected_face_idx]
+        current_name = self.library[self.selected_face_idx].name
         new_name, ok = QInputDialog.getText(self, '重命名人脸', 
                                            '输入新名称:', text=current_name)
                                            
         if ok and new_name:
-            self.face_names[self.selected_face_idx] = new_name
+            self.library[self.selected_face_idx].name = new_name
             self.update_face_grid()
             self.statusBar.showMessage(f"已重命名人脸: {new_name}")
     
@@ -626,9 +967,7 @@ class FaceSwapperGUI(QMainWindow):
         if file_dialog.exec_():
             filenames = file_dialog.selectedFiles()
             print(f"选择的文件: {filenames}")
-            for filename in filenames:
-                print(f"尝试加载: {filename}")
-                self.add_face_to_library(filename)
+            self.import_faces(filenames)
     
     def toggle_face_swap(self):
         if self.timer.isActive():
@@ -641,109 +980,224 @@ class FaceSwapperGUI(QMainWindow):
             self.preview_label.setText("预览已停止")
             self.capture_button.setEnabled(False)
             self.record_button.setEnabled(False)
+            self.replay_button.setEnabled(False)
             
             # 如果正在录制，停止录制
             if self.is_recording:
                 self.toggle_recording()
                 
-            self.statusBar.showMessage("换脸已停止")
+            message = "换脸已停止"
+            elapsed = time.monotonic() - self.processing_start
+            if self.processed_frames and elapsed > 0:
+                message += f" - 处理 {self.processed_frames} 帧，平均 {self.processed_frames / elapsed:.1f} FPS"
+            if self.cached_swapper is not None and self.cached_swapper.stats["misses"]:
+                stats = self.cached_swapper.stats
+                message += (f" - 换脸结果复用率 {self.cached_swapper.hit_rate:.0%}"
+                            f"（复用 {stats['hits']} 次，推理 {stats['misses']} 次）")
+            if self.frame_budget.stats["deferred"]:
+                message += f" - 超出时间预算推迟刷新 {self.frame_budget.stats['deferred']} 次"
+            presence_summary = self.presence.summary()
+            if presence_summary:
+                message += f" - {presence_summary}"
+            self.statusBar.showMessage(message)
             
             # 移除预览标签的点击事件
             self.preview_label.mousePressEvent = None
         else:
+            if self.app is None:
+                QMessageBox.warning(self, "警告", "模型仍在加载，请稍候")
+                return
+            
             if self.selected_face_idx == -1 and not self.multi_face_enabled:
                 QMessageBox.warning(self, "警告", "请先选择一个源人脸")
                 return
             
-            # 尝试不同的摄像头索引
-            camera_indices = [0, 1, -1]
-            for idx in camera_indices:
-                self.cap = cv2.VideoCapture(idx)
-                if self.cap.isOpened():
-                    break
-            
-            if not self.cap or not self.cap.isOpened():
-                print("无法打开摄像头，请检查设备连接")
-                self.preview_label.setText("无法打开摄像头，请检查设备连接")
-                QMessageBox.critical(self, "错误", "无法打开摄像头，请检查设备连接")
+            self.cap = open_source(self.source_spec)
+            if not self.cap.isOpened():
+                if self.source_spec is None:
+                    message = "无法打开摄像头，请检查设备连接"
+                else:
+                    message = f"无法打开画面来源: {self.source_spec}"
+                self.cap.release()
+                self.cap = None
+                print(message)
+                self.preview_label.setText(message)
+                QMessageBox.critical(self, "错误", message)
                 return
             
-            print(f"成功打开摄像头")
-            self.timer.start(30)  # 约30FPS
+            print(f"成功打开{self.cap.name}")
+            self.presence = PresenceScheduler(**self.profile.get("presence", {}))
+            self.roi_detector.reset()
+            self.current_faces = FrameFaces.empty()
+            self.processed_frames = 0
+            self.processing_start = time.monotonic()
+            self.timer.start(self.frame_interval())
             self.start_button.setText("停止换脸")
             self.capture_button.setEnabled(True)
             self.record_button.setEnabled(True)
+            self.replay_button.setEnabled(True)
             
             if self.multi_face_enabled:
                 self.statusBar.showMessage("多人脸换脸已开始 - 点击预览中的人脸进行映射")
                 # 给预览标签添加点击事件
                 self.preview_label.mousePressEvent = self.on_preview_click
             else:
-                self.statusBar.showMessage(f"换脸已开始 - 使用人脸: {self.face_names[self.selected_face_idx]}")
+                self.statusBar.showMessage(f"换脸已开始 - 使用人脸: {self.library[self.selected_face_idx].name}")
+    
+    def frame_interval(self):
+        """定时器间隔（毫秒）：摄像头和网络流约30FPS；文件来源按自身帧率，全速模式下为0（处理完立即读下一帧）"""
+        if self.cap is None or self.cap.realtime:
+            return 30
+        if self.full_speed:
+            return 0
+        return max(1, int(1000 / self.cap.fps))
+    
+    def show_source_menu(self):
+        menu = QMenu(self)
+        camera_action = menu.addAction("摄像头")
+        camera_action.triggered.connect(lambda: self.set_source(None))
+        file_action = menu.addAction("视频文件...")
+        file_action.triggered.connect(self.open_video_file)
+        sequence_action = menu.addAction("图片序列文件夹...")
+        sequence_action.triggered.connect(self.open_image_sequence)
+        stream_action = menu.addAction("网络流地址...")
+        stream_action.triggered.connect(self.open_stream)
+        menu.exec_(self.source_button.mapToGlobal(self.source_button.rect().bottomLeft()))
+    
+    def open_video_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "选择视频文件", "",
+                                              "视频文件 (*.mp4 *.avi *.mov *.mkv *.webm);;所有文件 (*)")
+        if path:
+            self.set_source(path)
+    
+    def open_image_sequence(self):
+        directory = QFileDialog.getExistingDirectory(self, "选择图片序列文件夹")
+        if directory:
+            self.set_source(directory)
+    
+    def open_stream(self):
+        url, ok = QInputDialog.getText(self, "网络流", "RTSP/HTTP 地址:", text="rtsp://127.0.0.1:8554/stream")
+        if ok and url.strip():
+            self.set_source(url.strip())
+    
+    def set_source(self, spec):
+        """切换画面来源；正在换脸时立即用新来源重新开始"""
+        running = self.timer.isActive()
+        if running:
+            self.toggle_face_swap()
+        self.source_spec = spec
+        self.source_button.setText(f"来源: {'摄像头' if spec is None else os.path.basename(os.path.normpath(spec)) or spec}")
+        self.statusBar.showMessage(f"画面来源: {'摄像头' if spec is None else spec}")
+        if running:
+            self.toggle_face_swap()
+    
+    def toggle_full_speed(self, state):
+        self.full_speed = (state == Qt.Checked)
+        if self.timer.isActive():
+            self.timer.setInterval(self.frame_interval())
+    
+    def seek_source(self, seconds):
+        if self.cap is None or not self.cap.seekable:
+            return
+        self.cap.seek(self.cap.position + int(seconds * self.cap.fps))
+        # 跳转后画面不连续，轨迹无法延续，映射需要重新点选
+        mapped = self.reset_tracks()
+        self.current_faces = FrameFaces.empty()
+        if mapped:
+            self.statusBar.showMessage(f"画面已跳转，清除了 {mapped} 个人脸映射")
     
     def update_frame(self):
-        if not self.cap or not self.cap.isOpened():
+        if not self.cap:
             return
             
-        ret, frame = self.cap.read()
+        ret, frame = self.cap.read() if self.cap.isOpened() else (False, None)
+        # 采集时刻：录制按它给画面打时间戳，与音频的采集时刻对齐，不受后面处理耗时影响
+        capture_time = time.monotonic()
         if not ret:
+            if not self.cap.isOpened():
+                # 视频文件或图片序列播放完毕、网络流或摄像头断开：停止换脸，不再每次定时器触发都空转
+                reason = "播放完毕" if not self.cap.realtime else "画面来源已断开"
+                name = self.cap.name
+                self.toggle_face_swap()
+                self.statusBar.showMessage(f"{name} {reason}；{self.statusBar.currentMessage()}")
+                return
             print("无法读取摄像头画面")
             return
+        self.processed_frames += 1
         
-        # 水平翻转图像（镜像），使其更直观
-        frame = cv2.flip(frame, 1)
+        # 摄像头画面水平翻转（镜像），使其更直观
+        if self.cap.mirror:
+            frame = cv2.flip(frame, 1)
         
         display_frame = frame.copy()
         
         # 进行换脸
         try:
-            target_faces = self.app.get(frame)
+            # 只做检测，结果以数组形式保存；识别特征和106点关键点按需计算
+            # 待机时由调度器决定本帧是否检测以及检测尺寸，待机检测到人脸后立即用全分辨率重新检测
+            should_detect, input_size = self.presence.plan(frame)
+            if should_detect:
+                if input_size is None:
+                    # 正常模式：只在上一帧人脸附近检测，定期全图扫描发现新人
+                    target_faces = self.roi_detector.detect(frame, self.current_faces.bboxes)
+                else:
+                    target_faces = detect_faces(self.app, frame, input_size=input_size)
+                if self.presence.update(len(target_faces) > 0) and input_size is not None:
+                    target_faces = detect_faces(self.app, frame)
+            else:
+                target_faces = FrameFaces.empty()
             self.current_faces = target_faces  # 保存当前帧的人脸，用于点击映射
             
+            # 多人脸模式下跟踪人脸，映射按轨迹ID保存，人走动或顺序变化时不会错位
+            if self.multi_face_enabled:
+                track_ids, removed = self.face_tracker.update(target_faces.bboxes)
+                self.current_track_ids = track_ids
+                self.forget_tracks(removed)
+                if self.auto_mapping_enabled:
+                    # 只为尚未识别的轨迹计算特征，一批送入识别模型
+                    pending = [i for i, track_id in enumerate(track_ids)
+                               if not self.face_tracker.tracks[track_id].identified]
+                    compute_embeddings(self.app, frame, target_faces, pending)
+            
+            if self.stickers_enabled and self.current_stickers and len(target_faces):
+                landmark_model = self.app.models.get("landmark_2d_106")
+                if landmark_model is not None:
+                    compute_landmarks(landmark_model, frame, target_faces)
+            
             if target_faces:
                 # 多人脸模式
                 if self.multi_face_enabled:
+                    swap_jobs = []
+                    for i, target_face in enumerate(target_faces):
+                        track_id = track_ids[i]
+                        if self.auto_mapping_enabled:
+                            self.auto_assign_track(track_id, target_face)
+                        if track_id in self.face_mapping:
+                            source_face = self.library[self.face_mapping[track_id]]
+                            swap_jobs.append((track_id, target_face.kps, source_face, target_face.bbox))
+                    
+                    # 根据混合比例执行换脸（从原始帧裁剪，贴到显示帧上）；多张人脸在线程池里并行推理，
+                    # 人多时按时间预算轮流刷新，其余复用最近结果
+                    if swap_jobs and self.blend_ratio > 0:
+                        self.frame_budget.run(self.cached_swapper, frame, display_frame, swap_jobs,
+                                              blend=min(self.blend_ratio, 1.0), executor=self.swap_executor)
+                    
                     for i, target_face in enumerate(target_faces):
+                        track_id = track_ids[i]
+                        
                         # 显示每个人脸的框和索引
                         box = target_face.bbox.astype(int)
                         cv2.rectangle(display_frame, (box[0], box[1]), (box[2], box[3]), 
                                      (0, 255, 0), 2)
-                        # 显示人脸索引
-                        cv2.putText(display_frame, f"Face {i+1}", (box[0], box[1] - 10),
+                        # 显示人脸轨迹ID
+                        cv2.putText(display_frame, f"ID {track_id}", (box[0], box[1] - 10),
                                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
                         
-                        # 如果有映射，执行换脸
-                        if i in self.face_mapping:
-                            source_idx = self.face_mapping[i]
-                            source_face = self.face_features[source_idx]
-                            
-                            # 根据混合比例执行换脸
-                            if self.blend_ratio >= 0.99:
-                                display_frame = self.swapper.get(display_frame, target_face, source_face, paste_back=True)
-                            elif self.blend_ratio > 0:
-                                swapped = self.swapper.get(frame.copy(), target_face, source_face, paste_back=True)
-                                # 在换脸区域进行混合
-                                box = target_face.bbox.astype(int)
-                                x1, y1, x2, y2 = max(0, box[0]), max(0, box[1]), min(frame.shape[1], box[2]), min(frame.shape[0], box[3])
-                                
-                                # 扩大一点区域以获得更好的混合效果
-                                margin = 30
-                                x1 = max(0, x1 - margin)
-                                y1 = max(0, y1 - margin)
-                                x2 = min(frame.shape[1], x2 + margin)
-                                y2 = min(frame.shape[0], y2 + margin)
-                                
-                                # 只混合人脸区域
-                                display_frame[y1:y2, x1:x2] = cv2.addWeighted(
-                                    display_frame[y1:y2, x1:x2], 
-                                    1 - self.blend_ratio,
-                                    swapped[y1:y2, x1:x2], 
-                                    self.blend_ratio, 
-                                    0
-                                )
+                        if track_id in self.face_mapping:
+                            source_idx = self.face_mapping[track_id]
                             
                             # 在人脸框上显示源人脸名称
-                            name = self.face_names[source_idx]
+                            name = self.library[source_idx].name
                             cv2.putText(display_frame, name, (box[0], box[3] + 20),
                                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
                             
@@ -756,14 +1210,10 @@ class FaceSwapperGUI(QMainWindow):
                     target_face = target_faces[0]
                     box = target_face.bbox.astype(int)
                     
-                    # 使用混合比例
-                    if self.blend_ratio >= 0.99:  # 近似为1时，直接完全替换
-                        display_frame = self.swapper.get(frame, target_face, self.current_source_face, paste_back=True)
-                    elif self.blend_ratio > 0:
-                        # 获取换脸结果
-                        swapped_frame = self.swapper.get(frame, target_face, self.current_source_face, paste_back=True)
-                        # 混合原始帧和换脸帧
-                        display_frame = cv2.addWeighted(frame, 1 - self.blend_ratio, swapped_frame, self.blend_ratio, 0)
+                    # 使用混合比例（人不动时复用缓存的换脸结果）
+                    if self.blend_ratio > 0:
+                        self.cached_swapper.swap(frame, display_frame, target_face.kps, self.current_source_face,
+                                                 blend=min(self.blend_ratio, 1.0))
                     
                     # 在帧上显示检测到的人脸
                     cv2.rectangle(display_frame, (box[0], box[1]), (box[2], box[3]), (0, 255, 0), 2)
@@ -782,10 +1232,29 @@ class FaceSwapperGUI(QMainWindow):
         if self.current_filter != "无":
             display_frame = self.available_filters[self.current_filter](display_frame)
         
-        # 如果正在录制，写入帧
-        if self.is_recording and self.video_writer:
-            self.video_writer.write(display_frame)
+        # 发布到共享内存（不含录制指示器）
+        if self.shm_enabled:
+            self.publish_shared_frame(display_frame)
+        if self.preview_server is not None:
+            self.preview_server.submit(display_frame)
+        self.replay_buffer.submit(display_frame)
+        self.snapshots.offer(display_frame)
+        
+        # 如果正在录制，写入帧（原始素材模式写入未处理的画面和本帧元数据）
+        if self.is_recording and self.recorder and self.recording_raw:
+            self.recorder.push(frame, self.frame_metadata(self.current_faces), timestamp=capture_time)
+        elif self.is_recording and self.recorder:
+            self.recorder.push_frame(display_frame, timestamp=capture_time)
             
+            # 每秒在状态栏刷新一次编码速度和积压情况
+            encoder_stats = self.recorder.encoder_stats
+            if encoder_stats and time.time() - self.last_encoder_report >= 1.0:
+                self.last_encoder_report = time.time()
+                self.statusBar.showMessage(
+                    f"录制中 [{encoder_stats['encoder']}] 编码 {encoder_stats['encode_fps']:.1f} fps, "
+                    f"积压 {encoder_stats.get('queue_depth', 0)}, 丢帧 {self.recorder.stats['video_dropped']}")
+        
+        if self.is_recording and self.recorder:
             # 添加录制指示器
             radius = 20
             center = (radius + 10, radius + 10)
@@ -810,38 +1279,32 @@ class FaceSwapperGUI(QMainWindow):
         self.current_frame = display_frame
     
     def capture_frame(self):
-        if not hasattr(self, 'current_frame') or self.current_frame is None:
+        # 只登记拍摄请求，之后的帧由 update_frame 交给后台线程编码保存，不阻塞预览
+        count = self.snapshot_burst_spin.value()
+        self.snapshots.format = self.snapshot_format_combo.currentText()
+        self.snapshots.quality = self.snapshot_quality_spin.value()
+        if not self.snapshots.capture(count):
+            self.statusBar.showMessage("上一组连拍尚未完成")
             return
-            
-        # 创建保存目录
-        save_dir = "captures"
-        if not os.path.exists(save_dir):
-            os.makedirs(save_dir)
-            
-        # 生成文件名 (使用当前时间戳)
-        timestamp = time.strftime("%Y%m%d-%H%M%S")
-        filename = f"{save_dir}/capture_{timestamp}.jpg"
-        
-        # 保存图片
-        cv2.imwrite(filename, self.current_frame)
-        self.statusBar.showMessage(f"已保存截图: {filename}")
-        
-        # 显示确认消息
-        QMessageBox.information(self, "保存成功", f"已保存截图到: {filename}")
+        if count > 1:
+            self.statusBar.showMessage(f"正在连拍 {count} 张...")
+    
+    def on_snapshot_saved(self, path, message):
+        self.statusBar.showMessage(f"已保存截图: {path} ({message})")
     
     def toggle_recording(self):
         if self.is_recording:
-            # 停止录制
+            # 停止录制：写入和音视频合成在后台完成，结束后触发 recording_finished
             self.is_recording = False
-            if self.video_writer:
-                self.video_writer.release()
-                self.video_writer = None
+            if self.recorder:
+                self.recorder.stop()
             
             self.record_button.setText("开始录制")
-            self.statusBar.showMessage(f"视频录制已停止: {self.output_video_path}")
-            
-            # 显示确认消息
-            QMessageBox.information(self, "录制完成", f"视频已保存到: {self.output_video_path}")
+            self.encoder_combo.setEnabled(True)
+            self.raw_record_checkbox.setEnabled(True)
+            self.statusBar.showMessage(f"视频录制已停止，正在保存: {self.output_video_path}")
+        elif self.raw_record_checkbox.isChecked():
+            self.start_raw_recording()
         else:
             # 开始录制
             # 创建保存目录
@@ -860,116 +1323,196 @@ class FaceSwapperGUI(QMainWindow):
                 # 默认大小
                 width, height = 640, 480
             
-            # 创建视频写入器
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # MP4格式
-            self.video_writer = cv2.VideoWriter(
-                self.output_video_path, fourcc, 20.0, (width, height))
+            # 同时录制麦克风；变声开启时录制变声后的声音
+            voice_changer = self.voice_changer if self.voice_changer and self.voice_changer.running else None
+            codec = ENCODER_CHOICES[self.encoder_combo.currentText()]
+            self.recorder = AVRecorder(self.output_video_path, (width, height), fps=30.0,
+                                       voice_changer=voice_changer, codec=codec)
+            self.recorder.on_finished = self.recording_finished.emit
+            self.recorder.start()
             
             self.is_recording = True
+            self.recording_raw = False
+            self.last_encoder_report = time.time()
+            self.encoder_combo.setEnabled(False)
+            self.raw_record_checkbox.setEnabled(False)
             self.record_button.setText("停止录制")
-            self.statusBar.showMessage("视频录制中...")
+            if self.recorder.record_audio:
+                self.statusBar.showMessage("视频录制中（含音频）...")
+            else:
+                self.statusBar.showMessage("视频录制中（无音频）...")
+    
+    def start_raw_recording(self):
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        self.output_video_path = os.path.join("sessions", f"session_{timestamp}")
+        if hasattr(self, 'current_frame'):
+            height, width = self.current_frame.shape[:2]
+        else:
+            width, height = 640, 480
+        
+        self.recorder = SessionRecorder(self.output_video_path, (width, height), fps=30.0)
+        self.recorder.on_finished = lambda path, message: self.recording_finished.emit(
+            path, f"{message}，可用 render_session.py 离线重渲染")
+        self.recorder.start()
+        
+        self.is_recording = True
+        self.recording_raw = True
+        self.encoder_combo.setEnabled(False)
+        self.raw_record_checkbox.setEnabled(False)
+        self.record_button.setText("停止录制")
+        self.statusBar.showMessage(f"原始素材录制中: {self.output_video_path}")
+    
+    def frame_metadata(self, faces):
+        """当前帧的检测结果、映射和效果参数，随原始画面一起录制"""
+        track_ids = self.current_track_ids if self.multi_face_enabled else None
+        mapping = {track_id: self.library[idx].path for track_id, idx in self.face_mapping.items()}
+        source_path = self.current_source_face.path if self.current_source_face is not None else None
+        stickers = [(path, position) for _, position, path in self.current_stickers] if self.stickers_enabled else []
+        return make_record(faces, track_ids, self.multi_face_enabled, mapping, source_path,
+                           self.blend_ratio, self.current_filter, stickers)
+    
+    def save_replay(self):
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join("replays", f"replay_{timestamp}.mp4")
+        if not self.replay_buffer.save(path, on_finished=self.replay_saved.emit):
+            self.statusBar.showMessage("回放缓冲为空或上一段回放仍在保存")
+            return
+        stats = self.replay_buffer.stats
+        self.statusBar.showMessage(f"正在保存最近 {stats['seconds']:.0f} 秒回放: {path}")
+    
+    def on_replay_saved(self, path, message):
+        stats = self.replay_buffer.stats
+        self.statusBar.showMessage(f"回放已保存: {path} ({message}) - 缓冲占用 {stats['memory_mb']:.1f}MB，"
+                                   f"压缩 {stats['encode_ms']:.1f}ms/帧")
+    
+    def on_recording_finished(self, path, message):
+        self.statusBar.showMessage(f"视频已保存: {path} ({message})")
+        QMessageBox.information(self, "录制完成", f"视频已保存到: {path}\n{message}")
     
     def closeEvent(self, event):
+        # 等待后台模型加载结束，避免线程在运行中被销毁
+        if self.model_loader.isRunning():
+            self.model_loader.wait()
+        
         # 停止摄像头和录制
         if self.cap and self.cap.isOpened():
             self.cap.release()
             
-        if self.is_recording and self.video_writer:
-            self.video_writer.release()
+        # 关闭窗口时等待录制文件写完
+        if self.is_recording and self.recorder:
+            self.is_recording = False
+            self.recorder.stop()
+        if self.recorder:
+            self.recorder.wait()
+        
+        if self.voice_changer is not None:
+            self.voice_changer.stop()
+        
+        if self.shm_publisher is not None:
+            self.shm_publisher.close()
+        if self.preview_server is not None:
+            self.preview_server.stop()
+        if self.swap_executor is not None:
+            self.swap_executor.shutdown()
+        self.replay_buffer.close()
+        # 等连拍剩下的截图写完；磁盘异常卡住时最多等10秒，并提示未保存的张数
+        unsaved = self.snapshots.close(timeout=10.0)
+        if unsaved:
+            QMessageBox.warning(self, "警告", f"有 {unsaved} 张截图未能保存")
             
         event.accept()
 
-    def change_filter(self, filter_name):
-        self.current_filter = filter_name
-        self.statusBar.showMessage(f"已切换滤镜: {filter_name}")
-
-    def apply_sepia(self, img):
-        # 复古棕褐色滤镜
-        sepia_filter = np.array([[0.393, 0.769, 0.189],
-                               [0.349, 0.686, 0.168],
-                               [0.272, 0.534, 0.131]])
-        sepia_img = cv2.transform(img, sepia_filter)
-        sepia_img = np.clip(sepia_img, 0, 255).astype(np.uint8)
-        return sepia_img
-
-    def apply_sketch(self, img):
-        # 素描效果
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        inv_gray = 255 - gray
-        blurred = cv2.GaussianBlur(inv_gray, (21, 21), 0)
-        sketch = cv2.divide(gray, 255 - blurred, scale=256)
-        return cv2.cvtColor(sketch, cv2.COLOR_GRAY2BGR)
-
-    def apply_cartoon(self, img):
-        # 卡通效果
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        blur = cv2.medianBlur(gray, 5)
-        edges = cv2.adaptiveThreshold(blur, 255, cv2.ADAPTIVE_THRESH_MEAN_C, 
-                                     cv2.THRESH_BINARY, 9, 9)
-        color = cv2.bilateralFilter(img, 9, 300, 300)
-        cartoon = cv2.bitwise_and(color, color, mask=edges)
-        return cartoon
+    def toggle_shared_output(self, state):
+        self.shm_enabled = (state == Qt.Checked)
+        if self.shm_enabled:
+            from shm_output import DEFAULT_NAME
+            self.statusBar.showMessage(f"已开启共享内存输出: {DEFAULT_NAME}（运行 python shm_output.py 查看）")
+        else:
+            if self.shm_publisher is not None:
+                self.shm_publisher.close()
+                self.shm_publisher = None
+            self.statusBar.showMessage("已关闭共享内存输出")
 
-    def apply_edge_detection(self, img):
-        # 边缘检测
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        edges = cv2.Canny(blurred, 50, 150)
-        return cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
+    def toggle_preview_server(self, state):
+        if state == Qt.Checked:
+            from preview_server import PreviewServer
+            port = int(os.environ.get("SWAPPER_PREVIEW_PORT", "8080"))
+            try:
+                self.preview_server = PreviewServer(port=port)
+                self.preview_server.start()
+                self.statusBar.showMessage(f"网页预览已启动: {self.preview_server.url}（WebSocket: /ws）")
+            except OSError as e:
+                print(f"启动网页预览失败: {str(e)}")
+                QMessageBox.warning(self, "警告", f"无法启动网页预览: {str(e)}")
+                self.preview_server = None
+                self.preview_server_checkbox.blockSignals(True)
+                self.preview_server_checkbox.setChecked(False)
+                self.preview_server_checkbox.blockSignals(False)
+        elif self.preview_server is not None:
+            self.preview_server.stop()
+            self.preview_server = None
+            self.statusBar.showMessage("网页预览已关闭")
 
-    def apply_emboss(self, img):
-        # 浮雕效果
-        kernel = np.array([[0, -1, -1],
-                          [1, 0, -1],
-                          [1, 1, 0]])
-        emboss = cv2.filter2D(img, -1, kernel) + 128
-        return emboss
+    def publish_shared_frame(self, frame):
+        try:
+            if self.shm_publisher is None or not self.shm_publisher.fits(frame):
+                from shm_output import SharedFramePublisher
+                if self.shm_publisher is not None:
+                    self.shm_publisher.close()
+                self.shm_publisher = SharedFramePublisher(max_shape=frame.shape)
+            self.shm_publisher.publish(frame)
+        except Exception as e:
+            print(f"共享内存输出失败: {str(e)}")
+            self.shm_checkbox.setChecked(False)
 
-    def apply_neon(self, img):
-        # 霓虹效果
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (21, 21), 0)
-        edges = cv2.divide(gray, blurred, scale=256)
-        edges = cv2.normalize(edges, None, 0, 255, cv2.NORM_MINMAX)
-        edges = cv2.threshold(edges, 50, 255, cv2.THRESH_BINARY)[1]
-        edges = cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
-        
-        # 添加霓虹色彩
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        h, s, v = cv2.split(hsv)
-        # 随机调整色相
-        h = (h + np.random.randint(0, 180)) % 180
-        s = np.clip(s * 1.5, 0, 255).astype(np.uint8)
-        hsv = cv2.merge([h, s, v])
-        colored = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
-        
-        # 结合边缘和颜色
-        result = cv2.bitwise_and(colored, edges)
-        return result
+    def change_filter(self, filter_name):
+        self.current_filter = filter_name
+        self.statusBar.showMessage(f"已切换滤镜: {filter_name}")
 
-    def apply_pixelate(self, img):
-        # 像素化效果
-        height, width = img.shape[:2]
-        
-        # 定义像素块大小
-        block_size = 15
-        
-        # 缩小图像
-        small = cv2.resize(img, (width // block_size, height // block_size),
-                         interpolation=cv2.INTER_LINEAR)
+    def change_voice_effect(self, effect_name):
+        if effect_name == "关闭":
+            if self.voice_changer is not None:
+                self.voice_changer.stop()
+            self.voice_stats_timer.stop()
+            self.voice_status_label.setText("")
+            self.statusBar.showMessage("已关闭实时变声")
+            return
         
-        # 放大回原始尺寸
-        pixelated = cv2.resize(small, (width, height), 
-                             interpolation=cv2.INTER_NEAREST)
+        try:
+            if self.voice_changer is None:
+                from voice_changer import VoiceChanger
+                self.voice_changer = VoiceChanger()
+            self.voice_changer.set_effect(effect_name)
+            self.voice_changer.start()
+        except Exception as e:
+            print(f"启动变声失败: {str(e)}")
+            QMessageBox.warning(self, "警告", f"无法启动实时变声: {str(e)}")
+            self.voice_combo.blockSignals(True)
+            self.voice_combo.setCurrentText("关闭")
+            self.voice_combo.blockSignals(False)
+            return
         
-        return pixelated
-
+        self.voice_stats_timer.start(500)
+        self.statusBar.showMessage(f"已切换变声效果: {effect_name}")
+    
+    def update_voice_stats(self):
+        stats = self.voice_changer.stats
+        latency = stats["latency_ms"]
+        self.voice_status_label.setText(
+            f"延迟 {latency:.0f}ms | 处理 {stats['process_ms_avg']:.2f}ms | "
+            f"欠载 {stats['underruns']} | 溢出 {stats['overruns']}")
+        color = "#333333" if latency <= LATENCY_BUDGET_MS else "#d93025"
+        self.voice_status_label.setStyleSheet(f"color: {color};")
+    
     def toggle_stickers(self, state):
         self.stickers_enabled = (state == Qt.Checked)
         self.sticker_list.setEnabled(self.stickers_enabled)
         self.clear_stickers_button.setEnabled(self.stickers_enabled)
         
         if self.stickers_enabled:
+            # 贴纸定位需要106点关键点模型，首次启用时才加载
+            if self.app is not None and "landmark_2d_106" not in self.app.models:
+                runtime_profile.add_face_module(self.app, self.profile, "landmark_2d_106")
             self.statusBar.showMessage("已启用AR贴纸功能")
         else:
             self.statusBar.showMessage("已禁用AR贴纸功能")
@@ -1055,15 +1598,14 @@ class FaceSwapperGUI(QMainWindow):
     def add_sticker(self, sticker_path, position_type):
         try:
             # 读取贴纸图片（带透明通道）
-            img = np.fromfile(sticker_path, dtype=np.uint8)
-            img = cv2.imdecode(img, cv2.IMREAD_UNCHANGED)
+            img = effects.load_sticker(sticker_path)
             
             if img is None:
                 print(f"无法读取贴纸: {sticker_path}")
                 return
                 
-            # 将贴纸和位置类型添加到当前贴纸列表
-            self.current_stickers.append((img, position_type))
+            # 将贴纸、位置类型和路径添加到当前贴纸列表（路径写入原始素材录制的元数据）
+            self.current_stickers.append((img, position_type, sticker_path))
             
             # 显示状态信息
             sticker_name = os.path.splitext(os.path.basename(sticker_path))[0]
@@ -1075,96 +1617,7 @@ class FaceSwapperGUI(QMainWindow):
             print(f"错误详情: {str(e)}")
 
     def apply_stickers(self, frame, face):
-        # 获取人脸关键点
-        landmarks = face.landmark_2d_106
-        if landmarks is None or len(landmarks) < 106:
-            return
-        
-        landmarks = landmarks.astype(np.int32)
-        
-        # 确定各部位中心点和大小
-        # 额头位置（使用眉毛上方）
-        forehead_center = (int((landmarks[33][0] + landmarks[38][0]) / 2), 
-                          int(landmarks[33][1] - (landmarks[66][1] - landmarks[33][1]) * 0.5))
-        forehead_size = int((landmarks[38][0] - landmarks[33][0]) * 1.2)
-        
-        # 鼻子位置
-        nose_center = (int(landmarks[51][0]), int(landmarks[51][1]))
-        nose_size = int((landmarks[54][0] - landmarks[48][0]) * 0.8)
-        
-        # 眼睛位置（两眼中心）
-        left_eye = (int((landmarks[60][0] + landmarks[61][0]) / 2), 
-                   int((landmarks[60][1] + landmarks[61][1]) / 2))
-        right_eye = (int((landmarks[68][0] + landmarks[69][0]) / 2), 
-                    int((landmarks[68][1] + landmarks[69][1]) / 2))
-        eyes_center = (int((left_eye[0] + right_eye[0]) / 2), 
-                      int((left_eye[1] + right_eye[1]) / 2))
-        eyes_size = int((right_eye[0] - left_eye[0]) * 1.5)
-        
-        # 嘴巴位置
-        mouth_center = (int((landmarks[76][0] + landmarks[82][0]) / 2), 
-                       int((landmarks[76][1] + landmarks[82][1]) / 2))
-        mouth_size = int((landmarks[82][0] - landmarks[76][0]) * 1.2)
-        
-        # 左耳和右耳位置（估计位置，实际关键点可能没有耳朵）
-        face_width = int(face.bbox[2] - face.bbox[0])
-        left_ear_center = (int(face.bbox[0] - face_width * 0.1), eyes_center[1])
-        right_ear_center = (int(face.bbox[2] + face_width * 0.1), eyes_center[1])
-        ear_size = int(face_width * 0.2)
-        
-        # 应用每个贴纸
-        for sticker_img, position in self.current_stickers:
-            if position == "forehead":
-                self.add_sticker_to_frame(frame, sticker_img, forehead_center, forehead_size)
-            elif position == "nose":
-                self.add_sticker_to_frame(frame, sticker_img, nose_center, nose_size)
-            elif position == "eyes":
-                self.add_sticker_to_frame(frame, sticker_img, eyes_center, eyes_size)
-            elif position == "mouth":
-                self.add_sticker_to_frame(frame, sticker_img, mouth_center, mouth_size)
-            elif position == "left_ear":
-                self.add_sticker_to_frame(frame, sticker_img, left_ear_center, ear_size)
-            elif position == "right_ear":
-                self.add_sticker_to_frame(frame, sticker_img, right_ear_center, ear_size)
-
-    def add_sticker_to_frame(self, frame, sticker, center, size):
-        try:
-            # 调整贴纸大小
-            if sticker.shape[1] != size or sticker.shape[0] != size:
-                sticker = cv2.resize(sticker, (size, size))
-            
-            # 确定贴纸在帧中的位置
-            x_offset = center[0] - size // 2
-            y_offset = center[1] - size // 2
-            
-            # 检查贴纸是否超出帧的边界
-            if (x_offset < 0 or y_offset < 0 or 
-                x_offset + sticker.shape[1] > frame.shape[1] or 
-                y_offset + sticker.shape[0] > frame.shape[0]):
-                return
-            
-            # 如果贴纸有透明通道（4通道）
-            if sticker.shape[2] == 4:
-                # 分离RGB和透明通道
-                rgb = sticker[:, :, 0:3]
-                alpha = sticker[:, :, 3] / 255.0
-                
-                # 为透明通道创建广播数组
-                alpha = np.repeat(alpha[:, :, np.newaxis], 3, axis=2)
-                
-                # 为贴纸区域创建ROI
-                roi = frame[y_offset:y_offset+sticker.shape[0], x_offset:x_offset+sticker.shape[1]]
-                
-                # 使用alpha通道混合贴纸和原始图像
-                blended = (1.0 - alpha) * roi + alpha * rgb
-                
-                # 将混合结果放回原始图像
-                frame[y_offset:y_offset+sticker.shape[0], x_offset:x_offset+sticker.shape[1]] = blended
-            else:
-                # 如果没有透明通道，直接叠加
-                frame[y_offset:y_offset+sticker.shape[0], x_offset:x_offset+sticker.shape[1]] = sticker
-        except Exception as e:
-            print(f"添加贴纸到帧失败: {str(e)}")
+        effects.apply_stickers(frame, face, self.current_stickers)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -1,13 +1,15 @@
 import sys
 import os
 import cv2
-import numpy as np
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QLabel, QPushButton, QFileDialog, QGridLayout, QScrollArea)
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QImage, QPixmap
-from insightface.app import FaceAnalysis
-from insightface.model_zoo import get_model
+
+import runtime_profile
+from model_loader import ModelLoader
+from gpu_pipeline import GpuFramePipeline, cuda_device_count
+from face_library import FaceLibrary, DEFAULT_CACHE_MB, read_image
 
 class FaceSwapperGUI(QMainWindow):
     def __init__(self):
@@ -16,25 +18,30 @@ class FaceSwapperGUI(QMainWindow):
         self.setMinimumSize(1000, 600)
         
         # 检测CUDA是否可用
-        self.cuda_available = cv2.cuda.getCudaEnabledDeviceCount() > 0
+        self.cuda_available = cuda_device_count() > 0
         self.providers = ["CUDAExecutionProvider"] if self.cuda_available else ["CPUExecutionProvider"]
-            
-        # 初始化模型
-        self.app = FaceAnalysis(name="buffalo_l", providers=self.providers)
-        self.app.prepare(ctx_id=0, det_size=(256, 256))
-        
-        # 初始化换脸模型
-        model_path = "./models/inswapper_128.onnx"
-        if not os.path.exists(model_path):
-            self.swapper = get_model(model_path, download=True, providers=self.providers)
-        else:
-            self.swapper = get_model(model_path, download=False, providers=self.providers)
         
-        # 存储人脸数据
-        self.face_images = []
-        self.face_features = []
+        # 运行时配置（执行器顺序、线程数、图优化等），没有配置文件时沿用上面的默认执行器
+        self.profile = runtime_profile.load_profile(default_providers=self.providers)
+            
+        # 换脸模型不存在时先下载
+        self.model_path = "./models/inswapper_128.onnx"
+        if not os.path.exists(self.model_path):
+            from insightface.model_zoo import get_model
+            get_model(self.model_path, download=True, providers=self.providers)
+        
+        # 模型和整帧显存流水线在后台线程加载、预热
+        self.app = None
+        self.swapper = None
+        self.pipeline = None
+        
+        # 人脸库只保存缩略图和特征，原图在重新分析时按需解码
+        self.image_cache_mb = float(os.environ.get("SWAPPER_IMAGE_CACHE_MB")
+                                    or self.profile.get("image_cache_mb", DEFAULT_CACHE_MB))
+        self.library = FaceLibrary(cache_mb=self.image_cache_mb)
         self.selected_face_idx = -1
         self.current_source_face = None
+        self.current_latent = None
         
         # 初始化摄像头
         self.cap = None
@@ -43,7 +50,37 @@ class FaceSwapperGUI(QMainWindow):
         
         # 设置界面
         self.setup_ui()
+        
+        # 这个版本只用到检测和识别模型
+        self.load_button.setEnabled(False)
+        self.statusBar().showMessage("正在加载模型...")
+        self.model_loader = ModelLoader(self.profile, self.model_path, (256, 256),
+                                        allowed_modules=["detection", "recognition"], parent=self)
+        self.model_loader.warm_up_hook = self._prepare_pipeline
+        self.model_loader.progress.connect(self.statusBar().showMessage)
+        self.model_loader.loaded.connect(self.on_models_loaded)
+        self.model_loader.failed.connect(self.on_models_failed)
+        self.model_loader.start()
+    
+    def _prepare_pipeline(self, app, swapper):
+        # 在加载线程中执行：创建流水线并预热GPU内核
+        pipeline = GpuFramePipeline(app, swapper, use_cuda=self.cuda_available)
+        pipeline.warm_up()
+        self.pipeline = pipeline
+    
+    def on_models_loaded(self, app, swapper):
+        self.app = app
+        self.swapper = swapper
+        self.load_button.setEnabled(True)
+        self.res_button.setEnabled(True)
+        
+        if self.pipeline.use_cuda:
+            self.gpu_label.setText("GPU加速已启用（显存流水线）")
+        
         self.load_default_faces()
+    
+    def on_models_failed(self, message):
+        self.statusBar().showMessage(f"模型加载失败: {message[:30]}")
 
     def setup_ui(self):
         # 主布局
@@ -86,9 +123,9 @@ class FaceSwapperGUI(QMainWindow):
         
         # 显示GPU状态
         gpu_status = "GPU加速已启用" if self.cuda_available else "使用CPU模式"
-        gpu_label = QLabel(gpu_status)
-        gpu_label.setStyleSheet("color: green; font-weight: bold;" if self.cuda_available else "color: orange;")
-        preview_layout.addWidget(gpu_label, alignment=Qt.AlignRight)
+        self.gpu_label = QLabel(gpu_status)
+        self.gpu_label.setStyleSheet("color: green; font-weight: bold;" if self.cuda_available else "color: orange;")
+        preview_layout.addWidget(self.gpu_label, alignment=Qt.AlignRight)
         
         right_layout.addLayout(preview_layout)
         
@@ -110,6 +147,7 @@ class FaceSwapperGUI(QMainWindow):
         self.res_button = QPushButton("高分辨率模式")
         self.res_button.setCheckable(True)
         self.res_button.clicked.connect(self.toggle_resolution)
+        self.res_button.setEnabled(False)
         control_layout.addWidget(self.res_button)
         
         right_layout.addLayout(control_layout)
@@ -132,44 +170,40 @@ class FaceSwapperGUI(QMainWindow):
         self.res_button.setText("低分辨率模式" if checked else "高分辨率模式")
         self.statusBar().showMessage(f"正在切换到{resolution_name}分辨率模式...")
         
-        # 重新加载分析模型
-        self.app = FaceAnalysis(name="buffalo_l", providers=self.providers)
+        # 只需按新的检测尺寸重新prepare，会话无需重建
         self.app.prepare(ctx_id=0, det_size=det_size)
         self.statusBar().showMessage(f"已切换到{resolution_name}分辨率模式")
         
         # 如果已加载人脸，重新处理它们
-        if self.face_images:
+        if len(self.library):
             self.statusBar().showMessage("正在使用新分辨率重新分析人脸...")
             self._reload_faces()
     
     def _reload_faces(self):
         """使用当前模型重新分析所有人脸"""
-        temp_images = self.face_images.copy()
-        self.face_images = []
-        self.face_features = []
-        
         # 保存当前选择的索引
         old_selected_idx = self.selected_face_idx
         self.selected_face_idx = -1
         self.current_source_face = None
+        self.current_latent = None
         
-        # 重新处理每个人脸
-        for i, img in enumerate(temp_images):
+        def analyze(img):
             try:
                 faces = self.app.get(img)
-                if faces:
-                    self.face_images.append(img)
-                    self.face_features.append(faces[0])
-                    
-                    # 还原之前的选择
-                    if i == old_selected_idx and self.selected_face_idx == -1:
-                        self.select_face(len(self.face_images) - 1)
             except Exception:
-                pass
+                return None
+            return faces[0] if faces else None
+        
+        # 重新处理每个人脸，原图按需解码
+        mapping = self.library.reanalyze(analyze)
+        
+        # 还原之前的选择
+        if old_selected_idx in mapping:
+            self.select_face(mapping[old_selected_idx])
         
         # 更新UI
         self.update_face_grid()
-        self.statusBar().showMessage(f"已重新分析 {len(self.face_images)} 个人脸")
+        self.statusBar().showMessage(f"已重新分析 {len(self.library)} 个人脸；{self.library.summary()}")
         
         # 如果之前有选中的人脸但现在没有了，禁用开始按钮
         if old_selected_idx >= 0 and self.selected_face_idx == -1:
@@ -192,18 +226,16 @@ class FaceSwapperGUI(QMainWindow):
                     self.add_face_to_library(filepath)
         
         # 如果没有默认人脸，加载source_face.jpg
-        if len(self.face_images) == 0 and os.path.exists("source_face.jpg"):
+        if len(self.library) == 0 and os.path.exists("source_face.jpg"):
             self.add_face_to_library("source_face.jpg")
             
-        self.statusBar().showMessage(f"已加载 {len(self.face_images)} 个人脸")
+        self.statusBar().showMessage(f"已加载 {len(self.library)} 个人脸；{self.library.summary()}")
     
     def add_face_to_library(self, image_path):
         try:
             # 处理中文路径问题
             if os.path.exists(image_path):
-                # 使用numpy直接读取文件，避免cv2中文路径问题
-                img = np.fromfile(image_path, dtype=np.uint8)
-                img = cv2.imdecode(img, cv2.IMREAD_COLOR)
+                img = read_image(image_path)
             else:
                 self.statusBar().showMessage(f"文件不存在: {os.path.basename(image_path)}")
                 return
@@ -223,9 +255,9 @@ class FaceSwapperGUI(QMainWindow):
             # 获取第一个人脸
             face_feature = faces[0]
             
-            # 存储图片和特征
-            self.face_images.append(img)
-            self.face_features.append(face_feature)
+            # 只存缩略图和特征，原图不常驻内存
+            name = os.path.splitext(os.path.basename(image_path))[0]
+            self.library.add(image_path, name, img, face_feature)
             
             # 更新界面
             self.update_face_grid()
@@ -242,27 +274,9 @@ class FaceSwapperGUI(QMainWindow):
                 item.widget().deleteLater()
         
         # 重新填充网格
-        for i, img in enumerate(self.face_images):
-            # 缩放图片
-            h, w = img.shape[:2]
-            aspect = w / h
-            thumb_h = 120
-            thumb_w = int(thumb_h * aspect)
-            
-            # GPU加速图像缩放
-            if self.cuda_available:
-                try:
-                    gpu_img = cv2.cuda_GpuMat()
-                    gpu_img.upload(img)
-                    gpu_img_resized = cv2.cuda.resize(gpu_img, (thumb_w, thumb_h))
-                    thumb = gpu_img_resized.download()
-                except:
-                    thumb = cv2.resize(img, (thumb_w, thumb_h))
-            else:
-                thumb = cv2.resize(img, (thumb_w, thumb_h))
-            
-            # 转换为QPixmap
-            rgb_image = cv2.cvtColor(thumb, cv2.COLOR_BGR2RGB)
+        for i, entry in enumerate(self.library):
+            # 缩略图在加入人脸库时已生成
+            rgb_image = cv2.cvtColor(entry.thumbnail, cv2.COLOR_BGR2RGB)
             h, w, ch = rgb_image.shape
             q_img = QImage(rgb_image.data, w, h, w * ch, QImage.Format_RGB888)
             pixmap = QPixmap.fromImage(q_img)
@@ -289,7 +303,8 @@ class FaceSwapperGUI(QMainWindow):
     
     def select_face(self, idx):
         self.selected_face_idx = idx
-        self.current_source_face = self.face_features[idx]
+        self.current_source_face = self.library[idx]
+        self.current_latent = self.pipeline.source_latent(self.current_source_face)
         self.update_face_grid()
         self.start_button.setEnabled(True)
         self.statusBar().showMessage(f"已选择人脸 #{idx+1}")
@@ -345,19 +360,12 @@ class FaceSwapperGUI(QMainWindow):
         if not ret:
             return
         
-        # 水平翻转图像（镜像），使其更直观
-        frame = cv2.flip(frame, 1)
-        display_frame = frame.copy()
-        
-        # 进行换脸
+        # 翻转、检测、换脸和贴回都在流水线内完成，整帧只上传/下载各一次
         try:
             start_time = cv2.getTickCount()
             
-            target_faces = self.app.get(frame)
-            if target_faces:
-                target_face = target_faces[0]
-                display_frame = self.swapper.get(frame, target_face, self.current_source_face, paste_back=True)
-                
+            display_frame, dets, _ = self.pipeline.process(frame, self.current_latent)
+            if len(dets):
                 # 计算FPS
                 end_time = cv2.getTickCount()
                 processing_time = (end_time - start_time) / cv2.getTickFrequency()
@@ -367,19 +375,19 @@ class FaceSwapperGUI(QMainWindow):
                 cv2.putText(display_frame, f"FPS: {fps:.1f}", (20, 40), 
                           cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
                 
-                self.statusBar().showMessage(f"FPS: {fps:.1f}")
+                self.statusBar().showMessage(f"FPS: {fps:.1f} ({self.pipeline.backend})")
             else:
                 # 如果没检测到人脸，在帧上显示提示
                 cv2.putText(display_frame, "未检测到人脸", (50, 50), 
                           cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
                 self.statusBar().showMessage("未检测到人脸")
         except Exception as e:
+            display_frame = cv2.flip(frame, 1)
             self.statusBar().showMessage(f"换脸失败: {str(e)[:30]}")
         
-        # 转换帧并显示
-        rgb_frame = cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_frame.shape
-        q_img = QImage(rgb_frame.data, w, h, w * ch, QImage.Format_RGB888)
+        # 直接用BGR格式构造QImage，省掉一次颜色转换
+        h, w, ch = display_frame.shape
+        q_img = QImage(display_frame.data, w, h, w * ch, QImage.Format_BGR888)
         pixmap = QPixmap.fromImage(q_img)
         
         # 缩放以适应标签
@@ -388,6 +396,9 @@ class FaceSwapperGUI(QMainWindow):
         self.preview_label.setPixmap(pixmap)
     
     def closeEvent(self, event):
+        # 等待后台模型加载结束，避免线程在运行中被销毁
+        if self.model_loader.isRunning():
+            self.model_loader.wait()
         if self.cap and self.cap.isOpened():
             self.cap.release()
         event.accept()
@@ -0,0 +1,113 @@
+"""测试用的模型替身：接口与 insightface 的 RetinaFace / ArcFaceONNX / INSwapper 及 onnxruntime 会话一致"""
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+INPUT_SIZE = (128, 128)
+STRIDE = 32
+
+
+class StubSession:
+    def __init__(self, outputs, providers=("CPUExecutionProvider",)):
+        self.outputs = outputs
+        self.providers = list(providers)
+        self.runs = 0
+
+    def get_providers(self):
+        return self.providers
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input", shape=[1, 3, 128, 128])]
+
+    def get_outputs(self):
+        outputs = self.outputs if isinstance(self.outputs, list) else []
+        return [SimpleNamespace(shape=list(output.shape)) for output in outputs]
+
+    def run(self, output_names, feed):
+        self.runs += 1
+        return self.outputs(feed) if callable(self.outputs) else self.outputs
+
+
+def stub_detector():
+    """单一 stride 的 det_10g 替身：在 128x128 检测输入的 (64, 64) 处输出一张人脸"""
+    cells = (INPUT_SIZE[0] // STRIDE) * (INPUT_SIZE[1] // STRIDE)
+    scores = np.zeros((cells, 1), dtype=np.float32)
+    bboxes = np.zeros((cells, 4), dtype=np.float32)
+    kpss = np.zeros((cells, 10), dtype=np.float32)
+    anchor = 2 * (INPUT_SIZE[0] // STRIDE) + 2
+    scores[anchor] = 0.9
+    bboxes[anchor] = 1.0
+    kpss[anchor] = [-0.3, -0.2, 0.3, -0.2, 0.0, 0.05, -0.25, 0.3, 0.25, 0.3]
+    return SimpleNamespace(
+        input_size=INPUT_SIZE, input_mean=127.5, input_std=128.0, input_name="input.1",
+        output_names=["score", "bbox", "kps"], session=StubSession([scores, bboxes, kpss]),
+        fmc=1, _feat_stride_fpn=[STRIDE], _num_anchors=1, use_kps=True,
+        det_thresh=0.5, nms_thresh=0.4, center_cache={})
+
+
+def stub_recognizer(dim=512):
+    # 每张输入人脸输出同一个单位向量
+    def embed(feed):
+        batch = next(iter(feed.values())).shape[0]
+        return [np.full((batch, dim), 1.0 / np.sqrt(dim), dtype=np.float32)]
+
+    return SimpleNamespace(input_size=(112, 112), input_mean=127.5, input_std=127.5, input_name="input.1",
+                           output_names=["embedding"], session=StubSession(embed))
+
+
+def stub_swapper(model_file="./models/inswapper_128.onnx"):
+    """换脸结果为全白，便于确认贴回发生"""
+    def swap(feed):
+        batch = feed["target"].shape[0]
+        return [np.ones((batch, 3, 128, 128), dtype=np.float32)]
+
+    return SimpleNamespace(
+        model_file=model_file, input_size=(128, 128), input_mean=0.0, input_std=255.0,
+        input_names=["target", "source"], output_names=["output"],
+        emap=np.eye(512, dtype=np.float32), session=StubSession(swap))
+
+
+def stub_face_analysis():
+    det_model = stub_detector()
+    return SimpleNamespace(det_model=det_model, models={"detection": det_model, "recognition": stub_recognizer()},
+                           model_dir="stub", prepare=lambda ctx_id=0, det_size=None: None)
+
+
+def square_detector(batched=False, stride=STRIDE):
+    """按内容检测的 det_10g 替身：把检测输入图里的白色方块当作人脸，输出覆盖它的框
+
+    batched 为 True 时输出 (batch, N, C) 三维，模拟带 batch 维导出的模型。
+    """
+    def detect(feed):
+        blobs = next(iter(feed.values()))
+        batch, _, height, width = blobs.shape
+        rows, cols = height // stride, width // stride
+        scores = np.zeros((batch, rows * cols, 1), dtype=np.float32)
+        bboxes = np.zeros((batch, rows * cols, 4), dtype=np.float32)
+        kpss = np.zeros((batch, rows * cols, 10), dtype=np.float32)
+        for b in range(batch):
+            mask = (blobs[b, 0] > 0.9).astype(np.uint8)
+            count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+            for x0, y0, w, h, _ in stats[1:count]:
+                x1, y1 = x0 + w, y0 + h
+                cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+                col = min(int(round(cx / stride)), cols - 1)
+                row = min(int(round(cy / stride)), rows - 1)
+                ax, ay = col * stride, row * stride
+                anchor = row * cols + col
+                scores[b, anchor] = 0.9
+                bboxes[b, anchor] = [(ax - x0) / stride, (ay - y0) / stride,
+                                     (x1 - ax) / stride, (y1 - ay) / stride]
+                kpss[b, anchor] = np.tile([(cx - ax) / stride, (cy - ay) / stride], 5)
+        outputs = [scores, bboxes, kpss]
+        return outputs if batched else [output[0] for output in outputs]
+
+    session = StubSession(detect)
+    shape = ["batch", "anchors"] if batched else ["anchors"]
+    session.get_outputs = lambda: [SimpleNamespace(shape=shape + [c]) for c in (1, 4, 10)]
+    return SimpleNamespace(
+        input_size=INPUT_SIZE, input_mean=127.5, input_std=128.0, input_name="input.1",
+        output_names=["score", "bbox", "kps"], session=session,
+        fmc=1, _feat_stride_fpn=[stride], _num_anchors=1, use_kps=True,
+        det_thresh=0.5, nms_thresh=0.4, center_cache={})
@@ -0,0 +1,71 @@
+import threading
+
+import numpy as np
+
+import av_recorder
+from av_recorder import AVRecorder
+
+
+class CountingEncoder:
+    def __init__(self):
+        self.frames = 0
+        self.stats = {}
+
+    def write(self, frame):
+        self.frames += 1
+        return True
+
+    def close(self):
+        pass
+
+
+def record(tmp_path, monkeypatch, create_encoder, push):
+    monkeypatch.setattr(av_recorder, "create_encoder", create_encoder)
+    recorder = AVRecorder(str(tmp_path / "out.mp4"), (32, 24), fps=10.0, record_audio=False)
+    finished = threading.Event()
+    result = {}
+
+    def on_finished(path, message):
+        result["message"] = message
+        finished.set()
+
+    recorder.on_finished = on_finished
+    recorder.start()
+    push(recorder)
+    recorder.stop()
+    assert finished.wait(5), "录制结束回调没有被调用"
+    return recorder, result["message"]
+
+
+def test_frames_are_placed_by_capture_timestamp(tmp_path, monkeypatch):
+    encoder = CountingEncoder()
+
+    def create_encoder(path, *args, **kwargs):
+        open(path, "wb").close()
+        return encoder
+
+    frame = np.zeros((24, 32, 3), dtype=np.uint8)
+
+    def push(recorder):
+        # 推送时刻相同，但采集时刻相隔1秒：按采集时刻应补出 10fps × 1s 的帧
+        recorder.push_frame(frame, timestamp=recorder.start_time)
+        recorder.push_frame(frame, timestamp=recorder.start_time + 1.0)
+
+    recorder, _ = record(tmp_path, monkeypatch, create_encoder, push)
+    assert encoder.frames == 11
+    assert recorder.stats["video_duplicated"] == 9
+
+
+def test_encoder_creation_failure_reports_through_on_finished(tmp_path, monkeypatch):
+    def create_encoder(*args, **kwargs):
+        raise OSError("no encoder")
+
+    frame = np.zeros((24, 32, 3), dtype=np.uint8)
+
+    def push(recorder):
+        # 超过队列容量，stop() 也不能因队列满而阻塞
+        for _ in range(200):
+            recorder.push_frame(frame)
+
+    _, message = record(tmp_path, monkeypatch, create_encoder, push)
+    assert "no encoder" in message
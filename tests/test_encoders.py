@@ -0,0 +1,81 @@
+import subprocess
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+import encoders
+from encoders import EncoderError, FFmpegEncoder
+
+
+@pytest.fixture
+def dead_ffmpeg(monkeypatch):
+    """用一个立即退出的进程代替 ffmpeg，模拟编码进程中途崩溃"""
+    real_popen = subprocess.Popen
+
+    def popen(cmd, **kwargs):
+        return real_popen([sys.executable, "-c", "import sys; sys.stderr.write('boom')"], **kwargs)
+
+    monkeypatch.setattr(encoders.subprocess, "Popen", popen)
+
+
+def run_with_timeout(fn, timeout=10.0):
+    result = {}
+
+    def target():
+        try:
+            fn()
+        except Exception as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "编码器在 ffmpeg 退出后卡住"
+    return result.get("error")
+
+
+def test_blocking_write_does_not_deadlock_after_ffmpeg_exits(dead_ffmpeg):
+    encoder = FFmpegEncoder("out.mp4", (64, 48), 30, queue_size=2)
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+
+    def write_many():
+        for _ in range(200):
+            encoder.write(frame)
+
+    assert isinstance(run_with_timeout(write_many), EncoderError)
+    assert isinstance(run_with_timeout(encoder.close), EncoderError)
+    assert "boom" in encoder.error
+
+
+def test_close_reports_nonzero_exit(monkeypatch):
+    real_popen = subprocess.Popen
+    monkeypatch.setattr(encoders.subprocess, "Popen",
+                        lambda cmd, **kwargs: real_popen([sys.executable, "-c", "raise SystemExit(3)"], **kwargs))
+    encoder = FFmpegEncoder("out.mp4", (64, 48), 30)
+    error = run_with_timeout(encoder.close)
+    assert isinstance(error, EncoderError)
+    assert "3" in str(error)
+
+
+def test_chatty_stderr_does_not_stall_encoder(monkeypatch):
+    # 先往 stderr 写满远超管道缓冲的内容再读 stdin；没人读 stderr 的话子进程和写帧会互相卡死
+    script = ("import sys; sys.stderr.write('x' * 200000); sys.stderr.flush(); "
+              "sys.stdin.buffer.read(); sys.stderr.write('fatal: disk full'); raise SystemExit(1)")
+    real_popen = subprocess.Popen
+    monkeypatch.setattr(encoders.subprocess, "Popen",
+                        lambda cmd, **kwargs: real_popen([sys.executable, "-c", script], **kwargs))
+    encoder = FFmpegEncoder("out.mp4", (64, 48), 30, queue_size=2)
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+
+    def write_many():
+        for _ in range(50):
+            encoder.write(frame)
+
+    assert run_with_timeout(write_many) is None
+    error = run_with_timeout(encoder.close)
+    assert isinstance(error, EncoderError)
+    # 只保留末尾，最后的报错信息不会被前面的大量输出挤掉
+    assert str(error).endswith("fatal: disk full")
+    assert len(encoder._stderr_tail) <= encoders.STDERR_TAIL_BYTES
@@ -0,0 +1,110 @@
+import numpy as np
+
+from face_index import FaceIndex, auto_source, duplicate_groups, normalize
+
+
+def clustered_embeddings(people=300, photos=10, dim=512, spread=0.3, seed=0):
+    """每人若干张照片：同一人的特征围绕一个中心随机抖动，与真实人脸库的分布相近"""
+    rng = np.random.default_rng(seed)
+    centers = normalize(rng.standard_normal((people, dim)))
+    noise = rng.standard_normal((people, photos, dim)) * spread / np.sqrt(dim)
+    return normalize(centers[:, None] + noise).reshape(-1, dim)
+
+
+def make_index(embeddings, ivf_min_size=1000):
+    index = FaceIndex(ivf_min_size=ivf_min_size)
+    for embedding in embeddings:
+        index.add(embedding)
+    return index
+
+
+def test_ivf_search_matches_brute_force():
+    embeddings = clustered_embeddings()
+    index = make_index(embeddings)
+    rng = np.random.default_rng(1)
+    queries = normalize(embeddings[rng.choice(len(embeddings), 200, replace=False)]
+                        + rng.standard_normal((200, 512)) * 0.01)
+
+    exact_scores, exact_indices = index.search(queries, k=5, exact=True)
+    brute = queries @ normalize(embeddings).T
+    np.testing.assert_array_equal(exact_indices, np.argsort(-brute, axis=1)[:, :5])
+    np.testing.assert_allclose(exact_scores, np.sort(brute, axis=1)[:, ::-1][:, :5], atol=1e-5)
+
+    scores, indices = index.search(queries, k=5)
+    assert index._ivf is not None
+    recall = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(indices, exact_indices)])
+    assert recall >= 0.95
+    assert np.mean(indices[:, 0] == exact_indices[:, 0]) >= 0.98
+    # IVF 返回的分数就是真实相似度，只是可能漏掉少数近邻
+    found = indices >= 0
+    np.testing.assert_allclose(scores[found], np.take_along_axis(brute, np.maximum(indices, 0), axis=1)[found],
+                               atol=1e-5)
+
+
+def test_ivf_stays_consistent_after_add_and_remove():
+    embeddings = clustered_embeddings(people=150)
+    index = make_index(embeddings)
+    index.search(embeddings[:1])
+    assert index._ivf is not None
+    extra = clustered_embeddings(people=1, seed=7)[0]
+    row = index.add(extra)
+    identity, score = index.best_match(extra)
+    assert identity == row and score > 0.999
+
+    index.remove(0)
+    # 删除后后面的行号整体前移
+    assert index.best_match(embeddings[5])[0] == 4
+    assert index.best_match(extra)[0] == row - 1
+
+
+def test_small_library_and_padding():
+    index = FaceIndex()
+    assert index.best_match(np.ones(512)) == (-1, -1.0)
+    index.add(np.ones(512))
+    scores, indices = index.search(np.ones(512), k=3)
+    assert indices.tolist() == [[0, -1, -1]]
+    assert scores[0, 0] > 0.999 and scores[0, 1] == -1.0
+
+
+def test_auto_source_threshold_and_mapping():
+    rng = np.random.default_rng(0)
+    people = normalize(rng.standard_normal((3, 512)))
+    index = make_index(people)
+
+    def near(i, similarity):
+        # 与第 i 个人的余弦相似度恰好为 similarity
+        other = rng.standard_normal(512)
+        other = normalize(other - people[i] * (other @ people[i]))
+        return similarity * people[i] + np.sqrt(1 - similarity ** 2) * other
+
+    identity, score, source = auto_source(index, near(1, 0.45), {}, default_source=2)
+    assert (identity, source) == (1, 2) and abs(score - 0.45) < 1e-4
+    # 配置了该身份的源人脸时优先使用
+    assert auto_source(index, near(1, 0.45), {1: 0}, default_source=2)[2] == 0
+    # 相似度不足阈值：仍报告最接近的身份，但不映射
+    identity, score, source = auto_source(index, near(1, 0.35), {1: 0}, default_source=2)
+    assert (identity, source) == (1, -1)
+    assert auto_source(index, near(1, 0.35), {}, default_source=2, threshold=0.3)[2] == 2
+    # 没有选中源人脸时也不映射
+    assert auto_source(index, near(0, 0.9), {}, default_source=-1)[2] == -1
+    assert auto_source(FaceIndex(), people[0], {}, default_source=0) == (-1, -1.0, -1)
+
+
+def test_duplicate_groups_collapse_near_duplicates_only():
+    rng = np.random.default_rng(3)
+    people = normalize(rng.standard_normal((6, 512)))
+    rows = [people[0], people[1], people[0], people[2], people[3], people[0], people[3], people[4], people[5]]
+    index = make_index(normalize(np.array(rows) + rng.standard_normal((len(rows), 512)) * 0.02))
+    assert sorted(duplicate_groups(index)) == [[0, 2, 5], [4, 6]]
+    # 阈值调到比同一人照片间的相似度更高时不再合并
+    assert duplicate_groups(index, threshold=0.9999) == []
+
+
+def test_duplicate_groups_on_ivf_library():
+    embeddings = clustered_embeddings(people=200, photos=1)
+    # 每隔十个人加一张重复照片
+    duplicates = normalize(embeddings[::10] + np.random.default_rng(5).standard_normal((20, 512)) * 0.02)
+    index = make_index(np.concatenate([embeddings, duplicates]), ivf_min_size=100)
+    groups = duplicate_groups(index)
+    assert index._ivf is not None
+    assert sorted(groups) == [[i, 200 + n] for n, i in enumerate(range(0, 200, 10))]
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+from face_library import FaceLibrary
+
+
+def fake_face(seed):
+    embedding = np.random.default_rng(seed).standard_normal(512).astype(np.float32)
+    return SimpleNamespace(embedding=embedding, normed_embedding=embedding / np.linalg.norm(embedding))
+
+
+def test_add_keeps_only_thumbnail_and_image_decodes_on_demand(tmp_path):
+    img = np.full((720, 960, 3), 128, dtype=np.uint8)
+    path = str(tmp_path / "face.png")
+    cv2.imwrite(path, img)
+
+    library = FaceLibrary(cache_mb=16)
+    library.add(path, "face", img, fake_face(0))
+    assert library.images.bytes == 0
+    assert library.memory_bytes < img.nbytes
+
+    assert library.image(0).shape == img.shape
+    assert library.images.stats["misses"] == 1
+    library.image(0)
+    assert library.images.stats["hits"] == 1
+    assert library.images.bytes == img.nbytes
+    assert "人脸库 1 张" in library.summary()
+
+
+def test_reanalyze_decodes_on_demand_and_drops_lost_entries(tmp_path):
+    library = FaceLibrary(cache_mb=16)
+    paths = []
+    for i in range(3):
+        img = np.full((64, 48, 3), 40 * (i + 1), dtype=np.uint8)
+        path = str(tmp_path / f"face{i}.png")
+        cv2.imwrite(path, img)
+        library.add(path, f"face{i}", img, fake_face(i))
+        paths.append(path)
+    (tmp_path / "face1.png").unlink()
+
+    seen = []
+
+    def analyze(img):
+        seen.append(int(img[0, 0, 0]))
+        # 第三张“检测不到人脸”
+        return fake_face(10 + len(seen)) if len(seen) == 1 else None
+
+    mapping = library.reanalyze(analyze)
+    assert seen == [40, 120]
+    assert mapping == {0: 0}
+    assert library.names == ["face0"]
+    assert len(library.index) == 1
+    np.testing.assert_allclose(library[0].embedding, fake_face(11).embedding)
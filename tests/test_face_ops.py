@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+import pytest
+
+import face_ops
+
+
+def inswapper_mask(M, image_size, width, height):
+    """INSwapper.get 在整帧上计算贴回遮罩的原始做法"""
+    IM = cv2.invertAffineTransform(M)
+    img_white = np.full((image_size, image_size), 255, dtype=np.float32)
+    img_white = cv2.warpAffine(img_white, IM, (width, height), borderValue=0.0)
+    img_white[img_white > 20] = 255
+    mask_h_inds, mask_w_inds = np.where(img_white == 255)
+    mask_h = np.max(mask_h_inds) - np.min(mask_h_inds)
+    mask_w = np.max(mask_w_inds) - np.min(mask_w_inds)
+    mask_size = int(np.sqrt(mask_h * mask_w))
+    k = max(mask_size // 10, 10)
+    img_mask = cv2.erode(img_white, np.ones((k, k), np.uint8), iterations=1)
+    k = max(mask_size // 20, 5)
+    img_mask = cv2.GaussianBlur(img_mask, (2 * k + 1, 2 * k + 1), 0)
+    return img_mask / 255
+
+
+def face_matrix(side, angle_deg, center=(320, 240), image_size=128):
+    """原图中边长 side、旋转 angle_deg 的人脸对应的对齐矩阵"""
+    scale = image_size / side
+    M = cv2.getRotationMatrix2D(center, angle_deg, scale)
+    M[:, 2] += np.array([image_size / 2, image_size / 2]) - center
+    return M
+
+
+@pytest.mark.parametrize("side, angle", [(256, 0), (128, 0), (60, 0), (40, 0), (200, 25), (90, -40)])
+def test_paste_mask_matches_inswapper(side, angle):
+    width, height = 640, 480
+    M = face_matrix(side, angle)
+    expected = inswapper_mask(M, 128, width, height)
+    x0, y0, x1, y1, _, alpha = face_ops.warp_back(np.zeros((128, 128, 3), np.uint8), M, width, height)
+    actual = np.zeros((height, width), dtype=np.float32)
+    actual[y0:y1, x0:x1] = alpha[:, :, 0]
+    # 差别只在于核大小取整到对齐空间的整数像素，以及旋转人脸四角处整帧方形核的腐蚀形状
+    assert np.abs(actual - expected).mean() < 0.005
+    assert np.abs(actual - expected).max() < 0.35
+    assert abs(actual.sum() - expected.sum()) / expected.sum() < 0.08
+
+
+def test_small_faces_get_relatively_wider_feather():
+    small = face_ops.paste_mask(face_matrix(48, 0))
+    large = face_ops.paste_mask(face_matrix(256, 0))
+    assert small.sum() < large.sum()
+    assert face_ops.paste_mask(face_matrix(256, 0)) is large
+    assert not large.flags.writeable
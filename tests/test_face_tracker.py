@@ -0,0 +1,23 @@
+from face_tracker import FaceTracker
+
+
+def test_reset_reports_removed_tracks_and_keeps_ids_unique():
+    tracker = FaceTracker()
+    first, _ = tracker.update([[0, 0, 10, 10], [50, 50, 60, 60]])
+
+    removed = tracker.reset()
+    assert sorted(removed) == sorted(first)
+    assert tracker.tracks == {}
+
+    # 重置后新轨迹不会复用旧ID，旧映射不会错接到新出现的人身上
+    second, removed = tracker.update([[0, 0, 10, 10]])
+    assert removed == []
+    assert not set(second) & set(first)
+
+
+def test_expired_tracks_are_reported_once():
+    tracker = FaceTracker(max_misses=1)
+    ids, _ = tracker.update([[0, 0, 10, 10]])
+    assert tracker.update([])[1] == []
+    assert tracker.update([])[1] == ids
+    assert tracker.reset() == []
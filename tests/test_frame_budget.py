@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+
+import frame_budget
+from frame_budget import FrameBudget
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeSwapper:
+    """每次推理让假时钟前进 cost_ms，记录每帧刷新和复用的轨迹"""
+
+    def __init__(self, clock, cost_ms):
+        self.clock = clock
+        self.cost_ms = cost_ms
+        self.stats = {"misses": 0}
+        self.cached = set()
+        self.swapped = []
+        self.pasted = []
+
+    def swap(self, img, output, kps, source, track_key=0, blend=1.0):
+        self.clock.now += self.cost_ms / 1000
+        self.stats["misses"] += 1
+        self.cached.add(track_key)
+        self.swapped.append(track_key)
+
+    def paste_cached(self, output, kps, source, track_key=0, blend=1.0):
+        if track_key not in self.cached:
+            return False
+        self.pasted.append(track_key)
+        return True
+
+    def swap_many(self, img, output, jobs, blend=1.0, executor=None, reuse=()):
+        statuses = []
+        for key, _, _ in jobs:
+            if key in reuse and key in self.cached:
+                self.pasted.append(key)
+                statuses.append("deferred")
+            else:
+                self.cached.add(key)
+                self.swapped.append(key)
+                self.stats["misses"] += 1
+                statuses.append("miss")
+        # 并行推理：整批只花一次推理的墙钟时间
+        self.clock.now += self.cost_ms / 1000
+        return statuses
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(frame_budget.time, "perf_counter", clock)
+    return clock
+
+
+def make_jobs(sizes, source="a"):
+    return [(key, None, source, np.array([0, 0, size, size], dtype=np.float32)) for key, size in enumerate(sizes)]
+
+
+def run_frame(budget, swapper, jobs, executor=None):
+    swapper.swapped, swapper.pasted = [], []
+    budget.run(swapper, None, None, jobs, executor=executor)
+    return swapper.swapped, swapper.pasted
+
+
+def test_prioritize_never_refreshed_then_stale_then_large():
+    budget = FrameBudget()
+    jobs = make_jobs([50, 100, 80])
+    assert budget.prioritize(jobs) == [1, 2, 0]
+    budget.frame = 5
+    budget._last_refresh = {0: 4, 1: 4, 2: 1}
+    assert budget.prioritize(jobs)[0] == 2
+    # 映射已超过 recent_frames 帧，改映射的人脸在同等条件下优先
+    budget.frame = 100
+    budget._last_refresh = {0: 99, 1: 99, 2: 99}
+    jobs[0] = (0, None, "b", jobs[0][3])
+    assert budget.prioritize(jobs)[0] == 0
+
+
+def test_serial_cutoff_rotates_deferred_faces(clock):
+    budget = FrameBudget(budget_ms=20.0)
+    swapper = FakeSwapper(clock, cost_ms=8.0)
+    # 人脸大小相近，优先级主要由距上次刷新的帧数决定
+    jobs = make_jobs([100, 98, 96, 94])
+    # 第一帧没有缓存结果可复用，只能全部推理
+    assert run_frame(budget, swapper, jobs) == ([0, 1, 2, 3], [])
+    assert budget.cost_ms == 8.0
+    # 之后每帧只刷新预算内的两张，其余贴回缓存，下一帧轮到被推迟的
+    assert run_frame(budget, swapper, jobs) == ([0, 1], [2, 3])
+    assert run_frame(budget, swapper, jobs) == ([2, 3], [0, 1])
+    assert budget.stats["deferred"] == 4
+    assert budget.stats["refreshed"] == 8
+    assert budget.stats["over_budget"] == 1
+
+
+def test_at_least_one_face_refreshed_when_budget_tiny(clock):
+    budget = FrameBudget(budget_ms=1.0)
+    swapper = FakeSwapper(clock, cost_ms=8.0)
+    jobs = make_jobs([100, 90, 80])
+    run_frame(budget, swapper, jobs)
+    swapped, pasted = run_frame(budget, swapper, jobs)
+    assert len(swapped) == 1 and len(pasted) == 2
+
+
+def test_disabled_refreshes_everything(clock):
+    budget = FrameBudget(budget_ms=1.0, enabled=False)
+    swapper = FakeSwapper(clock, cost_ms=8.0)
+    jobs = make_jobs([100, 90, 80])
+    for _ in range(3):
+        assert run_frame(budget, swapper, jobs) == ([0, 1, 2], [])
+    assert budget.stats["deferred"] == 0
+
+
+def test_parallel_limit_from_measured_cost(clock):
+    budget = FrameBudget(budget_ms=20.0)
+    swapper = FakeSwapper(clock, cost_ms=30.0)
+    jobs = make_jobs([100, 98, 96, 94])
+    run_frame(budget, swapper, jobs, executor=object())
+    # 4 张并行共 30ms，折合每张 7.5ms，预算内可以刷新两张
+    assert budget.cost_ms == 7.5
+    swapped, pasted = run_frame(budget, swapper, jobs, executor=object())
+    assert swapped == [0, 1] and pasted == [2, 3]
+    swapped, pasted = run_frame(budget, swapper, jobs, executor=object())
+    assert swapped == [2, 3] and pasted == [0, 1]
@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from frame_result import FrameFaces, compute_embeddings, detect_faces
+from stub_models import stub_face_analysis
+
+
+def two_faces():
+    dets = [[10, 20, 50, 70, 0.9], [100, 40, 160, 120, 0.8]]
+    kpss = np.arange(20, dtype=np.float32).reshape(2, 5, 2)
+    return FrameFaces.from_detections(dets, kpss)
+
+
+def test_from_detections_stacks_arrays():
+    faces = two_faces()
+    assert len(faces) == 2
+    assert faces.bboxes.shape == (2, 4) and faces.bboxes.dtype == np.float32
+    np.testing.assert_array_equal(faces.scores, np.float32([0.9, 0.8]))
+    assert faces.kpss.shape == (2, 5, 2)
+    # 没有关键点时补零
+    assert FrameFaces.from_detections(np.zeros((3, 5)), None).kpss.shape == (3, 5, 2)
+    empty = FrameFaces.empty()
+    assert len(empty) == 0 and list(empty) == [] and empty.hit_test(0, 0) == -1
+
+
+def test_views_index_into_stacked_arrays():
+    faces = two_faces()
+    second = faces[1]
+    np.testing.assert_array_equal(second.bbox, [100, 40, 160, 120])
+    np.testing.assert_array_equal(second.kps, faces.kpss[1])
+    assert second.det_score == pytest.approx(0.8)
+    assert faces[-1].index == 1
+    assert [face.index for face in faces] == [0, 1]
+    with pytest.raises(IndexError):
+        faces[2]
+    # 视图不复制数据，修改数组后立即可见
+    faces.bboxes[1, 0] = 99
+    assert second.bbox[0] == 99
+    assert second.landmark_2d_106 is None and second.embedding is None and second.normed_embedding is None
+
+
+def test_hit_test_returns_first_containing_face():
+    faces = two_faces()
+    assert faces.hit_test(30, 30) == 0
+    assert faces.hit_test(160, 120) == 1
+    assert faces.hit_test(80, 30) == -1
+
+
+def test_embeddings_computed_on_demand_per_row():
+    app = stub_face_analysis()
+    img = np.zeros((128, 128, 3), dtype=np.uint8)
+    kps = np.float32([[50, 55], [78, 55], [64, 70], [52, 85], [76, 85]])
+    faces = FrameFaces.from_detections(np.tile([[40, 40, 90, 100, 0.9]], (3, 1)), np.tile(kps, (3, 1, 1)))
+    rec = app.models["recognition"]
+
+    compute_embeddings(app, img, faces, indices=[1])
+    assert faces.embedded.tolist() == [False, True, False]
+    assert faces[0].embedding is None
+    assert faces[1].normed_embedding == pytest.approx(np.full(512, 1 / np.sqrt(512)))
+    # 已计算的行不再送入识别模型，其余行一批计算
+    compute_embeddings(app, img, faces)
+    assert rec.session.runs == 2
+    assert faces.embedded.all()
+    compute_embeddings(app, img, faces)
+    assert rec.session.runs == 2
+
+
+def test_service_client_paths():
+    calls = []
+
+    def embed(img, kpss):
+        calls.append(len(kpss))
+        return np.ones((len(kpss), 4), dtype=np.float32)
+
+    # 推理服务客户端没有 det_model，检测和识别都交给服务端
+    client = SimpleNamespace(detect=lambda img, max_num=0: (np.array([[0, 0, 10, 10, 0.9]]), np.zeros((1, 5, 2))),
+                             embed=embed)
+    faces = detect_faces(client, None)
+    assert len(faces) == 1
+    compute_embeddings(client, None, faces)
+    assert calls == [1] and faces.embeddings.shape == (1, 4)
@@ -0,0 +1,97 @@
+import cv2
+import numpy as np
+import pytest
+
+from frame_sources import ImageSequenceSource, StreamSource, open_source
+
+
+def write_sequence(directory, count, broken=()):
+    """第 i 张图片的像素值为 10*i，便于从画面判断读到的是哪一帧；broken 中的下标写成读不出的文件"""
+    for i in range(count):
+        path = directory / f"{i:04d}.png"
+        if i in broken:
+            path.write_bytes(b"not an image")
+        else:
+            cv2.imwrite(str(path), np.full((8, 8, 3), 10 * i, dtype=np.uint8))
+
+
+def frame_id(frame):
+    return int(frame[0, 0, 0]) // 10
+
+
+def read_all(source):
+    frames = []
+    while True:
+        ok, frame = source.read()
+        if not ok:
+            return frames
+        frames.append((source.position, frame_id(frame)))
+
+
+def test_reads_in_order_and_eof_closes(tmp_path):
+    write_sequence(tmp_path, 5)
+    source = open_source(str(tmp_path), prefetch=2)
+    assert isinstance(source, ImageSequenceSource)
+    assert source.frame_count == 5 and not source.realtime
+    assert read_all(source) == [(i, i) for i in range(5)]
+    assert not source.isOpened()
+    assert source.stats["decoded"] == 5
+    source.release()
+
+
+def test_seek_discards_prefetched_frames(tmp_path):
+    write_sequence(tmp_path, 10)
+    source = ImageSequenceSource(str(tmp_path), prefetch=4)
+    ok, frame = source.read()
+    assert ok and frame_id(frame) == 0
+    source.seek(7)
+    assert read_all(source) == [(7, 7), (8, 8), (9, 9)]
+    # 播放完毕后仍可以跳回去继续读
+    source.seek(2)
+    assert source.isOpened()
+    ok, frame = source.read()
+    assert ok and frame_id(frame) == 2 and source.position == 2
+    source.release()
+
+
+def test_loop_wraps_to_first_frame(tmp_path):
+    write_sequence(tmp_path, 3)
+    source = ImageSequenceSource(str(tmp_path), prefetch=2, loop=True)
+    ids = []
+    for _ in range(7):
+        ok, frame = source.read()
+        assert ok
+        ids.append(frame_id(frame))
+    assert ids == [0, 1, 2, 0, 1, 2, 0]
+    assert source.isOpened()
+    source.release()
+
+
+def test_unreadable_files_do_not_shift_positions(tmp_path):
+    write_sequence(tmp_path, 6, broken=(1, 2))
+    source = ImageSequenceSource(str(tmp_path), prefetch=2)
+    assert read_all(source) == [(0, 0), (3, 3), (4, 4), (5, 5)]
+    source.seek(4)
+    ok, frame = source.read()
+    assert ok and source.position == 4 and frame_id(frame) == 4
+    source.release()
+
+
+def test_stream_source_closes_at_end(tmp_path):
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (32, 32))
+    if not writer.isOpened():
+        pytest.skip("OpenCV 不支持写入 MJPG")
+    for i in range(3):
+        writer.write(np.full((32, 32, 3), 50 * i, dtype=np.uint8))
+    writer.release()
+
+    source = StreamSource(path)
+    assert source.isOpened()
+    frames = 0
+    while source.isOpened():
+        ok, _ = source.read()
+        frames += ok
+    assert 1 <= frames <= 3
+    assert source.read() == (False, None)
+    source.release()
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from gpu_pipeline import GpuFramePipeline
+from stub_models import stub_detector, stub_swapper
+
+
+@pytest.fixture
+def pipeline():
+    app = SimpleNamespace(det_model=stub_detector())
+    return GpuFramePipeline(app, stub_swapper(), use_cuda=True)
+
+
+def latent():
+    return np.full((1, 512), 1.0 / np.sqrt(512), dtype=np.float32)
+
+
+def test_cpu_fallback_has_no_host_device_transfers(pipeline):
+    assert pipeline.backend == "cpu"
+    frame = np.zeros((128, 128, 3), dtype=np.uint8)
+    for _ in range(3):
+        output, dets, kpss = pipeline.process(frame, latent())
+        assert len(dets) == 1
+        assert output[64, 64].min() > 200
+    assert pipeline.stats["frames"] == 3
+    assert pipeline.stats["uploads"] == pipeline.stats["downloads"] == 0
+    assert pipeline.stats["upload_bytes"] == pipeline.stats["download_bytes"] == 0
+    # 每帧一次检测、每张人脸一次换脸推理
+    assert pipeline.app.det_model.session.runs == 3
+    assert pipeline.swapper.session.runs == 3
+
+
+def test_cuda_failure_falls_back_once_then_stays_on_cpu(pipeline):
+    # 强制走 CUDA 路径：没有 CUDA 版 OpenCV 时第一次上传就失败，应切换到CPU并给出同样的结果
+    pipeline.use_cuda = True
+    frame = np.zeros((128, 128, 3), dtype=np.uint8)
+    output, dets, _ = pipeline.process(frame, latent())
+    assert pipeline.backend == "cpu"
+    assert pipeline.stats["fallbacks"] == 1
+    assert len(dets) == 1
+    assert output[64, 64].min() > 200
+
+    pipeline.process(frame, latent())
+    assert pipeline.stats["fallbacks"] == 1
+    assert pipeline.stats["uploads"] == pipeline.stats["downloads"] == 0
+
+
+def test_warm_up_resets_transfer_counters(pipeline):
+    pipeline.warm_up(frame_size=(128, 128))
+    assert all(value == 0 for key, value in pipeline.stats.items() if key != "fallbacks")
@@ -0,0 +1,57 @@
+"""冷启动导入预算：界面模块和离线工具在导入时不能加载推理、音频等重量级依赖
+
+在子进程里导入，排除本进程已加载模块的影响。PyQt5 不一定安装，用空壳模块代替；
+重量级模块在导入时直接报错，哪个模块在顶层引用了它们会一目了然。
+"""
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("insightface", "onnxruntime", "pyaudio", "scipy", "cupy")
+# numpy + cv2 本身约零点几秒，其余项目模块应当可以忽略
+IMPORT_BUDGET_SECONDS = 3.0
+
+SCRIPT = textwrap.dedent("""
+    import importlib.abc
+    import sys
+    import time
+    import types
+
+    HEAVY = {heavy!r}
+
+    class BlockHeavy(importlib.abc.MetaPathFinder):
+        def find_spec(self, name, path=None, target=None):
+            if name.split(".")[0] in HEAVY:
+                raise ImportError(f"导入时不应加载 {{name}}")
+            return None
+
+    class QtStub(types.ModuleType):
+        def __getattr__(self, name):
+            stub = type(name, (), {{"__init__": lambda self, *args, **kwargs: None}})
+            setattr(self, name, stub)
+            return stub
+
+    try:
+        import PyQt5  # noqa: F401
+    except ImportError:
+        for name in ("PyQt5", "PyQt5.QtWidgets", "PyQt5.QtCore", "PyQt5.QtGui"):
+            sys.modules[name] = QtStub(name)
+
+    import cv2, numpy  # noqa: E401,F401  基础依赖不计入预算
+    sys.meta_path.insert(0, BlockHeavy())
+    start = time.perf_counter()
+    import {module}
+    print(time.perf_counter() - start)
+""")
+
+
+@pytest.mark.parametrize("module", ["swapper_gui", "render_session", "tiled_detector", "inference_service"])
+def test_import_stays_within_budget_without_heavy_dependencies(module):
+    script = SCRIPT.format(heavy=HEAVY_MODULES, module=module)
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert float(result.stdout.strip().splitlines()[-1]) < IMPORT_BUDGET_SECONDS
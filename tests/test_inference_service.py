@@ -0,0 +1,97 @@
+import socket
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import inference_service
+import runtime_profile
+from stub_models import stub_face_analysis, stub_swapper
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="需要 Unix 套接字")
+
+
+@pytest.fixture
+def stub_models(monkeypatch):
+    monkeypatch.setattr(runtime_profile, "create_face_analysis", lambda *args, **kwargs: stub_face_analysis())
+    monkeypatch.setattr(runtime_profile, "load_model", lambda *args, **kwargs: stub_swapper())
+
+
+@pytest.fixture
+def running_service(stub_models, tmp_path):
+    address = str(tmp_path / "inference.sock")
+    service = inference_service.InferenceService({}, "inswapper_128.onnx", det_size=(128, 128), window_ms=200)
+    server = service.create_server(address)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield service, address
+    server.shutdown()
+    server.server_close()
+
+
+def test_round_trip_detect_embed_swap(running_service):
+    service, address = running_service
+    app, swapper = inference_service.connect(address)
+    frame = np.zeros((256, 256, 3), dtype=np.uint8)
+
+    # 检测输入是缩小一半的 letterbox 图，坐标应还原到原图的 (128, 128) 附近
+    dets, kpss = app.detect(frame)
+    assert len(dets) == 1
+    assert np.allclose((dets[0, :2] + dets[0, 2:4]) / 2, (128, 128), atol=2)
+
+    embeddings = app.embed(frame, kpss)
+    assert embeddings.shape == (1, 512)
+
+    source = SimpleNamespace(normed_embedding=embeddings[0] / np.linalg.norm(embeddings[0]))
+    output = swapper.get(frame, SimpleNamespace(kps=kpss[0]), source)
+    assert output[128, 128].min() > 200
+    app.client.close()
+
+
+def test_concurrent_clients_are_batched(running_service):
+    service, address = running_service
+    crops = np.zeros((1, 128, 128, 3), dtype=np.uint8)
+    latents = np.full((1, 512), 1.0 / np.sqrt(512), dtype=np.float32)
+    clients = [inference_service.InferenceClient(address) for _ in range(2)]
+    barrier = threading.Barrier(2)
+    results = []
+
+    def swap(client):
+        barrier.wait(timeout=5)
+        results.append(client.swap(crops, latents))
+
+    threads = [threading.Thread(target=swap, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    assert len(results) == 2 and all(r.shape == (1, 128, 128, 3) for r in results)
+    stats = clients[0].stats()["swap"]
+    assert stats["requests"] == 2
+    assert stats["batches"] == 1
+    for client in clients:
+        client.close()
+
+
+def test_second_service_refuses_to_take_over_live_socket(running_service, stub_models):
+    _, address = running_service
+    other = inference_service.InferenceService({}, "inswapper_128.onnx", det_size=(128, 128))
+    with pytest.raises(RuntimeError):
+        other.create_server(address)
+    # 原服务仍然可用
+    assert inference_service.service_running(address)
+    client = inference_service.InferenceClient(address)
+    assert "detect" in client.stats()
+    client.close()
+
+
+def test_stale_socket_file_is_replaced(stub_models, tmp_path):
+    address = str(tmp_path / "stale.sock")
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(address)
+    stale.close()
+    assert not inference_service.service_running(address)
+    service = inference_service.InferenceService({}, "inswapper_128.onnx", det_size=(128, 128))
+    server = service.create_server(address)
+    server.server_close()
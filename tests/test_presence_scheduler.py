@@ -0,0 +1,83 @@
+import numpy as np
+
+from presence_scheduler import PresenceScheduler
+
+STILL = np.zeros((120, 160, 3), dtype=np.uint8)
+MOVED = np.full((120, 160, 3), 200, dtype=np.uint8)
+
+
+def go_idle(scheduler, now=0.0):
+    for i in range(scheduler.idle_after):
+        assert scheduler.plan(STILL, now=now + i * 0.03) == (True, None)
+        scheduler.update(False)
+    assert scheduler.mode == "idle"
+
+
+def test_active_until_idle_after_empty_frames():
+    scheduler = PresenceScheduler(idle_after=5)
+    for i in range(4):
+        scheduler.plan(STILL, now=i * 0.03)
+        scheduler.update(False)
+    assert scheduler.mode == "active"
+    # 中途出现人脸会重新计数
+    scheduler.update(True)
+    for i in range(4):
+        scheduler.update(False)
+    assert scheduler.mode == "active"
+    scheduler.update(False)
+    assert scheduler.mode == "idle"
+
+
+def test_idle_rate_limit_and_small_input():
+    scheduler = PresenceScheduler(idle_after=3, idle_interval=0.25, motion_gating=False)
+    go_idle(scheduler)
+    # 进入待机后第一帧立即检测，之后每 idle_interval 秒最多一次
+    assert scheduler.plan(STILL, now=1.0) == (True, (160, 160))
+    assert scheduler.plan(STILL, now=1.1) == (False, None)
+    assert scheduler.plan(STILL, now=1.3) == (True, (160, 160))
+    assert scheduler.stats["rate_skips"] == 1
+    assert scheduler.stats["idle_detections"] == 2
+
+
+def test_motion_gating_skips_static_frames_until_max_gap():
+    scheduler = PresenceScheduler(idle_after=3, idle_interval=0.25, max_idle_gap=2.0)
+    go_idle(scheduler)
+    assert scheduler.plan(STILL, now=1.0)[0]
+    assert not scheduler.plan(STILL, now=1.5)[0]
+    assert scheduler.stats["motion_skips"] == 1
+    # 画面变化立即检测
+    assert scheduler.plan(MOVED, now=1.8)[0]
+    # 静止画面最长 max_idle_gap 秒也会检测一次
+    assert not scheduler.plan(MOVED, now=3.0)[0]
+    assert scheduler.plan(MOVED, now=3.9)[0]
+
+
+def test_wakeup_on_face_returns_to_active():
+    scheduler = PresenceScheduler(idle_after=3)
+    go_idle(scheduler)
+    assert scheduler.plan(MOVED, now=1.0)[0]
+    assert scheduler.update(True) is True
+    assert scheduler.mode == "active"
+    assert scheduler.stats["wakeups"] == 1
+    assert scheduler.plan(STILL, now=1.01) == (True, None)
+    assert scheduler.update(True) is False
+
+
+def test_disabled_always_detects_and_time_is_accounted():
+    scheduler = PresenceScheduler(enabled=False, idle_after=1)
+    for i in range(3):
+        assert scheduler.plan(STILL, now=float(i)) == (True, None)
+        scheduler.update(False)
+    assert scheduler.mode == "active"
+    assert scheduler.stats["active_seconds"] == 2.0
+
+    # 两次调用之间的时间计入这段时间所处的状态
+    scheduler = PresenceScheduler(idle_after=2, motion_gating=False)
+    scheduler.plan(STILL, now=0.0)
+    scheduler.update(False)
+    scheduler.plan(STILL, now=10.0)
+    scheduler.update(False)
+    scheduler.plan(STILL, now=40.0)
+    assert scheduler.stats["active_seconds"] == 10.0
+    assert scheduler.stats["idle_seconds"] == 30.0
+    assert "待机 30s (75%)" in scheduler.summary()
@@ -0,0 +1,106 @@
+import base64
+import http.client
+import os
+import socket
+import struct
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from preview_server import BOUNDARY, PreviewServer
+
+
+@pytest.fixture
+def server():
+    preview = PreviewServer(port=0, max_fps=0)
+    preview.start()
+    yield preview
+    preview.stop()
+
+
+def sample_frame():
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    frame[:, :32] = (0, 0, 255)
+    return frame
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def decode(jpeg):
+    img = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+    assert img is not None and img.shape == (48, 64, 3)
+    # 左半边红色、右半边黑色
+    assert img[24, 8, 2] > 200 and img[24, 56].max() < 50
+    return img
+
+
+def read_mjpeg_part(response):
+    assert response.readline().strip() == f"--{BOUNDARY}".encode("ascii")
+    headers = {}
+    while True:
+        line = response.readline().strip()
+        if not line:
+            break
+        key, value = line.decode("ascii").split(":", 1)
+        headers[key.lower()] = value.strip()
+    assert headers["content-type"] == "image/jpeg"
+    return response.read(int(headers["content-length"]))
+
+
+def test_snapshot_before_any_frame_is_unavailable(server):
+    conn = http.client.HTTPConnection(server.host, server.port, timeout=5)
+    conn.request("GET", "/snapshot.jpg")
+    assert conn.getresponse().status == 503
+
+
+def test_mjpeg_and_snapshot_serve_submitted_frame(server):
+    conn = http.client.HTTPConnection(server.host, server.port, timeout=5)
+    conn.request("GET", "/stream.mjpg")
+    response = conn.getresponse()
+    assert response.status == 200
+    assert BOUNDARY in response.getheader("Content-Type")
+
+    # 没有观看者时不编码，等流连接登记后再提交
+    assert wait_for(lambda: server.viewer_count == 1)
+    server.submit(sample_frame())
+    decode(read_mjpeg_part(response))
+
+    snapshot = http.client.HTTPConnection(server.host, server.port, timeout=5)
+    snapshot.request("GET", "/snapshot.jpg")
+    reply = snapshot.getresponse()
+    assert reply.status == 200
+    decode(reply.read())
+    assert server.stats["encoded"] == 1
+    conn.close()
+
+
+def test_websocket_receives_binary_jpeg(server):
+    sock = socket.create_connection((server.host, server.port), timeout=5)
+    key = base64.b64encode(os.urandom(16)).decode("ascii")
+    sock.sendall((f"GET /ws HTTP/1.1\r\nHost: {server.host}\r\nUpgrade: websocket\r\n"
+                  f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n")
+                 .encode("ascii"))
+    stream = sock.makefile("rb")
+    assert b" 101 " in stream.readline()
+    while stream.readline().strip():
+        pass
+
+    assert wait_for(lambda: server.viewer_count == 1)
+    server.submit(sample_frame())
+    opcode, length = stream.read(2)
+    assert opcode == 0x82
+    if length == 126:
+        length = struct.unpack("!H", stream.read(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", stream.read(8))[0]
+    decode(stream.read(length))
+    sock.close()
@@ -0,0 +1,26 @@
+import pytest
+
+from render_session import output_schedule
+
+
+def test_output_fps_follows_recorded_timestamps():
+    # 名义 30fps，实际只处理了 10fps
+    records = [{"t": i * 0.1} for i in range(21)]
+    fps, repeats = output_schedule(records, 30.0)
+    assert fps == pytest.approx(10.0)
+    assert repeats == [1] * 21
+
+
+def test_uneven_timing_duplicates_and_drops_frames():
+    records = [{"t": t} for t in (0.0, 0.1, 0.4, 0.41, 0.5)]
+    fps, repeats = output_schedule(records, 30.0)
+    assert fps == pytest.approx(8.0)
+    # 0.1→0.4 的停顿补一帧，0.41 与 0.4 落在同一输出帧被丢弃
+    assert repeats == [1, 1, 2, 0, 1]
+    assert sum(repeats) == len(records)
+
+
+def test_missing_timestamps_fall_back_to_header_fps():
+    fps, repeats = output_schedule([{"t": 0.0}, {}], 25.0)
+    assert fps == 25.0
+    assert repeats == [1, 1]
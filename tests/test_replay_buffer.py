@@ -0,0 +1,111 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import replay_buffer
+from replay_buffer import ReplayBuffer
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(replay_buffer.time, "monotonic", clock)
+    return clock
+
+
+def noise(seed, shape=(48, 64, 3)):
+    return np.random.default_rng(seed).integers(0, 256, shape, dtype=np.uint8)
+
+
+def feed(buffer, clock, times):
+    """按给定时刻逐帧提交，每帧等编码线程处理完再提交下一帧，避免因编码忙被跳过"""
+    for i, t in enumerate(times):
+        clock.now = 100.0 + t
+        encoded = buffer._encoded
+        buffer.submit(noise(i))
+        deadline = time.monotonic() + 5
+        # 被限速丢弃的帧不会入队，不用等
+        while buffer._last_submit == clock.now and buffer._encoded == encoded and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+
+def test_old_frames_evicted_by_duration(clock):
+    buffer = ReplayBuffer(seconds=1.0, fps=100)
+    feed(buffer, clock, [i * 0.125 for i in range(17)])
+    stats = buffer.stats
+    # 保留最新一帧之前 1 秒内的帧：1.0 ~ 2.0 秒共 9 帧
+    assert stats["frames"] == 9
+    assert stats["seconds"] == 1.0
+    assert [t for t, _ in buffer._frames][0] == 101.0
+    buffer.close()
+
+
+def test_memory_cap_evicts_oldest(clock):
+    size = len(cv2.imencode(".jpg", noise(0), [cv2.IMWRITE_JPEG_QUALITY, 80])[1])
+    buffer = ReplayBuffer(seconds=60.0, fps=100, max_mb=3.5 * size / (1024 * 1024))
+    feed(buffer, clock, [i * 0.125 for i in range(10)])
+    assert 2 <= buffer.stats["frames"] <= 4
+    assert buffer._bytes <= buffer.max_bytes
+    assert buffer._bytes == sum(len(data) for _, data in buffer._frames)
+    # 留下的是最新的帧
+    assert buffer._frames[-1][0] == clock.now
+    buffer.close()
+
+
+def test_rate_limit_and_disabled(clock):
+    buffer = ReplayBuffer(fps=4)
+    feed(buffer, clock, [0.0, 0.1, 0.2, 0.25, 0.3, 0.5])
+    assert buffer.stats["frames"] == 3
+    buffer.enabled = False
+    feed(buffer, clock, [1.0, 2.0])
+    assert buffer.stats["frames"] == 3
+    buffer.clear()
+    assert buffer.stats["frames"] == 0 and buffer.stats["memory_mb"] == 0.0
+    buffer.close()
+
+
+def test_save_uses_buffered_timing(clock, monkeypatch, tmp_path):
+    written = []
+
+    class FakeEncoder:
+        def __init__(self, path, frame_size, fps):
+            self.frame_size, self.fps = frame_size, fps
+
+        def write(self, frame):
+            written.append(frame.shape)
+
+        def close(self):
+            pass
+
+    encoders = []
+
+    def create_encoder(path, frame_size, fps):
+        encoders.append(FakeEncoder(path, frame_size, fps))
+        return encoders[-1]
+
+    monkeypatch.setattr(replay_buffer, "create_encoder", create_encoder)
+    buffer = ReplayBuffer(fps=100, scale=0.5)
+    assert not buffer.save(str(tmp_path / "empty.mp4"))
+    feed(buffer, clock, [0.0, 0.25, 0.5, 0.75, 1.0])
+
+    done = threading.Event()
+    results = []
+    assert buffer.save(str(tmp_path / "replay.mp4"), lambda path, message: (results.append(message), done.set()))
+    assert done.wait(5)
+    assert results == ["5 帧，1.0 秒"]
+    # 帧率按实际缓存的帧数和时长换算，尺寸为缩放后的大小
+    assert encoders[0].fps == 4.0 and encoders[0].frame_size == (32, 24)
+    assert written == [(24, 32, 3)] * 5
+    assert not buffer.saving
+    buffer.close()
@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+from roi_detector import RoiDetector
+
+
+class SquareDetector:
+    """把白色方块当作人脸的检测器替身，记录每次调用的输入大小和检测尺寸"""
+
+    def __init__(self):
+        self.calls = []
+
+    def detect(self, img, input_size=None, max_num=0, metric="default"):
+        self.calls.append((img.shape[:2], input_size))
+        count, _, stats, _ = cv2.connectedComponentsWithStats((img[:, :, 0] > 200).astype(np.uint8))
+        dets = np.array([[x, y, x + w, y + h, 0.9] for x, y, w, h, _ in stats[1:]], dtype=np.float32).reshape(-1, 5)
+        kpss = np.repeat(((dets[:, :2] + dets[:, 2:4]) / 2)[:, None], 5, axis=1)
+        return dets, kpss
+
+
+def frame_with_faces(boxes, size=(480, 640)):
+    img = np.zeros(size + (3,), dtype=np.uint8)
+    for x0, y0, x1, y1 in boxes:
+        img[y0:y1, x0:x1] = 255
+    return img
+
+
+@pytest.fixture
+def detector():
+    return RoiDetector(SimpleNamespace(det_model=SquareDetector()), margin=1.0, full_interval=3)
+
+
+def test_regions_expand_clip_and_merge(detector):
+    regions = detector.regions([[100, 100, 140, 140], [600, 440, 620, 460]], 640, 480)
+    # 向四周扩展一倍边长，越界的部分裁掉
+    assert regions == [(60, 60, 180, 180, 40.0), (580, 420, 640, 480, 20.0)]
+    merged = detector.regions([[100, 100, 140, 140], [170, 100, 190, 120]], 640, 480)
+    assert merged == [(60, 60, 210, 180, 20.0)]
+
+
+def test_roi_scan_maps_detections_back_to_frame(detector):
+    boxes = [(100, 100, 140, 140), (400, 300, 420, 320)]
+    img = frame_with_faces(boxes)
+    full = detector.detect(img, np.zeros((0, 4)))
+    assert detector.stats["full_scans"] == 1 and len(full) == 2
+
+    det_model = detector.app.det_model
+    det_model.calls.clear()
+    faces = detector.detect(img, full.bboxes)
+    assert detector.stats["roi_scans"] == 1
+    np.testing.assert_allclose(np.sort(faces.bboxes, axis=0), np.sort(np.array(boxes, dtype=np.float32), axis=0))
+    np.testing.assert_allclose(faces.kpss[:, 0], (faces.bboxes[:, :2] + faces.bboxes[:, 2:]) / 2)
+    # 每个区域单独检测，小脸所在区域按人脸大小放大检测输入
+    assert [shape for shape, _ in det_model.calls] == [(120, 120), (60, 60)]
+    assert all(size[0] >= 96 and size[0] % 32 == 0 for _, size in det_model.calls)
+
+
+def test_periodic_full_scan(detector):
+    img = frame_with_faces([(100, 100, 140, 140)])
+    bboxes = detector.detect(img, np.zeros((0, 4))).bboxes
+    for _ in range(6):
+        bboxes = detector.detect(img, bboxes).bboxes
+    # full_interval=3：每3次区域检测后做一次全图检测
+    assert detector.stats["full_scans"] == 2
+    assert detector.stats["roi_scans"] == 5
+
+
+def test_lost_face_triggers_full_scan(detector):
+    img = frame_with_faces([(100, 100, 140, 140), (400, 300, 420, 320)])
+    bboxes = detector.detect(img, np.zeros((0, 4))).bboxes
+    # 第二个人离开了，区域检测少了一张脸
+    gone = frame_with_faces([(100, 100, 140, 140)])
+    assert len(detector.detect(gone, bboxes)) == 1
+    assert detector.stats["full_scans"] == 1
+    detector.detect(gone, bboxes[:1])
+    assert detector.stats["full_scans"] == 2
+
+    # 区域里一张脸也没找到时返回空结果，下一帧也做全图检测
+    empty = frame_with_faces([])
+    bboxes = detector.detect(img, np.zeros((0, 4))).bboxes
+    assert len(detector.detect(empty, bboxes)) == 0
+    detector.detect(img, bboxes)
+    assert detector.stats["full_scans"] == 4
+
+
+def test_disabled_or_service_client_always_full_scan():
+    img = frame_with_faces([(100, 100, 140, 140)])
+    bboxes = np.array([[100, 100, 140, 140]], dtype=np.float32)
+    disabled = RoiDetector(SimpleNamespace(det_model=SquareDetector()), enabled=False)
+    for _ in range(3):
+        disabled.detect(img, bboxes)
+    assert disabled.stats == {"full_scans": 3, "roi_scans": 0, "regions": 0}
+
+    client = SimpleNamespace(detect=lambda img, max_num=0: SquareDetector().detect(img))
+    service = RoiDetector(client)
+    assert len(service.detect(img, bboxes)) == 1
+    assert service.stats["full_scans"] == 1
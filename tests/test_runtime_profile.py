@@ -0,0 +1,157 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import runtime_profile
+from stub_models import stub_face_analysis, stub_swapper
+
+
+def write_profile(tmp_path, data):
+    path = tmp_path / "profile.json"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return str(path)
+
+
+def test_missing_file_uses_defaults(tmp_path):
+    profile = runtime_profile.load_profile(str(tmp_path / "none.json"), default_providers=["CUDAExecutionProvider"])
+    assert profile["providers"] == ["CUDAExecutionProvider"]
+    assert profile["session"] == runtime_profile.DEFAULT_PROFILE["session"]
+    # 返回的是副本，修改不影响默认值
+    profile["session"]["intra_op_num_threads"] = 3
+    assert runtime_profile.DEFAULT_PROFILE["session"]["intra_op_num_threads"] == 0
+
+
+def test_file_merges_nested_settings(tmp_path, monkeypatch):
+    path = write_profile(tmp_path, {
+        "providers": ["CPUExecutionProvider"],
+        "session": {"intra_op_num_threads": 2},
+        "swap_cache": {"threshold": 5.0},
+    })
+    monkeypatch.setenv("SWAPPER_RUNTIME_PROFILE", path)
+    profile = runtime_profile.load_profile(default_providers=["CUDAExecutionProvider", "CPUExecutionProvider"])
+    # 列表整体替换，字典逐项合并
+    assert profile["providers"] == ["CPUExecutionProvider"]
+    assert profile["session"]["intra_op_num_threads"] == 2
+    assert profile["session"]["graph_optimization_level"] == "all"
+    assert profile["swap_cache"] == {"enabled": True, "threshold": 5.0, "max_age": 8}
+
+
+def test_model_override_applies_only_to_that_model(tmp_path):
+    path = write_profile(tmp_path, {
+        "session": {"intra_op_num_threads": 4},
+        "models": {"inswapper_128": {"precision": "fp16", "session": {"intra_op_num_threads": 6}}},
+    })
+    profile = runtime_profile.load_profile(path)
+    swapper = runtime_profile.model_profile(profile, "./models/inswapper_128.onnx")
+    assert swapper["precision"] == "fp16"
+    assert swapper["session"]["intra_op_num_threads"] == 6
+    assert swapper["session"]["execution_mode"] == "sequential"
+    assert "models" not in swapper
+    detector = runtime_profile.model_profile(profile, "/root/.insightface/models/buffalo_l/det_10g.onnx")
+    assert detector["precision"] == "fp32"
+    assert detector["session"]["intra_op_num_threads"] == 4
+    assert profile["session"]["intra_op_num_threads"] == 4
+
+
+def test_example_profile_is_valid():
+    path = os.path.join(os.path.dirname(__file__), "..", "runtime_profile.example.json")
+    profile = runtime_profile.load_profile(path)
+    runtime_profile.validate_profile(profile)
+
+
+@pytest.mark.parametrize("data, message", [
+    ({"precision": "int4"}, "precision"),
+    ({"providers": "CUDAExecutionProvider"}, "providers"),
+    ({"session": {"execution_mode": "parralel"}}, "session.execution_mode"),
+    ({"models": {"det_10g": {"session": {"graph_optimization_level": "max"}}}},
+     "models.det_10g.session.graph_optimization_level"),
+    ({"models": {"inswapper_128": {"precision": "int8"}}}, "models.inswapper_128.precision"),
+])
+def test_invalid_values_rejected_on_load(tmp_path, data, message):
+    path = write_profile(tmp_path, data)
+    with pytest.raises(ValueError, match=message) as info:
+        runtime_profile.load_profile(path)
+    assert path in str(info.value)
+
+
+def variant_profile(tmp_path, **overrides):
+    profile = runtime_profile.load_profile(str(tmp_path / "none.json"))
+    profile["variant_dir"] = str(tmp_path / "variants")
+    profile.update(overrides)
+    return profile
+
+
+def resolve(profile, model_file):
+    # 与 create_session 相同：先合并该模型的覆盖设置，再选择文件
+    return runtime_profile.resolve_model_file(runtime_profile.model_profile(profile, model_file), model_file)
+
+
+def test_variant_path_naming():
+    path = runtime_profile.variant_path("out", "./models/inswapper_128.onnx", "int8_static")
+    assert path == os.path.join("out", "inswapper_128.int8_static.onnx")
+
+
+def test_existing_variant_is_used(tmp_path):
+    model_file = str(tmp_path / "inswapper_128.onnx")
+    profile = variant_profile(tmp_path, precision="fp16")
+    variant = runtime_profile.variant_path(profile["variant_dir"], model_file, "fp16")
+    os.makedirs(profile["variant_dir"])
+    open(variant, "wb").close()
+    assert resolve(profile, model_file) == variant
+    assert resolve(variant_profile(tmp_path), model_file) == model_file
+
+
+def test_missing_variant_falls_back_to_fp32(tmp_path, capsys):
+    model_file = str(tmp_path / "det_10g.onnx")
+    profile = variant_profile(tmp_path, precision="int8_dynamic")
+    assert resolve(profile, model_file) == model_file
+    assert "int8_dynamic" in capsys.readouterr().out
+
+
+def test_precision_can_be_set_per_model(tmp_path):
+    profile = variant_profile(tmp_path, models={"w600k_r50": {"precision": "int8_static"}})
+    os.makedirs(profile["variant_dir"])
+    for name in ("w600k_r50", "det_10g"):
+        open(runtime_profile.variant_path(profile["variant_dir"], name + ".onnx", "int8_static"), "wb").close()
+    assert resolve(profile, "/m/w600k_r50.onnx").endswith("w600k_r50.int8_static.onnx")
+    assert resolve(profile, "/m/det_10g.onnx") == "/m/det_10g.onnx"
+
+
+def test_unknown_precision_rejected(tmp_path):
+    with pytest.raises(ValueError, match="int4"):
+        resolve(variant_profile(tmp_path, precision="int4"), "/m/det_10g.onnx")
+
+
+def test_optimized_cache_is_separate_per_variant(tmp_path):
+    profile = variant_profile(tmp_path)
+    profile["session"]["optimized_model_dir"] = str(tmp_path / "optimized")
+    providers = ["CPUExecutionProvider"]
+    fp32 = runtime_profile._optimized_path(profile, "/m/det_10g.onnx", providers)
+    fp16 = runtime_profile._optimized_path(profile, str(tmp_path / "variants" / "det_10g.fp16.onnx"), providers)
+    assert fp32 != fp16 and fp16.endswith("det_10g.fp16.cpu.all.onnx")
+    # 自带引擎缓存的执行器不再另存优化后的图
+    assert runtime_profile._optimized_path(profile, "/m/det_10g.onnx", ["TensorrtExecutionProvider"]) is None
+
+
+def test_warm_up_runs_every_session():
+    app = stub_face_analysis()
+    detect_calls = []
+    app.det_model.detect = lambda frame, max_num=0, metric="default": detect_calls.append(frame.shape)
+    swapper = stub_swapper()
+    # 预热喂的是按输入声明生成的全零张量，替身直接返回固定输出即可
+    swapper.session.outputs = [np.zeros((1, 3, 128, 128), dtype=np.float32)]
+    runtime_profile.warm_up(app, swapper, frame_size=(64, 96), runs=3)
+    assert detect_calls == [(64, 96, 3)] * 3
+    assert app.models["recognition"].session.runs == 3
+    assert swapper.session.runs == 3
+    # 检测模型只经由 detect 预热，不再重复跑会话
+    assert app.det_model.session.runs == 0
+
+
+def test_warm_up_without_swapper():
+    app = stub_face_analysis()
+    app.det_model.detect = lambda frame, max_num=0, metric="default": None
+    runtime_profile.warm_up(app, None, runs=1)
+    assert app.models["recognition"].session.runs == 1
@@ -0,0 +1,75 @@
+import threading
+
+import numpy as np
+
+import session_recorder
+from session_recorder import SessionRecorder, load_session
+
+
+class ListEncoder:
+    def __init__(self):
+        self.frames = []
+        self.closed = False
+
+    def write(self, frame):
+        self.frames.append(frame)
+        return True
+
+    def close(self):
+        self.closed = True
+
+
+def run_recorder(tmp_path, monkeypatch, create_encoder, frames=10):
+    monkeypatch.setattr(session_recorder, "create_encoder", create_encoder)
+    recorder = SessionRecorder(str(tmp_path / "session"), (32, 24))
+    finished = threading.Event()
+    messages = []
+    recorder.on_finished = lambda path, message: (messages.append(message), finished.set())
+    recorder.start()
+    frame = np.zeros((24, 32, 3), dtype=np.uint8)
+    for i in range(frames):
+        recorder.push(frame, {"index": i}, timestamp=recorder.start_time + i / 10)
+    stopper = threading.Thread(target=recorder.stop, daemon=True)
+    stopper.start()
+    stopper.join(2)
+    assert not stopper.is_alive(), "stop() 阻塞"
+    assert finished.wait(5), "结束回调没有被调用"
+    recorder.wait()
+    return recorder, messages[0]
+
+
+def test_frames_and_sidecar_stay_in_step(tmp_path, monkeypatch):
+    encoder = ListEncoder()
+    recorder, message = run_recorder(tmp_path, monkeypatch, lambda *args, **kwargs: encoder)
+    assert len(encoder.frames) == 10 and encoder.closed
+    header, records = load_session(recorder.directory)
+    assert header["frame_size"] == [32, 24]
+    assert [r["frame"] for r in records] == list(range(10))
+    assert [r["t"] for r in records] == [round(i / 10, 4) for i in range(10)]
+    assert message == "10 帧"
+
+
+def test_encoder_creation_failure_reports_and_does_not_block_stop(tmp_path, monkeypatch):
+    def create_encoder(*args, **kwargs):
+        raise OSError("ffmpeg not runnable")
+
+    # 超过队列容量，stop() 也必须立即返回
+    recorder, message = run_recorder(tmp_path, monkeypatch, create_encoder, frames=200)
+    assert "ffmpeg not runnable" in message
+    assert recorder.stats["frames"] == 0
+    assert recorder.stats["dropped"] > 0
+
+
+def test_unwritable_sidecar_reports_and_closes_encoder(tmp_path, monkeypatch):
+    encoder = ListEncoder()
+    real_open = open
+
+    def failing_open(path, *args, **kwargs):
+        if str(path).endswith(session_recorder.SIDECAR_FILE):
+            raise PermissionError("read-only")
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", failing_open)
+    _, message = run_recorder(tmp_path, monkeypatch, lambda *args, **kwargs: encoder)
+    assert "read-only" in message
+    assert encoder.closed
@@ -0,0 +1,108 @@
+import os
+import struct
+import subprocess
+import sys
+import uuid
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+import shm_output
+from shm_output import HEADER, SharedFramePublisher, SharedFrameReader
+
+
+@pytest.fixture
+def name(monkeypatch):
+    # 测试里读写端在同一进程，resource_tracker 按名字只登记一次，读端注销后发布端删除时会重复注销
+    monkeypatch.setattr(shm_output, "_untrack", lambda shm: None)
+    return f"swapper_test_{uuid.uuid4().hex[:8]}"
+
+
+def frame(value, shape=(48, 64, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_publish_read_round_trip(name):
+    publisher = SharedFramePublisher(name, max_shape=(48, 64, 3), slots=3)
+    reader = SharedFrameReader(name)
+    assert reader.read() is None
+
+    publisher.publish(frame(1), timestamp=12.5)
+    seq, timestamp, image = reader.read()
+    assert (seq, timestamp) == (1, 12.5)
+    np.testing.assert_array_equal(image, frame(1))
+    assert reader.read() is None
+
+    # 读端跟不上时只读最新一帧，跳过的帧计入统计；小于容量的帧按实际尺寸读出
+    publisher.publish(frame(2))
+    publisher.publish(frame(3, shape=(10, 20, 3)))
+    seq, _, image = reader.read()
+    assert seq == 3 and image.shape == (10, 20, 3) and (image == 3).all()
+    assert reader.stats == {"frames": 2, "skipped": 1, "torn": 0}
+
+    publisher.close()
+    assert reader.latest_seq == 0
+    reader.close()
+
+
+def test_reader_rejects_slot_being_written(name):
+    publisher = SharedFramePublisher(name, max_shape=(48, 64, 3), slots=2)
+    reader = SharedFrameReader(name)
+    publisher.publish(frame(1))
+    # 模拟写到一半：槽序号为奇数
+    header_offset = HEADER.size + 32 * (1 % publisher.slots)
+    struct.pack_into("<Q", publisher.shm.buf, header_offset, 1)
+    assert reader.read() is None
+    assert reader.stats["torn"] == 1
+    # 零拷贝视图在发布端绕回该槽后失效，valid() 可以事后发现
+    publisher.publish(frame(2))
+    view, _ = reader.view(2)
+    assert view is not None and reader.valid(2)
+    publisher.publish(frame(3))
+    publisher.publish(frame(4))
+    assert not reader.valid(2)
+    del view
+    reader.close()
+    publisher.close()
+
+
+def test_live_instance_is_not_destroyed(name):
+    publisher = SharedFramePublisher(name, max_shape=(48, 64, 3))
+    publisher.publish(frame(7))
+    with pytest.raises(RuntimeError, match=str(os.getpid())):
+        SharedFramePublisher(name, max_shape=(48, 64, 3))
+    reader = SharedFrameReader(name)
+    assert reader.read()[0] == 1
+    reader.close()
+    publisher.close()
+
+
+def test_stale_segment_is_replaced(name):
+    crashed = SharedFramePublisher(name, max_shape=(48, 64, 3))
+    crashed.publish(frame(1))
+    # 发布端进程已经不在（全局头第12字节起为发布端进程号）
+    struct.pack_into("<I", crashed.shm.buf, 12, dead_pid())
+    publisher = SharedFramePublisher(name, max_shape=(24, 32, 3))
+    crashed.shm.close()
+    crashed.shm = None
+    reader = SharedFrameReader(name)
+    assert reader.slot_capacity == 24 * 32 * 3 and reader.read() is None
+    reader.close()
+    publisher.close()
+
+
+def test_foreign_segment_is_refused(name):
+    foreign = shared_memory.SharedMemory(name=name, create=True, size=4096)
+    try:
+        with pytest.raises(RuntimeError, match="不是换脸程序"):
+            SharedFramePublisher(name, max_shape=(48, 64, 3))
+    finally:
+        foreign.close()
+        foreign.unlink()
@@ -0,0 +1,72 @@
+import os
+import threading
+
+import numpy as np
+
+import snapshot
+from snapshot import SnapshotWriter
+
+
+def stuck_encoder(monkeypatch):
+    """模拟磁盘或编码卡住，直到返回的事件被设置"""
+    release = threading.Event()
+    real_imencode = snapshot.cv2.imencode
+
+    def slow_imencode(*args, **kwargs):
+        release.wait(5)
+        return real_imencode(*args, **kwargs)
+
+    monkeypatch.setattr(snapshot.cv2, "imencode", slow_imencode)
+    return release
+
+
+def test_close_waits_for_pending_burst(tmp_path):
+    writer = SnapshotWriter(str(tmp_path), fmt="PNG", quality=100, interval=0.0)
+    writer.capture(count=5)
+    frame = np.random.default_rng(0).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+    for _ in range(5):
+        writer.offer(frame)
+    assert writer.close() == 0
+    assert writer.stats["saved"] == 5
+    assert len(os.listdir(tmp_path)) == 5
+
+
+def test_close_reports_unsaved_shots_on_timeout(tmp_path, monkeypatch):
+    release = stuck_encoder(monkeypatch)
+    writer = SnapshotWriter(str(tmp_path), interval=0.0)
+    writer.capture(count=3)
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    for _ in range(3):
+        writer.offer(frame)
+    assert writer.close(timeout=0.2) == 3
+    release.set()
+    writer._thread.join(5)
+    assert writer.stats["saved"] == 3
+
+
+def test_close_with_full_queue_and_stuck_disk_returns_within_timeout(tmp_path, monkeypatch):
+    release = stuck_encoder(monkeypatch)
+    writer = SnapshotWriter(str(tmp_path), interval=0.0, max_pending=3)
+    writer.capture(count=10)
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    for _ in range(10):
+        writer.offer(frame)
+    closer = threading.Thread(target=writer.close, kwargs={"timeout": 0.2}, daemon=True)
+    closer.start()
+    closer.join(2)
+    assert not closer.is_alive(), "close(timeout) 在队列已满时阻塞"
+    release.set()
+
+
+def test_back_to_back_captures_do_not_overwrite(tmp_path, monkeypatch):
+    # 时钟停在同一时刻，连续两次单张拍摄和一组连拍都要写成不同的文件
+    monkeypatch.setattr(snapshot.time, "time", lambda: 1700000000.123)
+    writer = SnapshotWriter(str(tmp_path), interval=0.0)
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    for count in (1, 1, 2, 2):
+        assert writer.capture(count=count)
+        for _ in range(count):
+            writer.offer(frame)
+    assert writer.close() == 0
+    assert writer.stats["saved"] == 6
+    assert len(os.listdir(tmp_path)) == 6
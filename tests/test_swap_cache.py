@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from stub_models import stub_swapper
+from swap_cache import CachedSwapper
+
+KPS = np.array([[100, 110], [156, 110], [128, 140], [106, 170], [150, 170]], dtype=np.float32)
+
+
+def textured(seed=0, size=256):
+    return np.random.default_rng(seed).integers(0, 256, (size, size, 3), dtype=np.uint8)
+
+
+def make_source():
+    return SimpleNamespace(latent=np.ones((1, 512), dtype=np.float32),
+                           normed_embedding=np.ones(512, dtype=np.float32) / np.sqrt(512))
+
+
+def swap(cache, img, source, key=0):
+    output = img.copy()
+    cache.swap(img, output, KPS, source, track_key=key)
+    return output
+
+
+def test_still_face_reuses_result_until_max_age():
+    swapper = stub_swapper()
+    cache = CachedSwapper(swapper, max_age=3)
+    img, source = textured(), make_source()
+    for _ in range(5):
+        swap(cache, img, source)
+    # 第1帧推理，随后3帧复用，第5帧复用次数到上限强制重新推理
+    assert swapper.session.runs == 2
+    assert cache.stats == {"hits": 3, "misses": 2, "deferred": 0}
+    assert cache.hit_rate == 0.6
+
+
+def test_reused_result_is_pasted_like_inference():
+    cache = CachedSwapper(stub_swapper())
+    img, source = textured(), make_source()
+    first = swap(cache, img, source)
+    second = swap(cache, img, source)
+    assert cache.stats["hits"] == 1
+    np.testing.assert_array_equal(first, second)
+    assert (first != img).any()
+
+
+def test_small_change_hits_and_large_change_misses():
+    swapper = stub_swapper()
+    cache = CachedSwapper(swapper, threshold=3.0)
+    img, source = textured(), make_source()
+    swap(cache, img, source)
+    noisy = np.clip(img.astype(np.int16) + 1, 0, 255).astype(np.uint8)
+    swap(cache, noisy, source)
+    assert swapper.session.runs == 1
+    swap(cache, 255 - img, source)
+    assert swapper.session.runs == 2
+
+
+def test_new_source_track_or_disabled_cache_invalidates():
+    swapper = stub_swapper()
+    cache = CachedSwapper(swapper)
+    img, source = textured(), make_source()
+    swap(cache, img, source)
+    swap(cache, img, make_source())
+    swap(cache, img, source, key=1)
+    assert swapper.session.runs == 3
+
+    cache.forget(1)
+    swap(cache, img, source, key=1)
+    assert swapper.session.runs == 4
+
+    cache.enabled = False
+    swap(cache, img, source, key=1)
+    assert swapper.session.runs == 5
+
+
+def test_reuse_and_paste_cached_skip_comparison():
+    swapper = stub_swapper()
+    cache = CachedSwapper(swapper)
+    img, source = textured(), make_source()
+    output = img.copy()
+    # 没有缓存结果时 reuse 也照常推理
+    assert cache.swap_many(img, output, [(0, KPS, source)], reuse={0}) == ["miss"]
+    assert cache.swap_many(255 - img, output, [(0, KPS, source)], reuse={0}) == ["deferred"]
+    assert cache.paste_cached(output, KPS, source, track_key=0)
+    assert not cache.paste_cached(output, KPS, make_source(), track_key=0)
+    assert swapper.session.runs == 1
+    assert cache.stats["deferred"] == 2
@@ -0,0 +1,94 @@
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import runtime_profile
+from swap_executor import SwapExecutor
+
+
+class StubSession:
+    def __init__(self):
+        self.runs = 0
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="target", shape=["batch", 3, 128, 128]),
+                SimpleNamespace(name="source", shape=[1, 512])]
+
+    def run(self, outputs, feed):
+        self.runs += 1
+        return [None]
+
+
+@pytest.fixture
+def loaded(monkeypatch):
+    """记录每次 load_model 收到的、按模型合并后的会话配置"""
+    sessions = []
+
+    def load_model(model_file, profile):
+        merged = runtime_profile.model_profile(profile, model_file)
+        swapper = SimpleNamespace(model_file=model_file, session=StubSession(), profile=merged)
+        sessions.append(swapper)
+        return swapper
+
+    monkeypatch.setattr(runtime_profile, "load_model", load_model)
+    return sessions
+
+
+def make_profile():
+    profile = runtime_profile.load_profile("does-not-exist.json")
+    # 与示例配置相同：换脸模型单独指定了线程数
+    profile["models"] = {"inswapper_128": {"session": {"intra_op_num_threads": 6}}}
+    return profile
+
+
+def test_per_worker_threads_override_model_specific_setting(loaded):
+    main = SimpleNamespace(model_file="./models/inswapper_128.onnx")
+    executor = SwapExecutor(main, make_profile(), workers=2, sessions="per_worker")
+    executor.prepare()
+    expected = max(1, (os.cpu_count() or 1) // 2)
+    assert [s.profile["session"]["intra_op_num_threads"] for s in loaded] == [expected, expected]
+    executor.shutdown()
+
+
+def test_prepare_creates_and_warms_sessions_before_first_frame(loaded):
+    main = SimpleNamespace(model_file="./models/inswapper_128.onnx")
+    executor = SwapExecutor(main, make_profile(), workers=3, sessions="per_worker")
+    executor.prepare()
+    assert len(loaded) == 3
+    assert all(s.session.runs == 2 for s in loaded)
+
+    barrier = threading.Barrier(3)
+
+    def task(i, swapper):
+        # 三个任务同时在三个线程里运行，各自拿到预先建好的会话
+        barrier.wait(timeout=5)
+        return swapper
+
+    used = executor.map(task, [(i,) for i in range(3)])
+    assert len(loaded) == 3
+    assert {id(s) for s in used} == {id(s) for s in loaded}
+    executor.shutdown()
+
+
+def test_shared_mode_splits_threads_across_workers(loaded):
+    main = SimpleNamespace(model_file="./models/inswapper_128.onnx")
+    executor = SwapExecutor(main, make_profile(), workers=4, sessions="shared")
+    executor.prepare()
+    # 只多建一个池会话，线程数按线程池大小平分，不再让4个线程各自占满所有核
+    assert len(loaded) == 1
+    assert loaded[0].profile["session"]["intra_op_num_threads"] == max(1, (os.cpu_count() or 1) // 4)
+    assert loaded[0].session.runs == 2
+    used = executor.map(lambda i, swapper: swapper, [(i,) for i in range(8)])
+    assert all(s is loaded[0] for s in used)
+    assert main not in used
+    executor.shutdown()
+
+
+def test_shared_session_created_once_without_prepare(loaded):
+    main = SimpleNamespace(model_file="./models/inswapper_128.onnx")
+    executor = SwapExecutor(main, make_profile(), workers=4, sessions="shared")
+    executor.map(lambda i, swapper: swapper, [(i,) for i in range(8)])
+    assert len(loaded) == 1
+    executor.shutdown()
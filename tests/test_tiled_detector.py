@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from stub_models import square_detector
+from tiled_detector import TiledDetector, tile_grid
+
+
+@pytest.mark.parametrize("width,height", [(1920, 1080), (3840, 2160), (641, 480), (500, 300)])
+def test_tile_grid_covers_image_with_overlap(width, height):
+    tile, overlap = 640, 0.25
+    regions = tile_grid(width, height, tile, overlap)
+    covered = np.zeros((height, width), dtype=bool)
+    for x0, y0, x1, y1 in regions:
+        assert 0 <= x0 < x1 <= width and 0 <= y0 < y1 <= height
+        assert x1 - x0 == min(tile, width) and y1 - y0 == min(tile, height)
+        covered[y0:y1, x0:x1] = True
+    assert covered.all()
+
+    # 相邻块至少重叠 overlap 比例，小于 tile_size*overlap 的人脸总能完整落在某一块里
+    xs = sorted({x0 for x0, _, _, _ in regions})
+    ys = sorted({y0 for _, y0, _, _ in regions})
+    for starts in (xs, ys):
+        for a, b in zip(starts, starts[1:]):
+            assert tile - (b - a) >= tile * overlap
+
+
+def white_square(img, x, y, size):
+    img[y:y + size, x:x + size] = 255
+
+
+@pytest.mark.parametrize("batched", [False, True])
+def test_face_in_overlap_is_merged_across_tiles(batched):
+    img = np.zeros((700, 1000, 3), dtype=np.uint8)
+    # 落在两块横向重叠区和两块纵向重叠区里，会被 4 块 + 整图检测到
+    white_square(img, 200, 200, 40)
+    # 只在一块里的人脸
+    white_square(img, 880, 600, 40)
+    det_model = square_detector(batched=batched)
+    detector = TiledDetector(det_model, tile_size=256, overlap=0.25)
+
+    faces = detector.detect(img)
+    assert len(faces) == 2
+    boxes = sorted(faces.bboxes.tolist())
+    assert np.allclose(boxes[0], [200, 200, 240, 240], atol=4)
+    assert np.allclose(boxes[1], [880, 600, 920, 640], atol=4)
+    # 合批时整组只推理一次，否则每块一次
+    tiles = detector.last_timing["tiles"]
+    assert tiles == len(tile_grid(1000, 700, 256, 0.25)) + 1
+    assert det_model.session.runs == (1 if batched else tiles)
+
+
+def test_max_num_keeps_highest_scores():
+    img = np.zeros((700, 1000, 3), dtype=np.uint8)
+    white_square(img, 100, 100, 40)
+    white_square(img, 700, 400, 40)
+    detector = TiledDetector(square_detector(), tile_size=256, overlap=0.25)
+    assert len(detector.detect(img, max_num=1)) == 1
@@ -0,0 +1,84 @@
+import sys
+import types
+
+import pytest
+
+
+class FakeStream:
+    def __init__(self, fail_start):
+        self.fail_start = fail_start
+        self.closed = False
+
+    def get_input_latency(self):
+        return 0.005
+
+    def get_output_latency(self):
+        return 0.005
+
+    def start_stream(self):
+        if self.fail_start:
+            raise OSError("Device unavailable")
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakePortAudio:
+    instances = []
+
+    def __init__(self, fail_open=False, fail_start=False):
+        self.fail_open = fail_open
+        self.fail_start = fail_start
+        self.terminated = False
+        self.stream = None
+        FakePortAudio.instances.append(self)
+
+    def open(self, **kwargs):
+        if self.fail_open:
+            raise OSError("Invalid sample rate")
+        self.stream = FakeStream(self.fail_start)
+        return self.stream
+
+    def terminate(self):
+        self.terminated = True
+
+
+@pytest.fixture
+def voice_changer(monkeypatch):
+    """没有声卡也能测试：pyaudio 用假的 PortAudio 代替；原声监听不做滤波，scipy 只需提供函数名"""
+    FakePortAudio.instances = []
+    pyaudio = types.ModuleType("pyaudio")
+    pyaudio.paFloat32 = 1
+    pyaudio.paContinue = 0
+    monkeypatch.setitem(sys.modules, "pyaudio", pyaudio)
+    signal = types.ModuleType("scipy.signal")
+    signal.sosfilt = signal.butter = None
+    scipy = types.ModuleType("scipy")
+    scipy.signal = signal
+    monkeypatch.setitem(sys.modules, "scipy", scipy)
+    monkeypatch.setitem(sys.modules, "scipy.signal", signal)
+
+    from voice_changer import VoiceChanger
+    return pyaudio, VoiceChanger()
+
+
+@pytest.mark.parametrize("failure", [{"fail_open": True}, {"fail_start": True}])
+def test_failed_start_terminates_portaudio(voice_changer, failure):
+    pyaudio, changer = voice_changer
+    pyaudio.PyAudio = lambda: FakePortAudio(**failure)
+    with pytest.raises(OSError):
+        changer.start()
+    audio = FakePortAudio.instances[0]
+    assert audio.terminated
+    assert audio.stream is None or audio.stream.closed
+    assert not changer.running
+
+    # 失败后可以重新启动
+    pyaudio.PyAudio = FakePortAudio
+    changer.start()
+    assert changer._stream is not None
+    changer.stop()
+    assert FakePortAudio.instances[-1].terminated
@@ -0,0 +1,202 @@
+import threading
+import time
+
+import numpy as np
+
+# 变声效果：pitch 为变调倍率，filter 为 (类型, 截止频率, 阶数)，ring_hz 为环形调制频率
+VOICE_EFFECTS = {
+    "原声监听": {},
+    "低沉": {"pitch": 0.75, "filter": ("lowpass", 3000, 4)},
+    "尖细": {"pitch": 1.5, "filter": ("highpass", 150, 2)},
+    "机器人": {"ring_hz": 60.0, "filter": ("bandpass", (200, 4000), 2)},
+    "电话": {"filter": ("bandpass", (300, 3400), 4)},
+}
+
+# 端到端延迟预算（毫秒）
+LATENCY_BUDGET_MS = 30.0
+
+
+class PitchShifter:
+    """环形缓冲上的双抽头延迟线变调：两个读指针相差半个窗口、正弦平方交叉淡化，整块矢量化计算"""
+
+    def __init__(self, ratio, window, block_size):
+        self.ratio = ratio
+        self.window = window
+        self.size = 1 << int(np.ceil(np.log2(window + block_size + 4)))
+        self.buffer = np.zeros(self.size, dtype=np.float32)
+        self.write_pos = 0
+        self.phase = 0.0
+
+    def process(self, x):
+        n = len(x)
+        idx = (self.write_pos + np.arange(n)) % self.size
+        self.buffer[idx] = x
+
+        # 每个输出样本的相位；ratio>1 时延迟逐渐减小，读指针比写指针走得快
+        step = (1.0 - self.ratio) / self.window
+        phase = (self.phase + step * np.arange(1, n + 1)) % 1.0
+        self.phase = phase[-1]
+
+        out = np.zeros(n, dtype=np.float32)
+        for offset in (0.0, 0.5):
+            p = (phase + offset) % 1.0
+            read = self.write_pos + np.arange(n) - p * self.window - 1.0
+            i0 = np.floor(read).astype(np.int64)
+            frac = (read - i0).astype(np.float32)
+            a = self.buffer[i0 % self.size]
+            b = self.buffer[(i0 + 1) % self.size]
+            out += (a + (b - a) * frac) * np.sin(np.pi * p).astype(np.float32) ** 2
+
+        self.write_pos = (self.write_pos + n) % self.size
+        return out
+
+
+class VoiceChanger:
+    """基于 PyAudio 回调的实时变声；所有处理都在音频线程里完成，界面只读取统计数据"""
+
+    def __init__(self, sample_rate=48000, block_size=256, pitch_window_ms=20.0):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.pitch_window = int(sample_rate * pitch_window_ms / 1000.0)
+        self.effect_name = "原声监听"
+
+        self._pa = None
+        self._audio = None
+        self._stream = None
+        self._device_latency_ms = 0.0
+        self._chain = None
+        self._pending = None
+        self._lock = threading.Lock()
+        # 处理后音频的旁路输出（例如录制），回调参数为 (音频块, 块首样本的monotonic时间戳)，必须不阻塞
+        self.taps = []
+
+        self.stats = {
+            "blocks": 0,
+            "underruns": 0,
+            "overruns": 0,
+            "deadline_misses": 0,
+            "process_ms_avg": 0.0,
+            "process_ms_max": 0.0,
+            "latency_ms": 0.0,
+        }
+        self.set_effect(self.effect_name)
+
+    def _build_chain(self, name):
+        import scipy.signal as signal
+
+        config = VOICE_EFFECTS[name]
+        chain = {"name": name, "sos": None, "zi": None, "sosfilt": signal.sosfilt, "shifter": None,
+                 "ring_hz": config.get("ring_hz"), "ring_phase": 0.0}
+        if "filter" in config:
+            btype, freqs, order = config["filter"]
+            sos = signal.butter(order, freqs, btype=btype, fs=self.sample_rate, output="sos")
+            chain["sos"] = sos
+            # 滤波器状态跨块保留，块边界不会产生咔哒声
+            chain["zi"] = np.zeros((sos.shape[0], 2), dtype=np.float64)
+        if config.get("pitch", 1.0) != 1.0:
+            chain["shifter"] = PitchShifter(config["pitch"], self.pitch_window, self.block_size)
+        return chain
+
+    def set_effect(self, name):
+        # 在调用方线程里建好滤波器，音频线程只在块边界做一次引用替换
+        chain = self._build_chain(name)
+        self._pending = chain
+        self.effect_name = name
+        self._update_latency(chain)
+
+    def _update_latency(self, chain):
+        # 端到端延迟 = 设备输入/输出延迟 + 一个处理块 + 变调窗口的平均延迟
+        pitch_ms = 500.0 * self.pitch_window / self.sample_rate if chain["shifter"] is not None else 0.0
+        self.stats["latency_ms"] = (self._device_latency_ms
+                                    + 1000.0 * self.block_size / self.sample_rate + pitch_ms)
+
+    def process(self, x):
+        if self._pending is not None:
+            self._chain, self._pending = self._pending, None
+        chain = self._chain
+
+        y = x
+        if chain["shifter"] is not None:
+            y = chain["shifter"].process(y)
+        if chain["ring_hz"]:
+            t = chain["ring_phase"] + np.arange(len(y)) * (2 * np.pi * chain["ring_hz"] / self.sample_rate)
+            chain["ring_phase"] = (t[-1] + 2 * np.pi * chain["ring_hz"] / self.sample_rate) % (2 * np.pi)
+            y = y * np.sin(t).astype(np.float32)
+        if chain["sos"] is not None:
+            y, chain["zi"] = chain["sosfilt"](chain["sos"], y, zi=chain["zi"])
+        return np.clip(y, -1.0, 1.0).astype(np.float32)
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        pyaudio = self._pa
+        start = time.perf_counter()
+        if status & (pyaudio.paInputOverflow | pyaudio.paOutputOverflow):
+            self.stats["overruns"] += 1
+        if status & (pyaudio.paInputUnderflow | pyaudio.paOutputUnderflow):
+            self.stats["underruns"] += 1
+
+        if in_data is None:
+            x = np.zeros(frame_count, dtype=np.float32)
+        else:
+            x = np.frombuffer(in_data, dtype=np.float32)
+        y = self.process(x)
+        if self.taps:
+            timestamp = time.monotonic() - frame_count / self.sample_rate - self._stream.get_input_latency()
+            for tap in list(self.taps):
+                tap(y, timestamp)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        blocks = self.stats["blocks"] + 1
+        self.stats["blocks"] = blocks
+        self.stats["process_ms_avg"] += (elapsed_ms - self.stats["process_ms_avg"]) / min(blocks, 100)
+        self.stats["process_ms_max"] = max(self.stats["process_ms_max"], elapsed_ms)
+        if elapsed_ms > 1000.0 * frame_count / self.sample_rate:
+            self.stats["deadline_misses"] += 1
+        return y.tobytes(), pyaudio.paContinue
+
+    @property
+    def within_budget(self):
+        return self.stats["latency_ms"] <= LATENCY_BUDGET_MS
+
+    @property
+    def running(self):
+        return self._stream is not None and self._stream.is_active()
+
+    def start(self, input_device=None, output_device=None):
+        import pyaudio
+
+        with self._lock:
+            if self._stream is not None:
+                return
+            self._pa = pyaudio
+            self._audio = pyaudio.PyAudio()
+            try:
+                self._stream = self._audio.open(format=pyaudio.paFloat32, channels=1, rate=self.sample_rate,
+                                                input=True, output=True,
+                                                input_device_index=input_device,
+                                                output_device_index=output_device,
+                                                frames_per_buffer=self.block_size,
+                                                stream_callback=self._callback,
+                                                start=False)
+                self._device_latency_ms = 1000.0 * (self._stream.get_input_latency()
+                                                    + self._stream.get_output_latency())
+                self._update_latency(self._pending or self._chain)
+                self._stream.start_stream()
+            except Exception:
+                # 打开或启动失败（设备被占用、参数不支持等）时释放 PortAudio，不留下半初始化的实例
+                self._release()
+                raise
+
+    def _release(self):
+        if self._stream is not None:
+            try:
+                self._stream.stop_stream()
+            finally:
+                self._stream.close()
+                self._stream = None
+        if self._audio is not None:
+            self._audio.terminate()
+            self._audio = None
+
+    def stop(self):
+        with self._lock:
+            self._release()